@@ -1,7 +1,7 @@
 """
-Admin-only API: user and study set moderation.
+Admin-only API: user and study set moderation, runtime metrics.
 """
-from sqlalchemy import func
+from sqlalchemy import func, text
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import joinedload
 
@@ -9,9 +9,15 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
 from app.admin import schemas
+from app.auth import password_hasher, principal_cache
 from app.auth.deps import require_admin
 from app.auth.models import User, Role
 from app.database.database import get_db
+from app.database import replicas
+from app.database.engine_config import pool_metrics
+from app.notifications import email_service
+from app.notifications.ws_manager import manager as ws_manager
+from app.study_sets import analytics_rollup, visibility_index
 from app.study_sets import models as study_models
 
 router = APIRouter()
@@ -69,6 +75,7 @@ def patch_user_role(
     user.role = role_obj
     try:
         db.commit()
+        principal_cache.invalidate_user(user_id)
         db.refresh(user)
     except IntegrityError:
         db.rollback()
@@ -95,9 +102,28 @@ def delete_user(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
+    # Same rollup and visibility refresh as DELETE /auth/me: FK cascades remove the user's
+    # enrollments, progress and assignments along with the row
+    rollup_class_ids = [
+        r[0]
+        for r in db.execute(
+            text("""
+                SELECT class_id FROM public.enrollment WHERE user_id = :uid
+                UNION
+                SELECT class_id FROM public.class WHERE teacher_id = :uid
+            """),
+            {"uid": user_id},
+        ).fetchall()
+    ]
+    rollup_set_ids = analytics_rollup.assigned_set_ids(db, rollup_class_ids)
+    visibility_set_ids = set(rollup_set_ids) | set(visibility_index.set_ids_assigned_by(db, user_id))
+
     try:
         db.delete(user)
+        analytics_rollup.refresh(db, rollup_set_ids)
+        visibility_index.refresh_sets(db, visibility_set_ids)
         db.commit()
+        principal_cache.invalidate_user(user_id)
     except IntegrityError:
         db.rollback()
         raise HTTPException(
@@ -153,3 +179,18 @@ def admin_delete_study_set(
             detail="Cannot delete study set: related records exist.",
         )
     return None
+
+
+@router.get("/metrics")
+def get_metrics(
+    _: User = Depends(require_admin),
+    db: Session = Depends(get_db),
+):
+    """Process-local counters of this worker (each worker reports its own), plus the shared email outbox."""
+    return {
+        "email_outbox": email_service.outbox_stats(db),
+        "password_hashing": password_hasher.metrics(),
+        "database_pools": pool_metrics(),
+        "replicas": replicas.status(),
+        "websocket": ws_manager.metrics(),
+    }
@@ -17,7 +17,26 @@ REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS"))
 REMEMBER_ME_ACCESS_TOKEN_DAYS = int(os.getenv("REMEMBER_ME_ACCESS_TOKEN_DAYS", "30"))
 REMEMBER_ME_REFRESH_TOKEN_DAYS = int(os.getenv("REMEMBER_ME_REFRESH_TOKEN_DAYS", "90"))
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+
+def _argon2_settings() -> dict:
+    """Per-deployment argon2 cost from ARGON2_TIME_COST / _MEMORY_COST (KiB) / _PARALLELISM.
+
+    Unset values keep passlib's defaults. Benchmark candidates with
+    `python -m scripts.benchmark_password_hashing`.
+    """
+    settings = {}
+    for env_name, key in (
+        ("ARGON2_TIME_COST", "argon2__time_cost"),
+        ("ARGON2_MEMORY_COST", "argon2__memory_cost"),
+        ("ARGON2_PARALLELISM", "argon2__parallelism"),
+    ):
+        value = os.getenv(env_name)
+        if value:
+            settings[key] = int(value)
+    return settings
+
+
+pwd_context = CryptContext(schemes=["argon2"], deprecated="auto", **_argon2_settings())
 
 
 def get_password_hash(password: str) -> str:
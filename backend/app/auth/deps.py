@@ -2,11 +2,14 @@ from typing import Optional
 import jwt
 from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload
 
+from app.auth import principal_cache, revocation
 from app.auth.auth_utils import ALGORITHM, SECRET_KEY
-from app.auth.models import RevokedToken, User
-from app.database.database import get_db
+from app.auth.models import User
+from app.database import replicas
+from app.database.database import get_async_db, get_db
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
 
@@ -18,39 +21,79 @@ def get_token_from_request(
     return request.cookies.get("access_token") or token_from_header
 
 
-def get_current_user(
-    token: Optional[str] = Depends(get_token_from_request),
-    db: Session = Depends(get_db),
-) -> User:
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def _decode_access_token(token: Optional[str]) -> dict:
+    """Validate the token (signature, expiry, revocation) without touching the database."""
     if not token:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Not authenticated",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        jti = payload.get("jti")
-        sub = payload.get("sub")
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except Exception:
-        raise credentials_exception
+        raise _credentials_exception()
 
-    if db.query(RevokedToken).filter(RevokedToken.jti == jti).first():
+    if revocation.is_revoked(payload.get("jti")):
         raise HTTPException(status_code=401, detail="Token revoked")
+    return payload
 
-    user = db.query(User).filter(User.email == sub).first()
-    if user is None:
-        raise credentials_exception
+
+def _load_user(db: Session, payload: dict) -> User:
+    jti = payload.get("jti")
+    cached = principal_cache.get(jti)
+    if cached is not None:
+        if cached.revoked:
+            raise HTTPException(status_code=401, detail="Token revoked")
+        user = principal_cache.attach(db, cached)
+    else:
+        user = db.query(User).options(joinedload(User.role)).filter(User.email == payload.get("sub")).first()
+        if user is None:
+            raise _credentials_exception()
+        principal_cache.put(jti, principal_cache.Principal.from_user(user), payload.get("exp"))
+    # Lets the session attribute its commits to this user (read-your-writes routing)
+    db.info["user_id"] = user.user_id
     return user
 
 
+def get_current_user(
+    token: Optional[str] = Depends(get_token_from_request),
+    db: Session = Depends(get_db),
+) -> User:
+    return _load_user(db, _decode_access_token(token))
+
+
+async def get_current_user_async(
+    token: Optional[str] = Depends(get_token_from_request),
+    db: AsyncSession = Depends(get_async_db),
+) -> User:
+    """get_current_user for async endpoints; the user lives in the request's AsyncSession."""
+    payload = _decode_access_token(token)
+    return await db.run_sync(_load_user, payload)
+
+
+def use_read_replica(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> None:
+    """Route this request's reads to a replica unless the user wrote within the read-your-writes window."""
+    if replicas.wrote_recently(current_user.user_id):
+        return
+    read_engine = replicas.pick()
+    if read_engine is not None:
+        db.info["read_engine"] = read_engine
+
+
 def require_role(role: str):
     def role_checker(user=Depends(get_current_user)):
         if user.role is None or user.role.name.lower() != role.lower():
@@ -23,7 +23,10 @@ class RevokedToken(Base):
     __tablename__ = "revoked_tokens"
     id = Column(Integer, primary_key=True)
     jti = Column(String(256), unique=True, index=True, nullable=False)
-    revoked_at = Column(DateTime, default=datetime.utcnow)
+    # Set from the database clock by app.auth.revocation, whose sync reads by it
+    revoked_at = Column(DateTime, default=datetime.utcnow, index=True)
+    # Expiry of the revoked token; rows past it are purged (NULL for rows from before this column)
+    expires_at = Column(DateTime, nullable=True, index=True)
 
 
 class User(Base):
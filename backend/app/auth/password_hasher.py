@@ -0,0 +1,136 @@
+"""
+Bounded executor for argon2 password hashing and verification.
+
+argon2 is deliberately expensive, so a login burst (a whole class signing in at once) would
+otherwise tie up the event loop or every request thread. All hashing goes through a
+dedicated pool of PASSWORD_HASH_WORKERS threads (argon2 releases the GIL). At most
+PASSWORD_HASH_QUEUE_LIMIT operations may be waiting for a worker; beyond that callers get
+HashingBusyError, which the app turns into 429 with Retry-After so clients back off instead
+of piling up.
+
+Async handlers (login) await verify_password; sync handlers (run in FastAPI's threadpool)
+use hash_password_sync / verify_password_sync. metrics() feeds /admin/metrics.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from app.auth import auth_utils
+
+WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", str(WORKERS * 8)))
+RETRY_AFTER_SEC = int(os.getenv("PASSWORD_HASH_RETRY_AFTER_SEC", "1"))
+
+
+class HashingBusyError(Exception):
+    """Raised when the hashing queue is full; maps to 429 Too Many Requests."""
+
+    def __init__(self, retry_after: int = RETRY_AFTER_SEC):
+        super().__init__("Too many concurrent sign-in requests, please retry shortly")
+        self.retry_after = retry_after
+
+
+class _Metrics:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.max_queued = 0
+        self.completed = 0
+        self.rejected = 0
+        self.hash_seconds_total = 0.0
+        self.hash_seconds_max = 0.0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            completed = self.completed or 1
+            return {
+                "workers": WORKERS,
+                "queue_limit": QUEUE_LIMIT,
+                "queue_depth": self.queued,
+                "queue_depth_max": self.max_queued,
+                "running": self.running,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "hash_ms_avg": round(self.hash_seconds_total * 1000 / completed, 2),
+                "hash_ms_max": round(self.hash_seconds_max * 1000, 2),
+                "queue_wait_ms_avg": round(self.wait_seconds_total * 1000 / completed, 2),
+                "queue_wait_ms_max": round(self.wait_seconds_max * 1000, 2),
+            }
+
+
+_metrics = _Metrics()
+_executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="password-hash")
+
+
+def _submit(fn: Callable[..., Any], *args: Any) -> Future:
+    with _metrics.lock:
+        if _metrics.queued >= QUEUE_LIMIT:
+            _metrics.rejected += 1
+            raise HashingBusyError()
+        _metrics.queued += 1
+        _metrics.max_queued = max(_metrics.max_queued, _metrics.queued)
+    enqueued_at = time.perf_counter()
+
+    def run() -> Any:
+        started = time.perf_counter()
+        with _metrics.lock:
+            _metrics.queued -= 1
+            _metrics.running += 1
+        try:
+            return fn(*args)
+        finally:
+            finished = time.perf_counter()
+            with _metrics.lock:
+                _metrics.running -= 1
+                _metrics.completed += 1
+                waited = started - enqueued_at
+                took = finished - started
+                _metrics.wait_seconds_total += waited
+                _metrics.wait_seconds_max = max(_metrics.wait_seconds_max, waited)
+                _metrics.hash_seconds_total += took
+                _metrics.hash_seconds_max = max(_metrics.hash_seconds_max, took)
+
+    try:
+        future = _executor.submit(run)
+    except RuntimeError:
+        # Executor shut down: undo the reservation before propagating
+        with _metrics.lock:
+            _metrics.queued -= 1
+        raise
+    future.add_done_callback(_release_if_cancelled)
+    return future
+
+
+def _release_if_cancelled(future: Future) -> None:
+    # A job cancelled before it started (shutdown(cancel_futures=True)) never ran run()
+    if future.cancelled():
+        with _metrics.lock:
+            _metrics.queued -= 1
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await asyncio.wrap_future(_submit(auth_utils.verify_password, plain_password, hashed_password))
+
+
+def hash_password_sync(password: str) -> str:
+    return _submit(auth_utils.get_password_hash, password).result()
+
+
+def verify_password_sync(plain_password: str, hashed_password: str) -> bool:
+    return _submit(auth_utils.verify_password, plain_password, hashed_password).result()
+
+
+def metrics() -> Dict[str, Any]:
+    return _metrics.snapshot()
+
+
+def shutdown() -> None:
+    _executor.shutdown(wait=False, cancel_futures=True)
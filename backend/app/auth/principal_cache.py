@@ -0,0 +1,125 @@
+"""
+Per-token cache of the authenticated principal used by get_current_user.
+
+Entries are keyed by the token's jti and hold what handlers read from current_user
+(id, name, email, role) plus whether the token is revoked. They live until the earlier
+of the TTL and the token's own `exp`, in an LRU capped at PRINCIPAL_CACHE_SIZE.
+A hit costs no database round trip: the cached fields are attached to the request's
+session as an already-loaded User, so handlers keep working with a normal ORM object
+(any attribute not cached, such as password_hash, is loaded on first access).
+
+Revoking a token or changing / deleting a user must call the invalidation helpers;
+other workers see such changes after at most PRINCIPAL_CACHE_TTL_SEC.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from app.auth.models import Role, User
+
+_MAX_ENTRIES = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+_TTL_SEC = float(os.getenv("PRINCIPAL_CACHE_TTL_SEC", "60"))
+
+
+@dataclass(frozen=True)
+class Principal:
+    user_id: Optional[int]
+    name: Optional[str]
+    email: Optional[str]
+    role_id: Optional[int]
+    role_name: Optional[str]
+    revoked: bool = False
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        role = user.role
+        return cls(
+            user_id=user.user_id,
+            name=user.name,
+            email=user.email,
+            role_id=role.id if role else None,
+            role_name=role.name if role else None,
+        )
+
+
+REVOKED = Principal(user_id=None, name=None, email=None, role_id=None, role_name=None, revoked=True)
+
+_entries: "OrderedDict[str, Tuple[Principal, float]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def get(jti: Optional[str]) -> Optional[Principal]:
+    if not jti:
+        return None
+    now = time.time()
+    with _lock:
+        item = _entries.get(jti)
+        if item is None:
+            return None
+        principal, expires_at = item
+        if expires_at <= now:
+            del _entries[jti]
+            return None
+        _entries.move_to_end(jti)
+        return principal
+
+
+def put(jti: Optional[str], principal: Principal, token_exp: Optional[float]) -> None:
+    if not jti:
+        return
+    expires_at = time.time() + _TTL_SEC
+    if token_exp is not None:
+        expires_at = min(expires_at, float(token_exp))
+    with _lock:
+        _entries[jti] = (principal, expires_at)
+        _entries.move_to_end(jti)
+        while len(_entries) > _MAX_ENTRIES:
+            _entries.popitem(last=False)
+
+
+def mark_revoked(jti: Optional[str], token_exp: Optional[float] = None) -> None:
+    """Call after a token is revoked so this worker rejects it without a lookup."""
+    put(jti, REVOKED, token_exp)
+
+
+def discard(jti: Optional[str]) -> None:
+    if not jti:
+        return
+    with _lock:
+        _entries.pop(jti, None)
+
+
+def invalidate_user(user_id: int) -> None:
+    """Drop every cached token of the user (profile, role or account changed)."""
+    with _lock:
+        for jti in [k for k, (p, _) in _entries.items() if p.user_id == user_id]:
+            del _entries[jti]
+
+
+def clear() -> None:
+    with _lock:
+        _entries.clear()
+
+
+def attach(db: Session, principal: Principal) -> User:
+    """Build a persistent User in `db` from cached fields without emitting SQL."""
+    role = None
+    if principal.role_id is not None:
+        role = Role(id=principal.role_id, name=principal.role_name)
+        make_transient_to_detached(role)
+    user = User(
+        user_id=principal.user_id,
+        name=principal.name,
+        email=principal.email,
+        role_id=principal.role_id,
+    )
+    user.role = role
+    make_transient_to_detached(user)
+    return db.merge(user, load=False)
@@ -0,0 +1,322 @@
+"""
+Token revocation with an in-memory front.
+
+Every authenticated request asks "is this jti revoked?", and the answer is almost always
+no. The filter keeps the revoked jtis that can still matter (their token has not expired)
+in a process-local set, so that check never touches the database:
+
+- start() warms the set from the backend and runs a background thread that pulls
+  revocations made by other workers every REVOCATION_SYNC_INTERVAL_SEC and purges
+  entries whose token expired every REVOCATION_PURGE_INTERVAL_SEC.
+- revoke() writes through to the backend and updates the local set immediately.
+- Until the set is loaded (warm-up failed, or the filter is used outside the app lifespan)
+  a check tries one warm-up and otherwise asks the backend about that single jti.
+
+DatabaseBackend syncs by revoked_at (stamped with the database clock) and re-reads the last
+REVOCATION_SYNC_OVERLAP_SEC before its previous read on every pass. Serial ids are not a
+safe cursor: a transaction holding id 10 can commit after id 11, and a worker that already
+moved past 11 would never see 10. Re-read rows are merged idempotently.
+
+The backend is pluggable (RevocationBackend). DatabaseBackend stores revocations in
+`revoked_tokens` and is what multi-worker deployments share; MemoryBackend keeps
+everything in process for single-worker setups and scripts. Select it with
+REVOCATION_BACKEND=database|memory or set_backend().
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from app.database.database import SessionLocal
+
+_logger = logging.getLogger(__name__)
+
+SYNC_INTERVAL_SEC = float(os.getenv("REVOCATION_SYNC_INTERVAL_SEC", "5"))
+PURGE_INTERVAL_SEC = float(os.getenv("REVOCATION_PURGE_INTERVAL_SEC", "3600"))
+# Longer than any revoke transaction (one INSERT) takes to commit, plus clock skew
+SYNC_OVERLAP_SEC = float(os.getenv("REVOCATION_SYNC_OVERLAP_SEC", "30"))
+# Rows written before expires_at existed are kept this long after revocation
+LEGACY_RETENTION = timedelta(days=int(os.getenv("REMEMBER_ME_REFRESH_TOKEN_DAYS", "90")))
+
+# (jti, token expiry as naive UTC or None if unknown)
+Entry = Tuple[str, Optional[datetime]]
+
+
+class RevocationBackend(ABC):
+    """Shared store of revoked jtis. Cursors are opaque to the filter."""
+
+    @abstractmethod
+    def revoke(self, jti: str, expires_at: Optional[datetime]) -> None:
+        ...
+
+    @abstractmethod
+    def load_active(self, now: datetime) -> Tuple[List[Entry], Any]:
+        """All revocations whose token may still be valid, plus a cursor for changes_since()."""
+
+    @abstractmethod
+    def changes_since(self, cursor: Any) -> Tuple[List[Entry], Any]:
+        """Revocations added after `cursor` (possibly some already returned), plus the new cursor."""
+
+    @abstractmethod
+    def contains(self, jti: str) -> bool:
+        """Single-jti lookup, used while the filter is not loaded."""
+
+    @abstractmethod
+    def purge(self, now: datetime) -> int:
+        """Delete revocations whose token has expired; returns how many were removed."""
+
+
+class DatabaseBackend(RevocationBackend):
+    def __init__(self, session_factory=SessionLocal):
+        self._session_factory = session_factory
+
+    def revoke(self, jti: str, expires_at: Optional[datetime]) -> None:
+        db = self._session_factory()
+        try:
+            db.execute(
+                text("""
+                    INSERT INTO revoked_tokens (jti, revoked_at, expires_at)
+                    VALUES (:jti, timezone('utc', now()), :expires_at)
+                    ON CONFLICT (jti) DO NOTHING
+                """),
+                {"jti": jti, "expires_at": expires_at},
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _read(self, since: Optional[datetime]) -> Tuple[List[Entry], Any]:
+        db = self._session_factory()
+        try:
+            # Taken before the rows are read; the next pass starts SYNC_OVERLAP_SEC earlier
+            cursor = db.execute(text("SELECT timezone('utc', now())")).scalar()
+            sql = """
+                SELECT jti, expires_at FROM revoked_tokens
+                WHERE (expires_at IS NULL OR expires_at > :now)
+            """
+            if since is not None:
+                sql += " AND revoked_at >= :since"
+            rows = db.execute(text(sql), {"now": cursor, "since": since}).fetchall()
+        finally:
+            db.close()
+        return [(r[0], r[1]) for r in rows], cursor
+
+    def load_active(self, now: datetime) -> Tuple[List[Entry], Any]:
+        return self._read(None)
+
+    def changes_since(self, cursor: Any) -> Tuple[List[Entry], Any]:
+        if cursor is None:
+            return self._read(None)
+        return self._read(cursor - timedelta(seconds=SYNC_OVERLAP_SEC))
+
+    def contains(self, jti: str) -> bool:
+        db = self._session_factory()
+        try:
+            return db.execute(
+                text("SELECT 1 FROM revoked_tokens WHERE jti = :jti"), {"jti": jti}
+            ).first() is not None
+        finally:
+            db.close()
+
+    def purge(self, now: datetime) -> int:
+        db = self._session_factory()
+        try:
+            result = db.execute(
+                text("""
+                    DELETE FROM revoked_tokens
+                    WHERE expires_at < :now
+                       OR (expires_at IS NULL AND revoked_at < :legacy_cutoff)
+                """),
+                {"now": now, "legacy_cutoff": now - LEGACY_RETENTION},
+            )
+            db.commit()
+            return result.rowcount or 0
+        finally:
+            db.close()
+
+
+class MemoryBackend(RevocationBackend):
+    def __init__(self) -> None:
+        self._log: List[Entry] = []
+        self._lock = threading.Lock()
+
+    def revoke(self, jti: str, expires_at: Optional[datetime]) -> None:
+        with self._lock:
+            self._log.append((jti, expires_at))
+
+    def load_active(self, now: datetime) -> Tuple[List[Entry], Any]:
+        with self._lock:
+            return [e for e in self._log if e[1] is None or e[1] > now], len(self._log)
+
+    def changes_since(self, cursor: Any) -> Tuple[List[Entry], Any]:
+        with self._lock:
+            return list(self._log[cursor or 0:]), len(self._log)
+
+    def contains(self, jti: str) -> bool:
+        with self._lock:
+            return any(e[0] == jti for e in self._log)
+
+    def purge(self, now: datetime) -> int:
+        # Keeps the log append-only so cursors stay valid; the filter drops expired entries itself
+        return 0
+
+
+class RevocationFilter:
+    def __init__(self, backend: RevocationBackend):
+        self.backend = backend
+        self._revoked: Dict[str, Optional[datetime]] = {}
+        self._cursor: Any = None
+        self._loaded = False
+        self._warm_up_tried = False
+        self._lock = threading.Lock()
+        self._warm_up_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def warm_up(self) -> None:
+        entries, cursor = self.backend.load_active(datetime.utcnow())
+        with self._lock:
+            self._revoked = {}
+            self._add_locked(entries)
+            self._cursor = cursor
+            self._loaded = True
+
+    def _add_locked(self, entries: Iterable[Entry]) -> None:
+        for jti, expires_at in entries:
+            self._revoked[jti] = expires_at
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        if not jti:
+            return False
+        if not self._loaded:
+            return self._check_unloaded(jti)
+        return jti in self._revoked
+
+    def _check_unloaded(self, jti: str) -> bool:
+        # One inline warm-up (scripts and tests never call start()); after that, leave
+        # reloading to the sync thread and only look up this jti
+        with self._warm_up_lock:
+            if not self._loaded and not self._warm_up_tried:
+                self._warm_up_tried = True
+                try:
+                    self.warm_up()
+                except Exception as exc:
+                    _logger.warning("Revocation warm-up failed, checking tokens individually: %s", exc)
+        if self._loaded:
+            return jti in self._revoked
+        try:
+            return self.backend.contains(jti)
+        except Exception as exc:
+            # Cannot tell whether the token was revoked: reject it
+            _logger.warning("Revocation lookup failed for %s: %s", jti, exc)
+            return True
+
+    def revoke(self, jti: Optional[str], expires_at: Optional[datetime]) -> None:
+        if not jti:
+            return
+        self.backend.revoke(jti, expires_at)
+        with self._lock:
+            self._revoked[jti] = expires_at
+
+    def sync(self) -> None:
+        if not self._loaded:
+            self.warm_up()
+            return
+        entries, cursor = self.backend.changes_since(self._cursor)
+        with self._lock:
+            self._add_locked(entries)
+            self._cursor = cursor
+
+    def purge(self) -> int:
+        now = datetime.utcnow()
+        removed = self.backend.purge(now)
+        with self._lock:
+            for jti in [j for j, exp in self._revoked.items() if exp is not None and exp <= now]:
+                del self._revoked[jti]
+        return removed
+
+    def _run(self) -> None:
+        next_purge = time.monotonic()
+        while not self._stop.wait(SYNC_INTERVAL_SEC):
+            try:
+                self.sync()
+                if time.monotonic() >= next_purge:
+                    removed = self.purge()
+                    if removed:
+                        _logger.info("Purged %d expired token revocations", removed)
+                    next_purge = time.monotonic() + PURGE_INTERVAL_SEC
+            except Exception as exc:
+                _logger.exception("Revocation sync failed: %s", exc)
+
+    def start(self) -> None:
+        self._warm_up_tried = True
+        try:
+            self.warm_up()
+        except Exception as exc:
+            # Leave _loaded unset: checks look up single jtis until the sync thread loads it
+            _logger.exception("Revocation warm-up failed: %s", exc)
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="revocation-sync", daemon=True)
+            self._thread.start()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=SYNC_INTERVAL_SEC + 1)
+            self._thread = None
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+
+def _default_backend() -> RevocationBackend:
+    name = os.getenv("REVOCATION_BACKEND", "database").strip().lower()
+    if name == "memory":
+        return MemoryBackend()
+    return DatabaseBackend()
+
+
+revocations = RevocationFilter(_default_backend())
+
+
+def set_backend(backend: RevocationBackend) -> None:
+    """
+    Swap the backend (e.g. a shared cache service). If the old filter was running, the new
+    one is started (warm-up plus sync thread); otherwise it loads on first use.
+    """
+    global revocations
+    was_running = revocations.running
+    revocations.stop()
+    revocations = RevocationFilter(backend)
+    if was_running:
+        revocations.start()
+
+
+def is_revoked(jti: Optional[str]) -> bool:
+    return revocations.is_revoked(jti)
+
+
+def revoke(jti: Optional[str], token_exp: Optional[float]) -> None:
+    """Revoke a token given its jti and `exp` claim (seconds since epoch)."""
+    expires_at = datetime.utcfromtimestamp(token_exp) if token_exp is not None else None
+    revocations.revoke(jti, expires_at)
+
+
+def start() -> None:
+    revocations.start()
+
+
+def stop() -> None:
+    revocations.stop()
@@ -1,6 +1,6 @@
 import os
 import secrets
-from datetime import datetime, timedelta
+from datetime import timedelta
 
 import jwt
 from fastapi import APIRouter, Depends, HTTPException, Request
@@ -9,8 +9,9 @@ from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 
-from app.auth import auth_utils, deps, models, schemas
+from app.auth import auth_utils, deps, models, password_hasher, principal_cache, revocation, schemas
 from app.database.database import get_db
+from app.study_sets import analytics_rollup, gamification_service, leaderboard, visibility_index
 from app.study_sets import models as study_models
 
 router = APIRouter()
@@ -77,7 +78,7 @@ def register(payload: schemas.UserCreate, db: Session = Depends(get_db)):
     # create user
     user = models.User(
         email=payload.email,
-        password_hash=auth_utils.get_password_hash(payload.password),
+        password_hash=password_hasher.hash_password_sync(payload.password),
         name=payload.full_name,
         role=role_obj,
     )
@@ -123,7 +124,7 @@ async def login(
         raise HTTPException(status_code=400, detail="Email and password are required")
     
     user = db.query(models.User).filter(models.User.email == email).first()
-    if not user or not auth_utils.verify_password(password, user.password_hash):
+    if not user or not await password_hasher.verify_password(password, user.password_hash):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     access_token, access_jti = auth_utils.create_access_token(
@@ -160,7 +161,7 @@ def refresh(payload: schemas.RefreshIn, db: Session = Depends(get_db)):
     jti = decoded.get("jti")
     sub = decoded.get("sub")
 
-    if db.query(models.RevokedToken).filter(models.RevokedToken.jti == jti).first():
+    if revocation.is_revoked(jti):
         raise HTTPException(status_code=401, detail="Refresh token revoked")
 
     user = db.query(models.User).filter(models.User.email == sub).first()
@@ -179,7 +180,7 @@ def refresh(payload: schemas.RefreshIn, db: Session = Depends(get_db)):
 
 
 @router.post("/revoke_refresh")
-def revoke_refresh(payload: schemas.RefreshIn, db: Session = Depends(get_db)):
+def revoke_refresh(payload: schemas.RefreshIn):
     try:
         decoded = jwt.decode(
             payload.refresh_token,
@@ -190,9 +191,8 @@ def revoke_refresh(payload: schemas.RefreshIn, db: Session = Depends(get_db)):
         raise HTTPException(status_code=401, detail="Invalid token")
 
     jti = decoded.get("jti")
-    revoked = models.RevokedToken(jti=jti, revoked_at=datetime.utcnow())
-    db.add(revoked)
-    db.commit()
+    revocation.revoke(jti, decoded.get("exp"))
+    principal_cache.mark_revoked(jti, decoded.get("exp"))
     return {"msg": "Refresh token revoked"}
 
 
@@ -227,9 +227,10 @@ def update_me(
         user.name = payload.full_name
     
     if payload.password:
-        user.password_hash = auth_utils.get_password_hash(payload.password)
+        user.password_hash = password_hasher.hash_password_sync(payload.password)
     
     db.commit()
+    principal_cache.invalidate_user(user.user_id)
     db.refresh(user)
     
     return {
@@ -251,6 +252,22 @@ def delete_me(
     """
     uid = current_user.user_id
     try:
+        # Analytics rollups of every set assigned to a class this user is in or teaches
+        rollup_class_ids = [
+            r[0]
+            for r in db.execute(
+                text("""
+                    SELECT class_id FROM public.enrollment WHERE user_id = :uid
+                    UNION
+                    SELECT class_id FROM public.class WHERE teacher_id = :uid
+                """),
+                {"uid": uid},
+            ).fetchall()
+        ]
+        rollup_set_ids = analytics_rollup.assigned_set_ids(db, rollup_class_ids)
+        # Other users lose visibility of sets assigned through this user's classes or by them
+        visibility_set_ids = set(rollup_set_ids) | set(visibility_index.set_ids_assigned_by(db, uid))
+
         # 1. Study set progress and student assignments (user as student)
         db.query(study_models.StudySetProgress).filter(study_models.StudySetProgress.user_id == uid).delete(synchronize_session=False)
         db.query(study_models.StudySetStudentAssignment).filter(study_models.StudySetStudentAssignment.user_id == uid).delete(synchronize_session=False)
@@ -275,7 +292,14 @@ def delete_me(
 
         # 6. User
         db.query(models.User).filter(models.User.user_id == uid).delete(synchronize_session=False)
+        analytics_rollup.refresh(db, rollup_set_ids)
+        visibility_index.refresh_sets(db, visibility_set_ids)
         db.commit()
+        principal_cache.invalidate_user(uid)
+        leaderboard.invalidate_user(uid)
+        gamification_service.invalidate(uid)
+        for class_id in rollup_class_ids:
+            leaderboard.invalidate_class(class_id)
     except Exception:
         db.rollback()
         import logging
@@ -317,7 +341,7 @@ def password_reset_confirm(
     if not user:
         raise HTTPException(status_code=400, detail="User not found")
 
-    user.password_hash = auth_utils.get_password_hash(payload.new_password)
+    user.password_hash = password_hasher.hash_password_sync(payload.new_password)
     db.commit()
     return {"msg": "Password updated successfully"}
 
@@ -337,7 +361,7 @@ def _oauth_get_or_create_user(db: Session, email: str, name: str, role_name: str
         db.refresh(role_obj)
     user = models.User(
         email=email,
-        password_hash=auth_utils.get_password_hash(secrets.token_urlsafe(32)),
+        password_hash=password_hasher.hash_password_sync(secrets.token_urlsafe(32)),
         name=name or email.split("@")[0],
         role=role_obj,
     )
@@ -587,8 +611,17 @@ async def github_callback(request: Request, db: Session = Depends(get_db)):
 
 
 @router.get("/logout")
-async def logout():
+async def logout(request: Request):
     """Clear auth cookies and redirect to frontend login."""
+    for cookie in ("access_token", "refresh_token"):
+        token = request.cookies.get(cookie)
+        if not token:
+            continue
+        try:
+            decoded = jwt.decode(token, auth_utils.SECRET_KEY, algorithms=[auth_utils.ALGORITHM])
+        except Exception:
+            continue
+        principal_cache.discard(decoded.get("jti"))
     response = RedirectResponse(url=f"{FRONTEND_URL}/login", status_code=302)
     response.delete_cookie("access_token", path="/")
     response.delete_cookie("refresh_token", path="/")
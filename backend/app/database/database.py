@@ -1,17 +1,78 @@
 import os
+from contextlib import contextmanager
+from typing import Iterator
 
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy import event
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+
+from app.database import replicas
+from app.database.engine_config import build_async_engine, build_engine
 
 load_dotenv()
 
-engine = create_engine(os.getenv("DATABASE_URL"))
+# Pool size, overflow, recycle, pre-ping and statement timeout come from DB_* env vars
+engine = build_engine(os.getenv("DATABASE_URL"))
+
+
+class RoutingSession(Session):
+    """
+    Session that reads from a replica once use_read_replica has set info["read_engine"].
+    Flushes always go to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        read_engine = self.info.get("read_engine")
+        if read_engine is not None and not self._flushing:
+            return read_engine
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+
+@contextmanager
+def primary_reads(db: Session) -> Iterator[None]:
+    """Send this session's reads to the primary inside the block (e.g. to fill a shared cache)."""
+    read_engine = db.info.pop("read_engine", None)
+    try:
+        yield
+    finally:
+        if read_engine is not None:
+            db.info["read_engine"] = read_engine
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _note_user_write(session: Session) -> None:
+    # Read endpoints never commit, so a commit on a user's request means they changed something
+    user_id = session.info.get("user_id")
+    if user_id is not None:
+        replicas.note_write(user_id)
+
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+# Opt-in asyncpg engine for the async read endpoints (app/study_sets/async_routes.py).
+# ASYNC_DATABASE_URL overrides the URL derived from DATABASE_URL.
+ASYNC_DB_ENABLED = os.getenv("ASYNC_DB_ENABLED", "").strip().lower() in ("1", "true", "yes")
+
+async_engine = None
+AsyncSessionLocal = None
+
+
+def _async_url() -> str:
+    url = os.getenv("ASYNC_DATABASE_URL") or os.getenv("DATABASE_URL") or ""
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+
+if ASYNC_DB_ENABLED:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    async_engine = build_async_engine(_async_url())
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 
 def get_db():
     db = SessionLocal()
@@ -19,3 +80,10 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    if AsyncSessionLocal is None:
+        raise RuntimeError("Async database access is disabled; set ASYNC_DB_ENABLED=1")
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,226 @@
+"""
+Engine construction from environment settings, with pool checkout metrics.
+
+SQLAlchemy's defaults (5 pooled + 10 overflow connections, no pre-ping, no recycle) leave
+most of FastAPI's 40 threadpool handlers queueing on the pool during a classroom-sized
+spike. Every engine the app creates goes through build_engine / build_async_engine, which
+read:
+
+  DB_POOL_SIZE             persistent connections per engine (default 10; 0 = no pooling)
+  DB_MAX_OVERFLOW          extra connections under load (default 30)
+  DB_POOL_TIMEOUT          seconds to wait for a connection before failing (default 30)
+  DB_POOL_RECYCLE          reconnect connections older than this many seconds (default 1800)
+  DB_POOL_PRE_PING         test connections on checkout (default on)
+  DB_STATEMENT_TIMEOUT_MS  per-statement statement_timeout on Postgres (default 0 = off)
+  PGBOUNCER_MODE           set when connecting through PgBouncer in transaction pooling
+
+PgBouncer in transaction mode rejects unknown startup parameters and hands each transaction
+a different server connection, so the statement timeout is applied with SET LOCAL at the
+start of every transaction instead of as a connection option, and asyncpg's prepared
+statement caches are turned off. DB_POOL_SIZE=0 (NullPool) is the usual pairing, letting
+PgBouncer do all the pooling.
+
+Pools record how long checkouts wait; pool_metrics() feeds /admin/metrics.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass(frozen=True)
+class EngineSettings:
+    pool_size: int = 10
+    max_overflow: int = 30
+    pool_timeout: float = 30.0
+    pool_recycle: int = 1800
+    pool_pre_ping: bool = True
+    statement_timeout_ms: int = 0
+    pgbouncer: bool = False
+
+    @classmethod
+    def from_env(cls) -> "EngineSettings":
+        return cls(
+            pool_size=int(os.getenv("DB_POOL_SIZE", "10")),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "30")),
+            pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+            pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+            pool_pre_ping=_env_bool("DB_POOL_PRE_PING", True),
+            statement_timeout_ms=int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0")),
+            pgbouncer=_env_bool("PGBOUNCER_MODE", False),
+        )
+
+
+@dataclass
+class _CheckoutStats:
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    checkouts: int = 0
+    timeouts: int = 0
+    waiting: int = 0
+    wait_seconds_total: float = 0.0
+    wait_seconds_max: float = 0.0
+
+    def record(self, waited: float, timed_out: bool) -> None:
+        with self.lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            checkouts = self.checkouts or 1
+            return {
+                "checkouts": self.checkouts,
+                "checkout_timeouts": self.timeouts,
+                "waiting": self.waiting,
+                "checkout_wait_ms_avg": round(self.wait_seconds_total * 1000 / checkouts, 2),
+                "checkout_wait_ms_max": round(self.wait_seconds_max * 1000, 2),
+            }
+
+
+class _MeteredPoolMixin:
+    """Times every checkout (queueing for a free slot plus connecting, if a new one is opened)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = _CheckoutStats()
+
+    def _do_get(self):
+        stats = self.stats
+        with stats.lock:
+            stats.waiting += 1
+        started = time.perf_counter()
+        timed_out = True
+        try:
+            conn = super()._do_get()
+            timed_out = False
+            return conn
+        finally:
+            with stats.lock:
+                stats.waiting -= 1
+            stats.record(time.perf_counter() - started, timed_out)
+
+    def recreate(self):
+        # dispose() / pre-ping invalidation rebuild the pool; keep counting into the same stats
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class MeteredQueuePool(_MeteredPoolMixin, QueuePool):
+    pass
+
+
+class MeteredAsyncQueuePool(_MeteredPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+_engines: Dict[str, Engine] = {}
+_engines_lock = threading.Lock()
+
+
+def _register(name: str, engine: Engine) -> None:
+    with _engines_lock:
+        _engines[name] = engine
+
+
+def _engine_kwargs(settings: EngineSettings, pool_class) -> Dict[str, Any]:
+    kwargs: Dict[str, Any] = {"pool_pre_ping": settings.pool_pre_ping}
+    if settings.pool_size <= 0:
+        kwargs["poolclass"] = NullPool
+    else:
+        kwargs.update(
+            poolclass=pool_class,
+            pool_size=settings.pool_size,
+            max_overflow=settings.max_overflow,
+            pool_timeout=settings.pool_timeout,
+            pool_recycle=settings.pool_recycle,
+        )
+    return kwargs
+
+
+def _is_postgres(url: str) -> bool:
+    return make_url(url).get_backend_name() == "postgresql"
+
+
+def _apply_statement_timeout_per_transaction(engine: Engine, timeout_ms: int) -> None:
+    @event.listens_for(engine, "begin")
+    def _set_local_timeout(conn):
+        conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+
+
+def build_engine(url: str, name: str = "primary", settings: Optional[EngineSettings] = None) -> Engine:
+    settings = settings or EngineSettings.from_env()
+    kwargs = _engine_kwargs(settings, MeteredQueuePool)
+    postgres = _is_postgres(url)
+    if postgres and settings.statement_timeout_ms and not settings.pgbouncer:
+        kwargs["connect_args"] = {"options": f"-c statement_timeout={settings.statement_timeout_ms}"}
+    engine = create_engine(url, **kwargs)
+    if postgres and settings.statement_timeout_ms and settings.pgbouncer:
+        _apply_statement_timeout_per_transaction(engine, settings.statement_timeout_ms)
+    _register(name, engine)
+    return engine
+
+
+def build_async_engine(url: str, name: str = "async", settings: Optional[EngineSettings] = None):
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    settings = settings or EngineSettings.from_env()
+    kwargs = _engine_kwargs(settings, MeteredAsyncQueuePool)
+    postgres = _is_postgres(url)
+    connect_args: Dict[str, Any] = {}
+    if postgres and settings.pgbouncer:
+        # Prepared statements do not survive PgBouncer handing out another server connection
+        connect_args["statement_cache_size"] = 0
+        kwargs["connect_args"] = connect_args
+        url = make_url(url).update_query_dict({"prepared_statement_cache_size": "0"}).render_as_string(
+            hide_password=False
+        )
+    elif postgres and settings.statement_timeout_ms:
+        connect_args["server_settings"] = {"statement_timeout": str(settings.statement_timeout_ms)}
+        kwargs["connect_args"] = connect_args
+    engine = create_async_engine(url, **kwargs)
+    if postgres and settings.statement_timeout_ms and settings.pgbouncer:
+        _apply_statement_timeout_per_transaction(engine.sync_engine, settings.statement_timeout_ms)
+    _register(name, engine.sync_engine)
+    return engine
+
+
+def pool_metrics() -> Dict[str, Any]:
+    """Per-engine pool occupancy and checkout wait times for this worker."""
+    with _engines_lock:
+        engines = dict(_engines)
+    out: Dict[str, Any] = {}
+    for name, engine in engines.items():
+        pool = engine.pool
+        entry: Dict[str, Any] = {"pool": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            entry.update(
+                size=pool.size(),
+                checked_out=pool.checkedout(),
+                idle=pool.checkedin(),
+                overflow=max(pool.overflow(), 0),
+                max_overflow=pool._max_overflow,
+            )
+        stats = getattr(pool, "stats", None)
+        if stats is not None:
+            entry.update(stats.snapshot())
+        out[name] = entry
+    return out
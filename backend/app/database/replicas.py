@@ -0,0 +1,174 @@
+"""
+Read-replica routing for read-only endpoints.
+
+DATABASE_REPLICA_URLS is a comma-separated list of Postgres replica URLs (streaming
+replicas of the primary; other databases are ignored, since the models live in the `public`
+schema and the routed endpoints use Postgres-only SQL). Endpoints that only read declare
+`dependencies=[Depends(use_read_replica)]`; their session then sends SELECTs to a replica
+picked round-robin among the healthy ones, while flushes and everything on other endpoints
+(progress, assignments, notifications, auth) stay on the primary.
+
+Health: a background thread pings every replica each REPLICA_HEALTH_CHECK_SEC and takes a
+failing one out of rotation until a later ping succeeds. With no healthy replica, reads fall
+back to the primary.
+
+Read-your-writes: replicas lag the primary slightly, so a user who just committed a change
+(any commit made by a session serving their request) reads from the primary for the next
+READ_YOUR_WRITES_SEC. The window is tracked per worker, like the principal cache, so it
+only holds while the user's requests land on the worker that served the write; another
+worker, or any request after the window, may read data the replica has not caught up on.
+Process-local caches must therefore not be filled from a replica: the leaderboard and
+gamification caches compute their entries inside database.primary_reads(), so lagging
+replica data is never pinned for a cache TTL.
+"""
+from __future__ import annotations
+
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.engine import Engine
+
+from app.database.engine_config import build_engine
+
+_logger = logging.getLogger(__name__)
+
+HEALTH_CHECK_INTERVAL_SEC = float(os.getenv("REPLICA_HEALTH_CHECK_SEC", "5"))
+READ_YOUR_WRITES_SEC = float(os.getenv("READ_YOUR_WRITES_SEC", "5"))
+_MAX_RECENT_WRITERS = 10000
+
+
+class Replica:
+    def __init__(self, name: str, engine: Engine):
+        self.name = name
+        self.engine = engine
+        self.healthy = True
+        self.last_error: Optional[str] = None
+
+    def ping(self) -> bool:
+        try:
+            with self.engine.connect() as conn:
+                conn.exec_driver_sql("SELECT 1")
+        except Exception as exc:
+            if self.healthy:
+                _logger.warning("Replica %s is down: %s", self.name, exc)
+            self.healthy = False
+            self.last_error = str(exc)
+            return False
+        if not self.healthy:
+            _logger.info("Replica %s is back in rotation", self.name)
+        self.healthy = True
+        self.last_error = None
+        return True
+
+
+class ReplicaRouter:
+    def __init__(self, urls: List[str]):
+        self.replicas = [Replica(f"replica-{i}", build_engine(url, name=f"replica-{i}")) for i, url in enumerate(urls)]
+        self._counter = itertools.count()
+        self._recent_writers: "OrderedDict[int, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def pick(self) -> Optional[Engine]:
+        """Next healthy replica engine, or None to stay on the primary."""
+        healthy = [r for r in self.replicas if r.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._counter) % len(healthy)].engine
+
+    def check(self) -> None:
+        for replica in self.replicas:
+            replica.ping()
+
+    def note_write(self, user_id: int) -> None:
+        with self._lock:
+            self._recent_writers[user_id] = time.monotonic() + READ_YOUR_WRITES_SEC
+            self._recent_writers.move_to_end(user_id)
+            while len(self._recent_writers) > _MAX_RECENT_WRITERS:
+                self._recent_writers.popitem(last=False)
+
+    def wrote_recently(self, user_id: Optional[int]) -> bool:
+        if user_id is None:
+            return False
+        with self._lock:
+            until = self._recent_writers.get(user_id)
+            if until is None:
+                return False
+            if until <= time.monotonic():
+                del self._recent_writers[user_id]
+                return False
+            return True
+
+    def _run(self) -> None:
+        while not self._stop.wait(HEALTH_CHECK_INTERVAL_SEC):
+            self.check()
+
+    def start(self) -> None:
+        if not self.replicas:
+            return
+        self.check()
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="replica-health", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=HEALTH_CHECK_INTERVAL_SEC + 1)
+            self._thread = None
+
+    def status(self) -> List[Dict[str, Any]]:
+        return [{"name": r.name, "healthy": r.healthy, "last_error": r.last_error} for r in self.replicas]
+
+
+def _urls_from_env() -> List[str]:
+    urls = []
+    for url in (u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",")):
+        if not url:
+            continue
+        if not url.startswith(("postgresql", "postgres://")):
+            _logger.error("Ignoring replica URL that is not Postgres: %s", url.split("://", 1)[0])
+            continue
+        urls.append(url)
+    return urls
+
+
+router = ReplicaRouter(_urls_from_env())
+
+
+def configure(urls: List[str]) -> None:
+    """Replace the replica set (scripts and local experiments); call start() again afterwards."""
+    global router
+    router.stop()
+    router = ReplicaRouter(urls)
+
+
+def pick() -> Optional[Engine]:
+    return router.pick()
+
+
+def note_write(user_id: int) -> None:
+    router.note_write(user_id)
+
+
+def wrote_recently(user_id: Optional[int]) -> bool:
+    return router.wrote_recently(user_id)
+
+
+def start() -> None:
+    router.start()
+
+
+def stop() -> None:
+    router.stop()
+
+
+def status() -> List[Dict[str, Any]]:
+    return router.status()
@@ -0,0 +1,90 @@
+"""
+What the app does to the schema when a worker starts.
+
+The schema is owned by Alembic (`alembic upgrade head`). Running create_all at import time
+made every worker reflect the whole schema against Postgres before serving, which slows
+cold starts and rolling deploys with many workers. The lifespan now calls prepare_schema(),
+controlled by DB_STARTUP_MODE:
+
+  create_all  create missing tables (default; keeps a fresh local database working
+              without running migrations)
+  skip        no DDL and no reflection; production workers after `alembic upgrade head`
+  verify      no DDL; check once that every mapped table and column exists and that the
+              database is at the Alembic head, and refuse to start otherwise
+"""
+from __future__ import annotations
+
+import logging
+import os
+from pathlib import Path
+from typing import List
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from app.database.database import Base
+
+_logger = logging.getLogger(__name__)
+
+MODES = ("create_all", "skip", "verify")
+BACKEND_ROOT = Path(__file__).resolve().parents[2]
+
+
+class SchemaMismatchError(RuntimeError):
+    """Raised in verify mode when the database does not match the models or migrations."""
+
+
+def startup_mode() -> str:
+    mode = os.getenv("DB_STARTUP_MODE", "create_all").strip().lower()
+    if mode not in MODES:
+        raise ValueError(f"DB_STARTUP_MODE must be one of {', '.join(MODES)}, got {mode!r}")
+    return mode
+
+
+def _alembic_heads() -> List[str]:
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
+
+    config = Config(str(BACKEND_ROOT / "alembic.ini"))
+    config.set_main_option("script_location", str(BACKEND_ROOT / "migrations"))
+    return list(ScriptDirectory.from_config(config).get_heads())
+
+
+def verify_schema(engine: Engine) -> List[str]:
+    """Human-readable problems; empty when the schema matches the models and Alembic head."""
+    problems: List[str] = []
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name, schema=table.schema):
+            problems.append(f"missing table {table.fullname}")
+            continue
+        existing = {c["name"] for c in inspector.get_columns(table.name, schema=table.schema)}
+        for column in table.columns:
+            if column.name not in existing:
+                problems.append(f"missing column {table.fullname}.{column.name}")
+
+    if inspector.has_table("alembic_version"):
+        with engine.connect() as conn:
+            current = {row[0] for row in conn.execute(text("SELECT version_num FROM alembic_version"))}
+        heads = set(_alembic_heads())
+        if current != heads:
+            problems.append(
+                f"database at revision {', '.join(sorted(current)) or 'none'}, "
+                f"migrations head is {', '.join(sorted(heads))}"
+            )
+    else:
+        problems.append("alembic_version table missing; run `alembic upgrade head`")
+    return problems
+
+
+def prepare_schema(engine: Engine) -> None:
+    mode = startup_mode()
+    if mode == "skip":
+        return
+    if mode == "create_all":
+        Base.metadata.create_all(bind=engine)
+        return
+    problems = verify_schema(engine)
+    if problems:
+        raise SchemaMismatchError("Database schema does not match the application: " + "; ".join(problems))
+    _logger.info("Database schema verified")
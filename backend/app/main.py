@@ -1,17 +1,44 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
+from app.auth import password_hasher, revocation
 from app.auth import routes as auth_routes
 from app.study_sets import routes as study_sets_routes
 from app.ai import routes as ai_routes
 from app.admin import routes as admin_routes
+from app.notifications import email_service
 from app.notifications import routes as notifications_routes
-from app.database.database import Base, engine
+from app.notifications.ws_manager import manager as ws_manager
+from app.database import database, replicas
+from app.database import startup as db_startup
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # DDL / verification per DB_STARTUP_MODE, once per worker and not at import time
+    db_startup.prepare_schema(database.engine)
+    # Warm the revoked-token filter and keep it in sync with other workers
+    revocation.start()
+    replicas.start()
+    # WebSocket pushes from sync handlers are handed to this loop
+    ws_manager.start()
+    # Queued email only goes out if scripts.email_worker runs; warn when it looks stalled
+    email_service.check_outbox(database.SessionLocal)
+    yield
+    await ws_manager.stop()
+    replicas.stop()
+    revocation.stop()
+    password_hasher.shutdown()
+    if database.async_engine is not None:
+        await database.async_engine.dispose()
+
 
-app = FastAPI(title="Edu Senior Backend")
+app = FastAPI(title="Edu Senior Backend", lifespan=lifespan)
 origins = [
     "http://localhost:5173",  # Vite
     "http://localhost:5175",  # Vite (alternative port)
@@ -27,6 +54,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"], 
     allow_headers=["*"], 
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Global exception handler to ensure CORS headers are always sent
@@ -52,6 +80,18 @@ async def http_exception_handler(request: Request, exc: StarletteHTTPException):
         },
     )
 
+@app.exception_handler(password_hasher.HashingBusyError)
+async def hashing_busy_handler(request: Request, exc: password_hasher.HashingBusyError):
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"detail": str(exc)},
+        headers={
+            "Retry-After": str(exc.retry_after),
+            "Access-Control-Allow-Origin": request.headers.get("origin", "*"),
+            "Access-Control-Allow-Credentials": "true",
+        },
+    )
+
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     import traceback
@@ -74,9 +114,12 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
         },
     )
 
-Base.metadata.create_all(bind=engine)
-
 app.include_router(auth_routes.router, prefix="/auth", tags=["Authentication"])
+if database.ASYNC_DB_ENABLED:
+    # Registered first so these async handlers take precedence over the sync ones
+    from app.study_sets import async_routes as study_sets_async_routes
+
+    app.include_router(study_sets_async_routes.router, prefix="/study-sets", tags=["Study Sets"])
 app.include_router(study_sets_routes.router, prefix="/study-sets", tags=["Study Sets"])
 app.include_router(ai_routes.router, prefix="/study-sets/ai", tags=["AI (Gemini)"])
 app.include_router(admin_routes.router, prefix="/admin", tags=["Admin"])
@@ -1,6 +1,5 @@
 """Create notifications + optional email + WebSocket push when a class assignment is created."""
 
-import asyncio
 import os
 from datetime import datetime
 from typing import List, Tuple
@@ -10,19 +9,27 @@ from sqlalchemy.orm import Session
 
 from app.auth.models import User
 from app.notifications import email_service
-from app.notifications.models import Notification as NotificationModel
 from app.notifications.ws_manager import manager as ws_manager
 from app.study_sets import models as study_models
 
 
-def _frontend_base() -> str:
-    return os.getenv("FRONTEND_URL", "http://localhost:5173").rstrip("/")
+_FAN_OUT_SQL = text("""
+    WITH inserted AS (
+        INSERT INTO public.notification (user_id, title, body, category, related_assignment_id, created_at)
+        SELECT e.user_id, :title, :body, 'assignment_new', :assignment_id, :created_at
+        FROM public.enrollment e
+        WHERE e.class_id = :class_id
+        RETURNING notification_id, user_id, created_at
+    )
+    SELECT i.notification_id, i.user_id, i.created_at, u.email
+    FROM inserted i
+    LEFT JOIN public."User" u ON u.user_id = i.user_id
+    ORDER BY i.notification_id
+""")
 
 
-async def _push_ws_batch(items: List[Tuple[int, dict]]) -> None:
-    if not items:
-        return
-    await asyncio.gather(*[ws_manager.send_json_to_user(uid, pl) for uid, pl in items])
+def _frontend_base() -> str:
+    return os.getenv("FRONTEND_URL", "http://localhost:5173").rstrip("/")
 
 
 def notify_students_new_assignment(
@@ -33,18 +40,18 @@ def notify_students_new_assignment(
     teacher_user: User,
     class_name: str,
 ) -> None:
-    """Notify all enrolled students in the class (in-app + email + WS)."""
+    """
+    Notify all enrolled students in the class (in-app + email + WS).
+
+    The notifications are written by one INSERT ... SELECT over the enrollment, returning the
+    new ids joined to each student's email; the emails go to the outbox in the same
+    transaction and WebSocket pushes are queued on the server loop, so the teacher's request
+    does not wait for delivery.
+    """
     if not assignment_row.class_id:
         return
 
     class_id = assignment_row.class_id
-    r = db.execute(
-        text("SELECT user_id FROM public.enrollment WHERE class_id = :cid"),
-        {"cid": class_id},
-    )
-    student_ids = [int(row[0]) for row in r.fetchall()]
-    if not student_ids:
-        return
 
     due_part = ""
     if assignment_row.due_date:
@@ -64,55 +71,46 @@ def notify_students_new_assignment(
     )
 
     teacher_label = teacher_user.name or teacher_user.email
+    email_body = (
+        f"Hello,\n\n{teacher_label} assigned a new study set to your class {class_name}.\n\n"
+        f"Set: {study_set_title}"
+        f"{due_part}"
+        f"{limit_part}\n\n"
+        f"Practice here: {practice_url}\n"
+    )
 
-    ws_items: List[Tuple[int, dict]] = []
+    rows = db.execute(
+        _FAN_OUT_SQL,
+        {
+            "class_id": class_id,
+            "title": title,
+            "body": body,
+            "assignment_id": assignment_row.assignment_id,
+            "created_at": datetime.utcnow(),
+        },
+    ).fetchall()
+    if not rows:
+        return
+    # Delivered by the email worker; queued in this transaction so no email is lost or sent twice
+    email_service.enqueue_many(db, [(row.email, title, email_body) for row in rows if row.email])
+    db.commit()
 
-    for sid in student_ids:
-        n = NotificationModel(
-            user_id=sid,
-            title=title,
-            body=body,
-            category="assignment_new",
-            related_assignment_id=assignment_row.assignment_id,
-            created_at=datetime.utcnow(),
-        )
-        db.add(n)
-        db.flush()
-
-        user = db.query(User).filter(User.user_id == sid).first()
-        if user and user.email:
-            email_service.send_email(
-                user.email,
-                subject=title,
-                plain_body=(
-                    f"Hello,\n\n{teacher_label} assigned a new study set to your class {class_name}.\n\n"
-                    f"Set: {study_set_title}"
-                    f"{due_part}"
-                    f"{limit_part}\n\n"
-                    f"Practice here: {practice_url}\n"
-                ),
-            )
-
-        ws_items.append(
-            (
-                sid,
-                {
-                    "type": "notification",
-                    "notification": {
-                        "id": n.notification_id,
-                        "title": n.title,
-                        "body": n.body,
-                        "category": n.category,
-                        "created_at": n.created_at.isoformat() if n.created_at else None,
-                        "read_at": None,
-                    },
+    ws_items: List[Tuple[int, dict]] = [
+        (
+            int(row.user_id),
+            {
+                "type": "notification",
+                "notification": {
+                    "id": row.notification_id,
+                    "title": title,
+                    "body": body,
+                    "category": "assignment_new",
+                    "created_at": row.created_at.isoformat() if row.created_at else None,
+                    "read_at": None,
                 },
-            )
+            },
         )
-
-    db.commit()
-
-    try:
-        asyncio.run(_push_ws_batch(ws_items))
-    except Exception:
-        pass
+        for row in rows
+    ]
+    # Runs on a threadpool thread: hand the pushes to the server loop that owns the sockets
+    ws_manager.dispatch(ws_items)
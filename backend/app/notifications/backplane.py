@@ -0,0 +1,258 @@
+"""
+Cross-process fan-out for WebSocket pushes.
+
+Each uvicorn worker only holds its own sockets, so ConnectionManager.dispatch() delivers to
+local sockets directly and publishes the same messages on a backplane; every other worker
+receives them and delivers to the sockets it holds. Backplanes implement `Backplane`:
+
+- PostgresBackplane (default, WS_BACKPLANE=postgres): NOTIFY on the `ws_push` channel from
+  a publisher thread, LISTEN on a dedicated connection in a listener thread. Messages are
+  packed into NOTIFY payloads below Postgres' 8000-byte limit; a single message that does
+  not fit is dropped and counted. LISTEN does not work through PgBouncer in transaction
+  mode, so point WS_BACKPLANE_URL at Postgres directly in that setup.
+- LocalBackplane (WS_BACKPLANE=local, and whenever the database is not Postgres): no
+  other processes, nothing to publish.
+
+Delivery latency (publish to socket write) and drop counters are reported by
+ConnectionManager.metrics() in /admin/metrics.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import queue
+import select
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Message = Tuple[int, Dict[str, Any]]
+# Called with (messages, sent_at as time.time() on the publisher) from a backplane thread
+Deliver = Callable[[List[Message], float], None]
+
+CHANNEL = "ws_push"
+# pg_notify payloads must stay under 8000 bytes
+MAX_PAYLOAD_BYTES = 7900
+RECONNECT_DELAY_SEC = float(os.getenv("WS_BACKPLANE_RECONNECT_SEC", "2"))
+
+
+class Backplane(ABC):
+    """Carries dispatches to the other processes; each receiver hands them to `deliver`."""
+
+    @abstractmethod
+    def start(self, deliver: Deliver) -> None:
+        ...
+
+    @abstractmethod
+    def publish(self, messages: List[Message]) -> None:
+        """Send to every other process; must not block (called from request threads and the loop)."""
+
+    @abstractmethod
+    def stop(self) -> None:
+        ...
+
+    def metrics(self) -> Dict[str, Any]:
+        return {"backplane": type(self).__name__}
+
+
+class LocalBackplane(Backplane):
+    def start(self, deliver: Deliver) -> None:
+        pass
+
+    def publish(self, messages: List[Message]) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+
+class PostgresBackplane(Backplane):
+    def __init__(self, connect: Callable[[], Any], channel: str = CHANNEL):
+        self._connect = connect
+        self.channel = channel
+        self.origin = uuid.uuid4().hex
+        self._outbox: "queue.Queue[Optional[List[Message]]]" = queue.Queue()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._deliver: Optional[Deliver] = None
+        self._lock = threading.Lock()
+        self._counters = {
+            "published_messages": 0,
+            "notifies_sent": 0,
+            "received_messages": 0,
+            "dropped_oversize": 0,
+            "dropped_publish_error": 0,
+            "dropped_malformed": 0,
+            "dropped_not_running": 0,
+            "reconnects": 0,
+        }
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += n
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"backplane": type(self).__name__, "channel": self.channel, **self._counters}
+
+    def start(self, deliver: Deliver) -> None:
+        if self._threads:
+            return
+        self._deliver = deliver
+        self._stop.clear()
+        for target, name in ((self._publish_loop, "ws-backplane-publish"), (self._listen_loop, "ws-backplane-listen")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._outbox.put(None)
+        for thread in self._threads:
+            thread.join(timeout=RECONNECT_DELAY_SEC + 1)
+        self._threads = []
+
+    def publish(self, messages: List[Message]) -> None:
+        if not messages:
+            return
+        if not self._threads or self._stop.is_set():
+            # Not started (scripts importing the manager) or stopped: nothing would drain the
+            # queue, so drop instead of growing it forever
+            self._count("dropped_not_running", len(messages))
+            return
+        self._outbox.put(messages)
+
+    # Publisher: pack queued messages into as few NOTIFYs as fit the payload limit
+
+    def _payloads(self, messages: List[Message]) -> List[str]:
+        sent_at = time.time()
+        payloads: List[str] = []
+        chunk: List[str] = []
+        size = 0
+
+        def envelope(items: List[str]) -> str:
+            return f'{{"o":"{self.origin}","t":{sent_at},"m":[{",".join(items)}]}}'
+
+        overhead = len(envelope([]).encode())
+        for user_id, payload in messages:
+            item = json.dumps([user_id, payload], separators=(",", ":"))
+            item_size = len(item.encode()) + 1
+            if overhead + item_size > MAX_PAYLOAD_BYTES:
+                self._count("dropped_oversize")
+                logger.warning("WebSocket message for user %s too large for the backplane", user_id)
+                continue
+            if chunk and overhead + size + item_size > MAX_PAYLOAD_BYTES:
+                payloads.append(envelope(chunk))
+                chunk, size = [], 0
+            chunk.append(item)
+            size += item_size
+        if chunk:
+            payloads.append(envelope(chunk))
+        return payloads
+
+    def _publish_loop(self) -> None:
+        conn = None
+        while not self._stop.is_set():
+            batch = self._outbox.get()
+            if batch is None:
+                break
+            messages = list(batch)
+            while True:
+                try:
+                    more = self._outbox.get_nowait()
+                except queue.Empty:
+                    break
+                if more is None:
+                    self._stop.set()
+                    break
+                messages.extend(more)
+            try:
+                if conn is None:
+                    conn = self._connect()
+                    conn.autocommit = True
+                with conn.cursor() as cur:
+                    for payload in self._payloads(messages):
+                        cur.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+                        self._count("notifies_sent")
+                self._count("published_messages", len(messages))
+            except Exception as exc:
+                self._count("dropped_publish_error", len(messages))
+                logger.warning("WebSocket backplane publish failed: %s", exc)
+                conn = self._close(conn)
+        self._close(conn)
+
+    # Listener: one connection blocked in select() on LISTEN
+
+    def _listen_loop(self) -> None:
+        conn = None
+        while not self._stop.is_set():
+            try:
+                if conn is None:
+                    conn = self._connect()
+                    conn.autocommit = True
+                    with conn.cursor() as cur:
+                        cur.execute(f"LISTEN {self.channel}")
+                if select.select([conn], [], [], 1.0) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    self._receive(conn.notifies.pop(0).payload)
+            except Exception as exc:
+                # Messages published while we reconnect are lost for this worker's sockets
+                logger.warning("WebSocket backplane listener error: %s", exc)
+                conn = self._close(conn)
+                self._count("reconnects")
+                self._stop.wait(RECONNECT_DELAY_SEC)
+        self._close(conn)
+
+    def _receive(self, raw: str) -> None:
+        try:
+            data = json.loads(raw)
+            if data.get("o") == self.origin:
+                return  # already delivered locally by the publishing process
+            messages = [(int(uid), payload) for uid, payload in data["m"]]
+            sent_at = float(data["t"])
+        except Exception:
+            self._count("dropped_malformed")
+            return
+        self._count("received_messages", len(messages))
+        if self._deliver is not None:
+            self._deliver(messages, sent_at)
+
+    @staticmethod
+    def _close(conn) -> None:
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        return None
+
+
+def _postgres_connector(url: str) -> Callable[[], Any]:
+    from sqlalchemy.engine import make_url
+    from sqlalchemy.dialects.postgresql.psycopg2 import PGDialect_psycopg2
+
+    dialect = PGDialect_psycopg2()
+    cargs, cparams = dialect.create_connect_args(make_url(url).set(drivername="postgresql+psycopg2"))
+
+    def connect():
+        import psycopg2
+
+        return psycopg2.connect(*cargs, **cparams)
+
+    return connect
+
+
+def from_env() -> Backplane:
+    url = os.getenv("WS_BACKPLANE_URL") or os.getenv("DATABASE_URL") or ""
+    name = os.getenv("WS_BACKPLANE", "postgres").strip().lower()
+    if name == "local" or not url.startswith(("postgresql", "postgres://")):
+        return LocalBackplane()
+    return PostgresBackplane(_postgres_connector(url))
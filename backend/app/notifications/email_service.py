@@ -1,48 +1,210 @@
-"""Optional SMTP email. If SMTP_HOST is unset, sending is skipped (logged only)."""
+"""
+Optional SMTP email. If SMTP_HOST is unset, sending is skipped (logged only).
+
+Request handlers do not talk to SMTP: enqueue() / enqueue_many() add rows to the
+email_outbox table in the caller's transaction, and the email worker
+(`python -m scripts.email_worker`, see email_worker.py) delivers them over a reused
+connection with retries. send_email() sends one message immediately, for scripts.
+
+Nothing is sent unless that worker runs. When the oldest due message has waited longer than
+EMAIL_PENDING_WARN_SEC, the API logs a warning at startup and whenever /admin/metrics reads
+the outbox, and the metrics report `worker_stalled`.
+"""
 
 import logging
 import os
 import smtplib
+from dataclasses import dataclass
+from datetime import datetime
 from email.message import EmailMessage
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+
+from app.notifications.models import EmailOutbox
 
 logger = logging.getLogger(__name__)
 
+PENDING_WARN_SEC = float(os.getenv("EMAIL_PENDING_WARN_SEC", "600"))
+
 
-def _smtp_configured() -> bool:
+def is_configured() -> bool:
     return bool(os.getenv("SMTP_HOST", "").strip())
 
 
-def send_email(to_address: str, subject: str, plain_body: str) -> None:
-    """Send a plain-text email. No-op when SMTP is not configured."""
-    if not _smtp_configured():
-        logger.info("Email skipped (SMTP not configured): to=%s subject=%s", to_address, subject)
-        return
+@dataclass(frozen=True)
+class SmtpSettings:
+    host: str
+    port: int
+    user: str
+    password: str
+    use_tls: bool
+    from_addr: str
+
+    @classmethod
+    def from_env(cls) -> "SmtpSettings":
+        user = os.getenv("SMTP_USER", "").strip()
+        return cls(
+            host=os.environ["SMTP_HOST"].strip(),
+            port=int(os.getenv("SMTP_PORT", "587")),
+            user=user,
+            password=os.getenv("SMTP_PASSWORD", "").strip(),
+            use_tls=os.getenv("SMTP_USE_TLS", "true").lower() in ("1", "true", "yes"),
+            from_addr=os.getenv("SMTP_FROM", user or "noreply@localhost"),
+        )
 
-    host = os.environ["SMTP_HOST"].strip()
-    port = int(os.getenv("SMTP_PORT", "587"))
-    user = os.getenv("SMTP_USER", "").strip()
-    password = os.getenv("SMTP_PASSWORD", "").strip()
-    use_tls = os.getenv("SMTP_USE_TLS", "true").lower() in ("1", "true", "yes")
-    from_addr = os.getenv("SMTP_FROM", user or "noreply@localhost")
 
+def build_message(settings: SmtpSettings, to_address: str, subject: str, plain_body: str) -> EmailMessage:
     msg = EmailMessage()
     msg["Subject"] = subject
-    msg["From"] = from_addr
+    msg["From"] = settings.from_addr
     msg["To"] = to_address
     msg.set_content(plain_body)
+    return msg
 
-    try:
-        if use_tls:
-            with smtplib.SMTP(host, port, timeout=30) as smtp:
+
+class SmtpConnection:
+    """One SMTP session (connect, STARTTLS, login) reused for many messages."""
+
+    def __init__(self, settings: SmtpSettings, timeout: float = 30):
+        self.settings = settings
+        self.timeout = timeout
+        self._smtp: Optional[smtplib.SMTP] = None
+        self.sent_on_connection = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self._smtp is not None
+
+    def open(self) -> None:
+        if self._smtp is not None:
+            return
+        smtp = smtplib.SMTP(self.settings.host, self.settings.port, timeout=self.timeout)
+        try:
+            if self.settings.use_tls:
                 smtp.starttls()
-                if user:
-                    smtp.login(user, password)
-                smtp.send_message(msg)
-        else:
-            with smtplib.SMTP(host, port, timeout=30) as smtp:
-                if user:
-                    smtp.login(user, password)
-                smtp.send_message(msg)
+            if self.settings.user:
+                smtp.login(self.settings.user, self.settings.password)
+        except Exception:
+            smtp.close()
+            raise
+        self._smtp = smtp
+        self.sent_on_connection = 0
+
+    def send(self, msg: EmailMessage) -> None:
+        self.open()
+        try:
+            self._smtp.send_message(msg)
+        except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+            # The server rejected this message; the session itself is still usable
+            raise
+        except OSError:
+            # Disconnects and socket errors (SMTPException is an OSError too): drop the
+            # session, the caller decides whether to retry on a new one
+            self.close()
+            raise
+        self.sent_on_connection += 1
+
+    def close(self) -> None:
+        smtp, self._smtp = self._smtp, None
+        if smtp is None:
+            return
+        try:
+            smtp.quit()
+        except Exception:
+            smtp.close()
+
+
+def send_email(to_address: str, subject: str, plain_body: str) -> None:
+    """Send a plain-text email right away. No-op when SMTP is not configured."""
+    if not is_configured():
+        logger.info("Email skipped (SMTP not configured): to=%s subject=%s", to_address, subject)
+        return
+
+    settings = SmtpSettings.from_env()
+    conn = SmtpConnection(settings)
+    try:
+        conn.send(build_message(settings, to_address, subject, plain_body))
         logger.info("Email sent: to=%s subject=%s", to_address, subject)
     except Exception:
         logger.exception("Failed to send email to %s", to_address)
+    finally:
+        conn.close()
+
+
+def enqueue_many(db: Session, messages: Iterable[Tuple[str, str, str]]) -> int:
+    """
+    Queue (to_address, subject, plain_body) messages for the email worker; the caller commits.
+    No-op when SMTP is not configured. Returns how many were queued.
+    """
+    rows = [
+        {"to_address": to, "subject": subject, "body": body}
+        for to, subject, body in messages
+        if to
+    ]
+    if not rows:
+        return 0
+    if not is_configured():
+        logger.info("Email skipped (SMTP not configured): %d message(s)", len(rows))
+        return 0
+    now = datetime.utcnow()
+    for row in rows:
+        row.update(status="pending", attempts=0, next_attempt_at=now, created_at=now)
+    db.execute(insert(EmailOutbox), rows)
+    return len(rows)
+
+
+def enqueue(db: Session, to_address: str, subject: str, plain_body: str) -> None:
+    enqueue_many(db, [(to_address, subject, plain_body)])
+
+
+def outbox_stats(db: Session) -> Dict[str, Any]:
+    """Row counts per status and the age of the oldest due message, for /admin/metrics."""
+    counts = dict(
+        db.query(EmailOutbox.status, func.count()).group_by(EmailOutbox.status).all()
+    )
+    oldest = (
+        db.query(func.min(EmailOutbox.next_attempt_at))
+        .filter(EmailOutbox.status == "pending")
+        .scalar()
+    )
+    age = max(0.0, round((datetime.utcnow() - oldest).total_seconds(), 1)) if oldest else 0.0
+    stalled = _warn_if_stalled(age)
+    return {
+        "pending": int(counts.get("pending", 0)),
+        "sent": int(counts.get("sent", 0)),
+        "failed": int(counts.get("failed", 0)),
+        "oldest_pending_age_sec": age,
+        "worker_stalled": stalled,
+    }
+
+
+def _warn_if_stalled(oldest_pending_age_sec: float) -> bool:
+    if oldest_pending_age_sec <= PENDING_WARN_SEC:
+        return False
+    logger.warning(
+        "Email outbox: oldest pending message is %.0fs old; is `python -m scripts.email_worker` running?",
+        oldest_pending_age_sec,
+    )
+    return True
+
+
+def check_outbox(session_factory) -> None:
+    """Startup check: warn when queued email is not being delivered."""
+    if not is_configured():
+        return
+    db = session_factory()
+    try:
+        oldest = (
+            db.query(func.min(EmailOutbox.next_attempt_at))
+            .filter(EmailOutbox.status == "pending")
+            .scalar()
+        )
+    except Exception as exc:
+        logger.warning("Email outbox check skipped: %s", exc)
+        return
+    finally:
+        db.close()
+    if oldest is not None:
+        _warn_if_stalled((datetime.utcnow() - oldest).total_seconds())
@@ -0,0 +1,326 @@
+"""
+Background delivery of the email_outbox table.
+
+Run one or more workers with `python -m scripts.email_worker`. Each loop iteration claims up
+to EMAIL_WORKER_BATCH_SIZE due messages (FOR UPDATE SKIP LOCKED plus a lease in
+locked_until, so several workers never send the same row and a crashed worker's rows are
+picked up again after EMAIL_LEASE_SEC), sends them over one reused SMTP connection and
+records the outcome:
+
+- sent: status 'sent'.
+- transient failure (4xx reply, dropped connection, timeout): retried after
+  EMAIL_RETRY_BASE_SEC * 2^(attempts - 1), capped at EMAIL_RETRY_MAX_SEC, with jitter.
+- permanent failure (5xx reply, refused recipient) or EMAIL_MAX_ATTEMPTS reached:
+  status 'failed' with last_error.
+
+Sending is paced to EMAIL_RATE_PER_SEC and the connection is recycled every
+EMAIL_MAX_PER_CONNECTION messages, matching typical provider caps. Throughput is logged every
+EMAIL_METRICS_INTERVAL_SEC and available from EmailWorker.metrics().
+
+Every EMAIL_PURGE_INTERVAL_SEC the worker deletes 'sent' rows older than EMAIL_RETENTION_DAYS
+and 'failed' rows older than EMAIL_FAILED_RETENTION_DAYS (kept longer for inspection), in
+batches, so the table only holds recent history.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import random
+import smtplib
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+
+from app.database.database import SessionLocal
+from app.notifications import email_service
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.getenv("EMAIL_WORKER_BATCH_SIZE", "50"))
+POLL_INTERVAL_SEC = float(os.getenv("EMAIL_WORKER_POLL_SEC", "1"))
+LEASE_SEC = int(os.getenv("EMAIL_LEASE_SEC", "300"))
+MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "8"))
+RETRY_BASE_SEC = float(os.getenv("EMAIL_RETRY_BASE_SEC", "30"))
+RETRY_MAX_SEC = float(os.getenv("EMAIL_RETRY_MAX_SEC", "3600"))
+RATE_PER_SEC = float(os.getenv("EMAIL_RATE_PER_SEC", "10"))
+MAX_PER_CONNECTION = int(os.getenv("EMAIL_MAX_PER_CONNECTION", "100"))
+METRICS_INTERVAL_SEC = float(os.getenv("EMAIL_METRICS_INTERVAL_SEC", "60"))
+RETENTION_DAYS = float(os.getenv("EMAIL_RETENTION_DAYS", "7"))
+FAILED_RETENTION_DAYS = float(os.getenv("EMAIL_FAILED_RETENTION_DAYS", "30"))
+PURGE_INTERVAL_SEC = float(os.getenv("EMAIL_PURGE_INTERVAL_SEC", "3600"))
+PURGE_BATCH_SIZE = 5000
+
+_CLAIM_SQL = text("""
+    UPDATE public.email_outbox o
+    SET locked_until = :lease_until, attempts = o.attempts + 1
+    FROM (
+        SELECT email_id FROM public.email_outbox
+        WHERE status = 'pending'
+          AND next_attempt_at <= :now
+          AND (locked_until IS NULL OR locked_until < :now)
+        ORDER BY next_attempt_at, email_id
+        LIMIT :limit
+        FOR UPDATE SKIP LOCKED
+    ) due
+    WHERE o.email_id = due.email_id
+    RETURNING o.email_id, o.to_address, o.subject, o.body, o.attempts
+""")
+
+_MARK_SENT_SQL = text("""
+    UPDATE public.email_outbox
+    SET status = 'sent', sent_at = :now, locked_until = NULL, last_error = NULL
+    WHERE email_id = ANY(:ids)
+""")
+
+_MARK_RETRY_SQL = text("""
+    UPDATE public.email_outbox
+    SET next_attempt_at = :next_attempt_at, locked_until = NULL, last_error = :error
+    WHERE email_id = :email_id
+""")
+
+_MARK_FAILED_SQL = text("""
+    UPDATE public.email_outbox
+    SET status = 'failed', locked_until = NULL, last_error = :error
+    WHERE email_id = :email_id
+""")
+
+# next_attempt_at is never after sent_at / the last attempt, so the (status, next_attempt_at)
+# index narrows the scan
+_PURGE_SQL = text("""
+    DELETE FROM public.email_outbox
+    WHERE email_id IN (
+        SELECT email_id FROM public.email_outbox
+        WHERE (status = 'sent' AND next_attempt_at < :sent_cutoff AND sent_at < :sent_cutoff)
+           OR (status = 'failed' AND next_attempt_at < :failed_cutoff)
+        LIMIT :limit
+    )
+""")
+
+
+class _RateLimiter:
+    """Spaces calls at least 1 / rate seconds apart (rate <= 0 disables pacing)."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = time.monotonic()
+
+    def wait(self, stop: threading.Event) -> None:
+        if not self.interval:
+            return
+        delay = self._next - time.monotonic()
+        if delay > 0:
+            stop.wait(delay)
+        self._next = max(self._next, time.monotonic()) + self.interval
+
+
+class _Metrics:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.batches = 0
+        self.connections = 0
+        self.purged = 0
+        self.send_seconds_total = 0.0
+        self._window_started = time.monotonic()
+        self._window_sent = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            elapsed = max(time.monotonic() - self.started, 1e-9)
+            window = max(time.monotonic() - self._window_started, 1e-9)
+            return {
+                "sent": self.sent,
+                "retried": self.retried,
+                "failed": self.failed,
+                "batches": self.batches,
+                "smtp_connections": self.connections,
+                "purged": self.purged,
+                "send_ms_avg": round(self.send_seconds_total * 1000 / (self.sent or 1), 2),
+                "throughput_per_sec": round(self.sent / elapsed, 2),
+                "throughput_per_sec_recent": round(self._window_sent / window, 2),
+            }
+
+    def roll_window(self) -> None:
+        with self.lock:
+            self._window_started = time.monotonic()
+            self._window_sent = 0
+
+
+def _is_permanent(exc: Exception) -> bool:
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in exc.recipients.values())
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return exc.smtp_code >= 500
+    return False
+
+
+def _is_connection_error(exc: Exception) -> bool:
+    # SMTPException subclasses OSError; only socket-level failures mean the server is unreachable
+    return isinstance(exc, OSError) and not isinstance(
+        exc, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)
+    )
+
+
+def retry_delay(attempts: int) -> float:
+    """Seconds before the next attempt after `attempts` failed ones (exponential, jittered)."""
+    delay = min(RETRY_MAX_SEC, RETRY_BASE_SEC * (2 ** max(attempts - 1, 0)))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class EmailWorker:
+    def __init__(self, session_factory=SessionLocal, settings: Optional[email_service.SmtpSettings] = None):
+        self._session_factory = session_factory
+        self.settings = settings or email_service.SmtpSettings.from_env()
+        self._conn = email_service.SmtpConnection(self.settings)
+        self._limiter = _RateLimiter(RATE_PER_SEC)
+        self._metrics = _Metrics()
+        self._stop = threading.Event()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def metrics(self) -> Dict[str, Any]:
+        return self._metrics.snapshot()
+
+    def _claim(self) -> List[Any]:
+        db = self._session_factory()
+        try:
+            now = datetime.utcnow()
+            rows = db.execute(
+                _CLAIM_SQL,
+                {"now": now, "lease_until": now + timedelta(seconds=LEASE_SEC), "limit": BATCH_SIZE},
+            ).fetchall()
+            db.commit()
+            return rows
+        finally:
+            db.close()
+
+    def _send(self, row) -> None:
+        if self._conn.is_open and self._conn.sent_on_connection >= MAX_PER_CONNECTION:
+            self._conn.close()
+        if not self._conn.is_open:
+            self._conn.open()
+            with self._metrics.lock:
+                self._metrics.connections += 1
+        self._limiter.wait(self._stop)
+        msg = email_service.build_message(self.settings, row.to_address, row.subject, row.body)
+        started = time.perf_counter()
+        self._conn.send(msg)
+        with self._metrics.lock:
+            self._metrics.sent += 1
+            self._metrics._window_sent += 1
+            self._metrics.send_seconds_total += time.perf_counter() - started
+
+    def run_batch(self) -> int:
+        """Claim and deliver one batch; returns how many messages were claimed."""
+        rows = self._claim()
+        if not rows:
+            return 0
+        sent_ids: List[int] = []
+        retries: List[Dict[str, Any]] = []
+        failures: List[Dict[str, Any]] = []
+        connection_error: Optional[str] = None
+        for row in rows:
+            if self._stop.is_set():
+                # Unsent rows keep their lease and are picked up again once it expires
+                break
+            if connection_error is None:
+                try:
+                    self._send(row)
+                    sent_ids.append(row.email_id)
+                    continue
+                except Exception as exc:
+                    error = f"{type(exc).__name__}: {exc}"[:2000]
+                    if _is_connection_error(exc):
+                        # Server unreachable: do not wait out a timeout for every row of the batch
+                        connection_error = error
+                    permanent = _is_permanent(exc)
+            else:
+                error, permanent = connection_error, False
+            if permanent or row.attempts >= MAX_ATTEMPTS:
+                logger.warning("Email %s to %s failed permanently: %s", row.email_id, row.to_address, error)
+                failures.append({"email_id": row.email_id, "error": error})
+            else:
+                next_at = datetime.utcnow() + timedelta(seconds=retry_delay(row.attempts))
+                retries.append({"email_id": row.email_id, "error": error, "next_attempt_at": next_at})
+
+        db = self._session_factory()
+        try:
+            if sent_ids:
+                db.execute(_MARK_SENT_SQL, {"ids": sent_ids, "now": datetime.utcnow()})
+            if retries:
+                db.execute(_MARK_RETRY_SQL, retries)
+            if failures:
+                db.execute(_MARK_FAILED_SQL, failures)
+            db.commit()
+        finally:
+            db.close()
+
+        with self._metrics.lock:
+            self._metrics.batches += 1
+            self._metrics.retried += len(retries)
+            self._metrics.failed += len(failures)
+        return len(rows)
+
+    def purge(self) -> int:
+        """Delete sent and failed rows past their retention; returns how many were removed."""
+        now = datetime.utcnow()
+        params = {
+            "sent_cutoff": now - timedelta(days=RETENTION_DAYS),
+            "failed_cutoff": now - timedelta(days=FAILED_RETENTION_DAYS),
+            "limit": PURGE_BATCH_SIZE,
+        }
+        removed = 0
+        while not self._stop.is_set():
+            # Short transactions: a large backlog does not hold row locks for long
+            db = self._session_factory()
+            try:
+                count = db.execute(_PURGE_SQL, params).rowcount or 0
+                db.commit()
+            finally:
+                db.close()
+            removed += count
+            if count < PURGE_BATCH_SIZE:
+                break
+        with self._metrics.lock:
+            self._metrics.purged += removed
+        return removed
+
+    def run(self, once: bool = False) -> None:
+        """Deliver until stop() (or, with once=True, until nothing is due)."""
+        next_report = time.monotonic() + METRICS_INTERVAL_SEC
+        next_purge = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                if time.monotonic() >= next_purge:
+                    try:
+                        removed = self.purge()
+                        if removed:
+                            logger.info("Purged %d old email_outbox row(s)", removed)
+                    except Exception:
+                        logger.exception("Email outbox purge failed")
+                    next_purge = time.monotonic() + PURGE_INTERVAL_SEC
+                try:
+                    claimed = self.run_batch()
+                except Exception:
+                    logger.exception("Email worker batch failed")
+                    self._conn.close()
+                    claimed = 0
+                if time.monotonic() >= next_report:
+                    logger.info("Email worker: %s", self.metrics())
+                    self._metrics.roll_window()
+                    next_report = time.monotonic() + METRICS_INTERVAL_SEC
+                if not claimed:
+                    if once:
+                        break
+                    # Idle: do not hold the SMTP session open between bursts
+                    self._conn.close()
+                    self._stop.wait(POLL_INTERVAL_SEC)
+        finally:
+            self._conn.close()
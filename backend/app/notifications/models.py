@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, Text
 
 from app.database.database import Base
 
@@ -21,3 +21,26 @@ class Notification(Base):
         ForeignKey("public.study_set_assignment.assignment_id", ondelete="SET NULL"),
         nullable=True,
     )
+
+
+class EmailOutbox(Base):
+    """Emails waiting for (or done with) delivery by the email worker; see email_worker."""
+
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        # Claim query: pending rows whose next attempt is due, oldest first
+        Index("ix_email_outbox_status_next_attempt", "status", "next_attempt_at"),
+        {"schema": "public"},
+    )
+
+    email_id = Column(Integer, primary_key=True, autoincrement=True)
+    to_address = Column(String(320), nullable=False)
+    subject = Column(String(500), nullable=False)
+    body = Column(Text, nullable=False)
+    status = Column(String(20), nullable=False, default="pending")  # pending | sent | failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_until = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
@@ -1,45 +1,259 @@
-"""In-memory WebSocket connections per user (single-server deployments)."""
+"""
+WebSocket connections per user, held in memory by each worker process.
+
+Sockets belong to the server's event loop, so sends must run there. Code on other threads
+(sync handlers in the threadpool, background workers) calls dispatch(), which hands the
+messages to the owning loop with call_soon_threadsafe; a drain task on that loop groups
+everything queued since its last pass per user and sends each connection its messages in
+one go, connections in parallel.
+
+Connections are kept as an immutable set per user in a mapping that is replaced, never
+mutated (copy-on-write): connect/disconnect run on the loop without awaiting, so they need
+no lock, and senders and metrics() read a consistent snapshot without one. Each payload is
+serialized once per drain pass and the same text is written to every socket, and each
+socket gets WS_SEND_TIMEOUT_SEC to take its messages; sockets that fail or time out are
+closed and removed together in one update.
+
+dispatch() also publishes the messages on the backplane (see backplane.py) so the other
+workers deliver them to the sockets they hold.
+"""
 
 from __future__ import annotations
 
 import asyncio
+import json
+import logging
+import os
+import threading
+import time
 from collections import defaultdict
-from typing import Any, DefaultDict, List
+from typing import Any, DefaultDict, Dict, FrozenSet, Iterable, List, Mapping, Optional, Tuple
 
 from starlette.websockets import WebSocket
 
+from app.notifications import backplane as backplanes
 
-class ConnectionManager:
+logger = logging.getLogger(__name__)
+
+Message = Tuple[int, Dict[str, Any]]
+
+SEND_TIMEOUT_SEC = float(os.getenv("WS_SEND_TIMEOUT_SEC", "5"))
+
+
+class _DeliveryMetrics:
     def __init__(self) -> None:
-        self._connections: DefaultDict[int, List[WebSocket]] = defaultdict(list)
-        self._lock = asyncio.Lock()
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.remote_batches = 0
+        self.messages = 0
+        self.dropped_no_loop = 0
+        self.send_timeouts = 0
+        self.send_errors = 0
+        self.latency_seconds_total = 0.0
+        self.latency_seconds_max = 0.0
+
+    def record(self, sent_at: float, messages: int, remote: bool) -> None:
+        latency = max(0.0, time.time() - sent_at)
+        with self.lock:
+            self.batches += 1
+            self.remote_batches += 1 if remote else 0
+            self.messages += messages
+            self.latency_seconds_total += latency
+            self.latency_seconds_max = max(self.latency_seconds_max, latency)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "delivered_batches": self.batches,
+                "delivered_remote_batches": self.remote_batches,
+                "delivered_messages": self.messages,
+                "dropped_no_loop": self.dropped_no_loop,
+                "send_timeouts": self.send_timeouts,
+                "send_errors": self.send_errors,
+                "delivery_latency_ms_avg": round(self.latency_seconds_total * 1000 / (self.batches or 1), 2),
+                "delivery_latency_ms_max": round(self.latency_seconds_max * 1000, 2),
+            }
+
+
+class ConnectionManager:
+    def __init__(self, backplane: Optional[backplanes.Backplane] = None) -> None:
+        # Replaced wholesale on every change (never mutated in place), see module docstring
+        self._connections: Mapping[int, FrozenSet[WebSocket]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._drain_task: Optional[asyncio.Task] = None
+        self.backplane = backplane or backplanes.LocalBackplane()
+        self._metrics = _DeliveryMetrics()
+
+    def start(self) -> None:
+        """Bind to the running (server) loop and start the drain task; idempotent."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._drain_task is not None and not self._drain_task.done():
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._drain_task = loop.create_task(self._drain(), name="ws-dispatch")
+        self.backplane.start(self._deliver_remote)
+
+    async def stop(self) -> None:
+        self.backplane.stop()
+        task, self._drain_task = self._drain_task, None
+        self._loop = None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
 
     async def connect(self, user_id: int, websocket: WebSocket) -> None:
+        if self._drain_task is None:
+            # Started outside the app lifespan (tests): bind to the loop serving sockets
+            self.start()
         await websocket.accept()
-        async with self._lock:
-            self._connections[user_id].append(websocket)
+        connections = dict(self._connections)
+        connections[user_id] = connections.get(user_id, frozenset()) | {websocket}
+        self._connections = connections
 
     async def disconnect(self, user_id: int, websocket: WebSocket) -> None:
-        async with self._lock:
-            conns = self._connections.get(user_id)
-            if not conns:
-                return
-            if websocket in conns:
-                conns.remove(websocket)
-            if not conns:
-                del self._connections[user_id]
+        self._remove({user_id: [websocket]})
+
+    def _remove(self, dead: Mapping[int, Iterable[WebSocket]]) -> None:
+        # No await between reading and replacing the mapping, so this is atomic on the loop
+        connections = dict(self._connections)
+        for user_id, sockets in dead.items():
+            remaining = connections.get(user_id, frozenset()).difference(sockets)
+            if remaining:
+                connections[user_id] = remaining
+            else:
+                connections.pop(user_id, None)
+        self._connections = connections
 
     async def send_json_to_user(self, user_id: int, payload: dict[str, Any]) -> None:
-        async with self._lock:
-            conns = list(self._connections.get(user_id, []))
-        dead: List[WebSocket] = []
-        for ws in conns:
+        await self._send({user_id: [_serialize(payload)]})
+
+    async def _send(self, per_user: Mapping[int, List[str]]) -> None:
+        """Write each user's serialized messages to all of their sockets, sockets in parallel."""
+        connections = self._connections
+        targets = [
+            (user_id, ws, texts)
+            for user_id, texts in per_user.items()
+            for ws in connections.get(user_id, ())
+        ]
+        if not targets:
+            return
+        results = await asyncio.gather(*(self._send_socket(ws, texts) for _, ws, texts in targets))
+        dead: DefaultDict[int, List[WebSocket]] = defaultdict(list)
+        for (user_id, ws, _), ok in zip(targets, results):
+            if not ok:
+                dead[user_id].append(ws)
+        if dead:
+            self._remove(dead)
+            await asyncio.gather(*(_close_quietly(ws) for sockets in dead.values() for ws in sockets))
+
+    async def _send_socket(self, ws: WebSocket, texts: List[str]) -> bool:
+        async def send_all() -> None:
+            for text in texts:
+                await ws.send_text(text)
+
+        try:
+            await asyncio.wait_for(send_all(), SEND_TIMEOUT_SEC)
+            return True
+        except asyncio.TimeoutError:
+            counter = "send_timeouts"
+        except Exception:
+            counter = "send_errors"
+        with self._metrics.lock:
+            setattr(self._metrics, counter, getattr(self._metrics, counter) + 1)
+        return False
+
+    def dispatch(self, items: Iterable[Message]) -> bool:
+        """
+        Deliver (user_id, payload) messages to every worker's sockets; callable from any
+        thread, never blocks. Returns False when this worker has no server loop running;
+        the messages are then dropped (and counted), since the backplane only publishes
+        while started.
+        """
+        batch = list(items)
+        if not batch:
+            return True
+        self.backplane.publish(batch)
+        return self._enqueue(batch, time.time(), remote=False)
+
+    def _deliver_remote(self, batch: List[Message], sent_at: float) -> None:
+        # Called from the backplane's listener thread
+        self._enqueue(batch, sent_at, remote=True)
+
+    def _enqueue(self, batch: List[Message], sent_at: float, remote: bool) -> bool:
+        loop, queue = self._loop, self._queue
+        item = (batch, sent_at, remote)
+        if loop is None or queue is None or loop.is_closed():
+            return self._drop(len(batch), "no server loop")
+        try:
+            on_loop = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            queue.put_nowait(item)
+        else:
             try:
-                await ws.send_json(payload)
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                # Loop closed between the check and the call (shutdown)
+                return self._drop(len(batch), "loop closed")
+        return True
+
+    def _drop(self, count: int, reason: str) -> bool:
+        with self._metrics.lock:
+            self._metrics.dropped_no_loop += count
+        logger.warning("WebSocket dispatch dropped %d message(s): %s", count, reason)
+        return False
+
+    async def _drain(self) -> None:
+        queue = self._queue
+        while True:
+            items = [await queue.get()]
+            while not queue.empty():
+                items.append(queue.get_nowait())
+            connections = self._connections
+            per_user: DefaultDict[int, List[str]] = defaultdict(list)
+            serialized: Dict[int, str] = {}
+            for batch, _, _ in items:
+                for user_id, payload in batch:
+                    if user_id not in connections:
+                        continue
+                    # The same payload object may go to many users: serialize it once
+                    text = serialized.get(id(payload))
+                    if text is None:
+                        text = serialized[id(payload)] = _serialize(payload)
+                    per_user[user_id].append(text)
+            try:
+                await self._send(per_user)
             except Exception:
-                dead.append(ws)
-        for ws in dead:
-            await self.disconnect(user_id, ws)
+                logger.exception("WebSocket dispatch failed")
+            for batch, sent_at, remote in items:
+                self._metrics.record(sent_at, len(batch), remote)
+
+    def metrics(self) -> Dict[str, Any]:
+        connections = self._connections
+        return {
+            "connected_users": len(connections),
+            "connections": sum(len(c) for c in connections.values()),
+            **self._metrics.snapshot(),
+            **self.backplane.metrics(),
+        }
+
+
+def _serialize(payload: Dict[str, Any]) -> str:
+    # Same encoding as WebSocket.send_json
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+
+async def _close_quietly(ws: WebSocket) -> None:
+    try:
+        await asyncio.wait_for(ws.close(), SEND_TIMEOUT_SEC)
+    except Exception:
+        pass
 
 
-manager = ConnectionManager()
+manager = ConnectionManager(backplanes.from_env())
@@ -1,12 +1,25 @@
-"""Study set access checks (public catalog vs private vs assignments)."""
+"""Study set access checks (public catalog vs private vs assignments).
+
+Checks take an AccessContext: the caller's role plus the class and assignment ids that
+access decisions depend on. Handlers get one per request via `Depends(get_access_context)`;
+each id set is loaded on first use and then reused by every check in that request.
+Non-public visibility (creator, direct and class assignment) comes from the materialized
+study_set_visibility index, see visibility_index.
+"""
 
 from __future__ import annotations
 
+from functools import cached_property
+from typing import Dict, FrozenSet, Iterable, Sequence
+
+from fastapi import Depends
 from sqlalchemy import and_, or_, text
 from sqlalchemy.orm import Session
 
+from app.auth.deps import get_current_user
 from app.auth.models import User
-from app.study_sets import models
+from app.database.database import get_db
+from app.study_sets import models, visibility_index
 
 
 def enrolled_class_ids(db: Session, user_id: int) -> list[int]:
@@ -22,139 +35,186 @@ def teacher_class_ids(db: Session, user_id: int) -> list[int]:
     return [row[0] for row in rows]
 
 
-def student_legacy_assignment_exists(db: Session, user_id: int, set_id: int) -> bool:
-    direct = (
-        db.query(models.StudySetAssignment)
-        .join(models.StudySetStudentAssignment)
-        .filter(
-            and_(
-                models.StudySetAssignment.set_id == set_id,
-                models.StudySetStudentAssignment.user_id == user_id,
-            )
-        )
-        .first()
-        is not None
-    )
-    if direct:
-        return True
-    enrolled = enrolled_class_ids(db, user_id)
-    if not enrolled:
-        return False
-    return (
-        db.query(models.StudySetAssignment)
-        .filter(
-            and_(
-                models.StudySetAssignment.set_id == set_id,
-                models.StudySetAssignment.class_id.in_(enrolled),
-            )
-        )
-        .first()
-        is not None
-    )
+class AccessContext:
+    """The caller as seen by access checks, scoped to one request (and its session)."""
 
+    def __init__(self, db: Session, user: User):
+        self.db = db
+        self.user = user
+        self.user_id = user.user_id
+        self.role = (user.role.name or "").lower() if user.role else ""
+
+    @property
+    def is_student(self) -> bool:
+        return self.role == "student"
+
+    @property
+    def is_teacher(self) -> bool:
+        return self.role == "teacher"
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role == "admin"
+
+    @cached_property
+    def enrolled_class_ids(self) -> FrozenSet[int]:
+        return frozenset(enrolled_class_ids(self.db, self.user_id))
+
+    @cached_property
+    def taught_class_ids(self) -> FrozenSet[int]:
+        return frozenset(teacher_class_ids(self.db, self.user_id))
+
+    @cached_property
+    def visibility(self) -> Dict[int, int]:
+        """set_id -> visibility_index reason bits for every non-public set the user can see."""
+        return visibility_index.reasons_for_user(self.db, self.user_id)
+
+    def _set_ids_with(self, reasons: int) -> FrozenSet[int]:
+        return frozenset(set_id for set_id, bits in self.visibility.items() if bits & reasons)
+
+    @cached_property
+    def direct_set_ids(self) -> FrozenSet[int]:
+        """Sets assigned to the user individually (StudySetStudentAssignment)."""
+        return self._set_ids_with(visibility_index.DIRECT)
+
+    @cached_property
+    def class_set_ids(self) -> FrozenSet[int]:
+        """Sets assigned to a class the user is enrolled in."""
+        return self._set_ids_with(visibility_index.CLASS)
+
+    @cached_property
+    def assigned_set_ids(self) -> FrozenSet[int]:
+        return self._set_ids_with(visibility_index.ASSIGNED)
+
+
+def get_access_context(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> AccessContext:
+    return AccessContext(db, current_user)
+
+
+def student_legacy_assignment_exists(ctx: AccessContext, set_id: int) -> bool:
+    return set_id in ctx.assigned_set_ids
 
-def can_view_study_set(db: Session, user: User, study_set: models.StudySet) -> bool:
-    if study_set.creator_id == user.user_id:
-        return True
 
-    role_name = (user.role.name or "").lower() if user.role else ""
+def _can_view(ctx: AccessContext, study_set) -> bool:
+    """Decision for one set; `study_set` needs set_id, creator_id, is_public and is_shared."""
+    if study_set.creator_id == ctx.user_id:
+        return True
 
     if study_set.is_public:
         return True
 
-    if role_name == "student":
-        return student_legacy_assignment_exists(db, user.user_id, study_set.set_id)
+    if ctx.is_student:
+        return student_legacy_assignment_exists(ctx, study_set.set_id)
 
-    if role_name == "teacher":
-        if study_set.is_shared and study_set.creator_id != user.user_id:
+    if ctx.is_teacher:
+        if study_set.is_shared and study_set.creator_id != ctx.user_id:
             return True
         return False
 
-    if role_name == "admin":
+    if ctx.is_admin:
         return True
 
     return False
 
 
-def build_student_list_conditions(db: Session, user_id: int) -> list:
-    enrolled = enrolled_class_ids(db, user_id)
-    conds = [
-        models.StudySet.creator_id == user_id,
-        models.StudySet.is_public == True,  # noqa: E712
-    ]
-    conds.append(
-        models.StudySet.set_id.in_(
-            db.query(models.StudySetAssignment.set_id)
-            .join(models.StudySetStudentAssignment)
-            .filter(models.StudySetStudentAssignment.user_id == user_id)
+def _set_rows(ctx: AccessContext, set_ids: Iterable[int]) -> list:
+    set_ids = sorted({int(s) for s in set_ids})
+    if not set_ids:
+        return []
+    return (
+        ctx.db.query(
+            models.StudySet.set_id,
+            models.StudySet.creator_id,
+            models.StudySet.is_public,
+            models.StudySet.is_shared,
         )
+        .filter(models.StudySet.set_id.in_(set_ids))
+        .all()
     )
-    if enrolled:
-        conds.append(
-            models.StudySet.set_id.in_(
-                db.query(models.StudySetAssignment.set_id).filter(
-                    models.StudySetAssignment.class_id.in_(enrolled)
-                )
-            )
-        )
-    return conds
 
 
-def build_teacher_list_conditions(db: Session, user_id: int) -> list:
+def can_view_many(ctx: AccessContext, set_ids: Iterable[int]) -> Dict[int, bool]:
+    """
+    set_id -> whether the caller may view it, for many sets at once.
+
+    Costs one query for the sets plus the context's cached visibility lookup, whatever the
+    number of ids. Ids of sets that do not exist are left out of the result.
+    """
+    return {row.set_id: _can_view(ctx, row) for row in _set_rows(ctx, set_ids)}
+
+
+def can_view_study_set(ctx: AccessContext, study_set: models.StudySet) -> bool:
+    return _can_view(ctx, study_set)
+
+
+def build_student_list_conditions(ctx: AccessContext) -> list:
+    # Assigned sets come from the visibility index; own sets stay a column predicate so they
+    # never depend on the index being complete
+    return [
+        models.StudySet.creator_id == ctx.user_id,
+        models.StudySet.is_public == True,  # noqa: E712
+        models.StudySet.set_id.in_(visibility_index.visible_set_ids_select(ctx.user_id)),
+    ]
+
+
+def build_teacher_list_conditions(ctx: AccessContext) -> list:
     return [
-        models.StudySet.creator_id == user_id,
+        models.StudySet.creator_id == ctx.user_id,
         models.StudySet.is_public == True,  # noqa: E712
-        and_(models.StudySet.is_shared == True, models.StudySet.creator_id != user_id),  # noqa: E712
+        and_(models.StudySet.is_shared == True, models.StudySet.creator_id != ctx.user_id),  # noqa: E712
     ]
 
 
-def effective_practice_feedback_mode(db: Session, user: User, study_set: models.StudySet) -> str:
+def _feedback_modes(ctx: AccessContext, study_sets: Sequence) -> Dict[int, str]:
     """
     immediate: check answers & see correct option during practice (personal / public default).
     end_only: stricter — feedback mainly after submitting the session (teacher-assigned default).
-    """
-    role_name = (user.role.name or "").lower() if user.role else ""
-    if role_name != "student":
-        return "immediate"
-    if study_set.creator_id == user.user_id:
-        return "immediate"
-    if study_set.is_public:
-        return "immediate"
 
-    modes: list[str] = []
+    A student's assigned set is end_only if any assignment reaching them (directly or through an
+    enrolled class) is end_only; everything else is immediate.
+    """
+    modes = {s.set_id: "immediate" for s in study_sets}
+    if not ctx.is_student:
+        return modes
+    assigned = [
+        s.set_id
+        for s in study_sets
+        if s.creator_id != ctx.user_id and not s.is_public and s.set_id in ctx.assigned_set_ids
+    ]
+    if not assigned:
+        return modes
 
-    direct_rows = (
-        db.query(models.StudySetAssignment)
-        .join(models.StudySetStudentAssignment)
-        .filter(
+    rows = (
+        ctx.db.query(models.StudySetAssignment.set_id, models.StudySetAssignment.practice_feedback_mode)
+        .outerjoin(
+            models.StudySetStudentAssignment,
             and_(
-                models.StudySetAssignment.set_id == study_set.set_id,
-                models.StudySetStudentAssignment.user_id == user.user_id,
-            )
+                models.StudySetStudentAssignment.assignment_id == models.StudySetAssignment.assignment_id,
+                models.StudySetStudentAssignment.user_id == ctx.user_id,
+            ),
+        )
+        .filter(
+            models.StudySetAssignment.set_id.in_(sorted(assigned)),
+            or_(
+                models.StudySetStudentAssignment.user_id.isnot(None),
+                models.StudySetAssignment.class_id.in_(sorted(ctx.enrolled_class_ids)),
+            ),
         )
         .all()
     )
-    for row in direct_rows:
-        modes.append(getattr(row, "practice_feedback_mode", None) or "end_only")
-
-    enrolled = enrolled_class_ids(db, user.user_id)
-    if enrolled:
-        class_rows = (
-            db.query(models.StudySetAssignment)
-            .filter(
-                and_(
-                    models.StudySetAssignment.set_id == study_set.set_id,
-                    models.StudySetAssignment.class_id.in_(enrolled),
-                )
-            )
-            .all()
-        )
-        for row in class_rows:
-            modes.append(getattr(row, "practice_feedback_mode", None) or "end_only")
+    for set_id, mode in rows:
+        if (mode or "end_only") == "end_only":
+            modes[set_id] = "end_only"
+    return modes
+
+
+def feedback_modes_many(ctx: AccessContext, set_ids: Iterable[int]) -> Dict[int, str]:
+    """set_id -> effective practice feedback mode, from a constant number of queries."""
+    return _feedback_modes(ctx, _set_rows(ctx, set_ids))
 
-    if not modes:
-        return "immediate"
 
-    if "end_only" in modes:
-        return "end_only"
-    return "immediate"
+def effective_practice_feedback_mode(ctx: AccessContext, study_set: models.StudySet) -> str:
+    return _feedback_modes(ctx, [study_set])[study_set.set_id]
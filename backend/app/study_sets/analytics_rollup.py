@@ -0,0 +1,161 @@
+"""
+Precomputed teacher analytics per (set_id, class_id).
+
+GET /study-sets/analytics reads study_set_class_rollup instead of scanning enrollment and
+progress for every set. Rows are recomputed for just the affected keys inside the writer's
+transaction (progress writes, enrollment and assignment changes), so they are committed
+together with the change that caused them.
+
+class_id = ALL_CLASSES (0) holds the set-wide row: students are counted once even when they
+are enrolled in several classes the set is assigned to, matching the old per-set numbers.
+A missing row means "no assigned students" and reads as zeros.
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.study_sets import models
+
+ALL_CLASSES = 0
+
+# First key of pg_advisory_xact_lock(int, int); the second is the set_id
+_LOCK_NAMESPACE = 7301
+
+# (set_id, class_id, user_id) for every assigned student, optionally narrowed to some classes
+_MEMBERS_SQL = """
+    WITH members AS (
+        SELECT DISTINCT ssa.set_id, e.class_id, e.user_id
+        FROM public.study_set_assignment ssa
+        JOIN public.enrollment e ON e.class_id = ssa.class_id
+        WHERE ssa.set_id = ANY(:set_ids)
+    ),
+    scoped AS (
+        SELECT set_id, class_id, user_id FROM members {class_filter}
+        UNION ALL
+        SELECT DISTINCT set_id, {all_classes}, user_id FROM members
+    ),
+    agg AS (
+        SELECT
+            s.set_id,
+            s.class_id,
+            COUNT(*) AS student_count,
+            COUNT(p.progress_id) AS attempt_count,
+            COALESCE(SUM(p.mastery_percentage), 0) AS mastery_sum,
+            COUNT(p.progress_id) FILTER (WHERE p.items_completed = p.total_items) AS completion_count
+        FROM scoped s
+        LEFT JOIN public.study_set_progress p
+            ON p.set_id = s.set_id AND p.user_id = s.user_id
+        GROUP BY s.set_id, s.class_id
+    )
+"""
+
+_UPSERT_SQL = """
+    INSERT INTO public.study_set_class_rollup
+        (set_id, class_id, student_count, attempt_count, mastery_sum, completion_count, updated_at)
+    SELECT set_id, class_id, student_count, attempt_count, mastery_sum, completion_count, NOW()
+    FROM agg
+    ON CONFLICT (set_id, class_id) DO UPDATE SET
+        student_count = EXCLUDED.student_count,
+        attempt_count = EXCLUDED.attempt_count,
+        mastery_sum = EXCLUDED.mastery_sum,
+        completion_count = EXCLUDED.completion_count,
+        updated_at = EXCLUDED.updated_at
+"""
+
+# Keys in scope that no longer have assigned students
+_DELETE_STALE_SQL = """
+    DELETE FROM public.study_set_class_rollup r
+    WHERE r.set_id = ANY(:set_ids)
+      {class_filter}
+      AND NOT EXISTS (
+          SELECT 1 FROM agg a WHERE a.set_id = r.set_id AND a.class_id = r.class_id
+      )
+"""
+
+
+def _lock_sets(db: Session, set_ids: List[int]) -> None:
+    """Serialize recomputes of the same set until commit so concurrent writers cannot lose updates."""
+    for set_id in set_ids:
+        db.execute(
+            text("SELECT pg_advisory_xact_lock(:ns, :set_id)"),
+            {"ns": _LOCK_NAMESPACE, "set_id": set_id},
+        )
+
+
+def refresh(db: Session, set_ids: Iterable[int], class_ids: Optional[Iterable[int]] = None) -> None:
+    """
+    Recompute rollup rows for `set_ids` in the current transaction (caller commits).
+
+    With `class_ids`, only those per-class rows (plus the set-wide rows) are touched;
+    otherwise every class row of the sets is rebuilt.
+    """
+    set_ids = sorted({int(s) for s in set_ids})
+    if not set_ids:
+        return
+    params: Dict[str, object] = {"set_ids": set_ids}
+    if class_ids is None:
+        members_filter = ""
+        stale_filter = ""
+    else:
+        params["class_ids"] = sorted({int(c) for c in class_ids})
+        members_filter = "WHERE class_id = ANY(:class_ids)"
+        stale_filter = "AND (r.class_id = ANY(:class_ids) OR r.class_id = :all_classes)"
+        params["all_classes"] = ALL_CLASSES
+
+    # text() statements do not autoflush; pending ORM progress rows must be visible
+    db.flush()
+    _lock_sets(db, set_ids)
+    members = _MEMBERS_SQL.format(class_filter=members_filter, all_classes=ALL_CLASSES)
+    db.execute(text(members + _UPSERT_SQL), params)
+    db.execute(text(members + _DELETE_STALE_SQL.format(class_filter=stale_filter)), params)
+
+
+def refresh_for_student(db: Session, user_id: int, set_ids: Iterable[int]) -> None:
+    """After a progress write: only the student's classes and the set-wide rows can change."""
+    class_rows = db.execute(
+        text("SELECT class_id FROM public.enrollment WHERE user_id = :uid"),
+        {"uid": user_id},
+    ).fetchall()
+    refresh(db, set_ids, class_ids=[r[0] for r in class_rows])
+
+
+def refresh_for_class(db: Session, class_id: int) -> None:
+    """After enrollment changes in a class: its rows and the set-wide rows of its assigned sets."""
+    refresh(db, assigned_set_ids(db, [class_id]), class_ids=[class_id])
+
+
+def assigned_set_ids(db: Session, class_ids: Iterable[int]) -> List[int]:
+    class_ids = list(class_ids)
+    if not class_ids:
+        return []
+    rows = db.execute(
+        text("SELECT DISTINCT set_id FROM public.study_set_assignment WHERE class_id = ANY(:class_ids)"),
+        {"class_ids": class_ids},
+    ).fetchall()
+    return [int(r[0]) for r in rows]
+
+
+def rebuild_all(db: Session) -> int:
+    """Drop and recompute every rollup row (backfills); returns the number of sets covered."""
+    db.execute(text("DELETE FROM public.study_set_class_rollup"))
+    rows = db.execute(text("SELECT DISTINCT set_id FROM public.study_set_assignment")).fetchall()
+    set_ids = [int(r[0]) for r in rows]
+    refresh(db, set_ids)
+    return len(set_ids)
+
+
+def set_wide_rows(db: Session, set_ids: List[int]) -> Dict[int, models.StudySetClassRollup]:
+    if not set_ids:
+        return {}
+    rows = (
+        db.query(models.StudySetClassRollup)
+        .filter(
+            models.StudySetClassRollup.set_id.in_(set_ids),
+            models.StudySetClassRollup.class_id == ALL_CLASSES,
+        )
+        .all()
+    )
+    return {row.set_id: row for row in rows}
@@ -0,0 +1,140 @@
+"""
+Compiled answer keys for grading study set submissions.
+
+A key is built once per (set_id, updated_at) from the questions and their options, with
+every accepted answer resolved up front, and kept in a small LRU. Grading a submission is
+then a pure in-memory comparison. Question edits bump the set's updated_at and call
+invalidate(), so a stale key is never served.
+"""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, FrozenSet, Mapping, Optional, Tuple
+
+from sqlalchemy.orm import Session, selectinload
+
+from app.study_sets import models
+
+_MAX_KEYS = 256
+
+
+def normalize_question_type(value: Optional[str]) -> str:
+    if not value:
+        return ""
+    return value.strip().lower().replace(" ", "_").replace("/", "_")
+
+
+@dataclass(frozen=True)
+class CompiledQuestion:
+    question_id: int
+    type: str
+    # multiple_choice: option indices that count as correct
+    accepted_indices: FrozenSet[int]
+    # true_false: whether "true" is correct; other types: normalized expected text
+    expected_true: bool
+    expected_text: str
+
+
+@dataclass(frozen=True)
+class AnswerKey:
+    set_id: int
+    updated_at: datetime
+    questions: Tuple[CompiledQuestion, ...]
+
+    @property
+    def total(self) -> int:
+        return len(self.questions)
+
+    def grade(self, answers: Mapping[str, Any]) -> int:
+        """Number of correct answers; `answers` maps str(question_id) to the submitted value."""
+        correct = 0
+        for q in self.questions:
+            user_answer = answers.get(str(q.question_id))
+            if user_answer is not None and _is_correct(q, user_answer):
+                correct += 1
+        return correct
+
+
+def _is_correct(q: CompiledQuestion, user_answer: Any) -> bool:
+    if q.type == "multiple_choice":
+        try:
+            return int(user_answer) in q.accepted_indices
+        except (TypeError, ValueError):
+            return False
+    if q.type == "true_false":
+        return (str(user_answer).lower() == "true") == q.expected_true
+    return str(user_answer).strip().lower() == q.expected_text
+
+
+def _accepted_indices(correct_answer_raw: str, option_texts: Tuple[str, ...]) -> FrozenSet[int]:
+    # Backward-compatibility:
+    # `correct_answer` may be stored as option text, 0-based index, or 1-based index.
+    expected = correct_answer_raw.lower()
+    accepted = {i for i, text in enumerate(option_texts) if text.strip().lower() == expected}
+    try:
+        correct_answer_idx = int(correct_answer_raw)
+    except (TypeError, ValueError):
+        return frozenset(accepted)
+    if 0 <= correct_answer_idx < len(option_texts):
+        accepted.add(correct_answer_idx)
+    if 1 <= correct_answer_idx <= len(option_texts):
+        accepted.add(correct_answer_idx - 1)
+    return frozenset(accepted)
+
+
+def compile_key(db: Session, study_set: models.StudySet) -> AnswerKey:
+    questions = (
+        db.query(models.Question)
+        .options(selectinload(models.Question.options))
+        .filter(models.Question.set_id == study_set.set_id)
+        .all()
+    )
+    compiled = []
+    for question in questions:
+        normalized_type = normalize_question_type(question.type)
+        correct_answer_raw = str(question.correct_answer).strip()
+        accepted: FrozenSet[int] = frozenset()
+        if normalized_type == "multiple_choice":
+            option_texts = tuple(opt.option_text for opt in question.options)
+            accepted = _accepted_indices(correct_answer_raw, option_texts)
+        compiled.append(
+            CompiledQuestion(
+                question_id=question.question_id,
+                type=normalized_type,
+                accepted_indices=accepted,
+                expected_true=correct_answer_raw.lower() == "true",
+                expected_text=correct_answer_raw.lower(),
+            )
+        )
+    return AnswerKey(set_id=study_set.set_id, updated_at=study_set.updated_at, questions=tuple(compiled))
+
+
+_cache: "OrderedDict[Tuple[int, datetime], AnswerKey]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_answer_key(db: Session, study_set: models.StudySet) -> AnswerKey:
+    cache_key = (study_set.set_id, study_set.updated_at)
+    with _lock:
+        key = _cache.get(cache_key)
+        if key is not None:
+            _cache.move_to_end(cache_key)
+            return key
+
+    key = compile_key(db, study_set)
+    with _lock:
+        _cache[cache_key] = key
+        _cache.move_to_end(cache_key)
+        while len(_cache) > _MAX_KEYS:
+            _cache.popitem(last=False)
+    return key
+
+
+def invalidate(set_id: int) -> None:
+    """Drop every cached key of the set (call after its questions change)."""
+    with _lock:
+        for cache_key in [k for k in _cache if k[0] == set_id]:
+            del _cache[cache_key]
@@ -0,0 +1,140 @@
+"""
+Async variants of the busiest study set read endpoints, served from the asyncpg engine.
+
+main.py mounts this router ahead of the sync one only when ASYNC_DB_ENABLED is set, so the
+paths below shadow their sync counterparts (set ids use the `:int` convertor so /classes,
+/dashboard/... and friends still fall through to the sync router). Each handler runs the
+same ORM code as the sync route inside AsyncSession.run_sync: access rules and response
+shapes stay defined once in routes.py, while a request waiting on Postgres no longer holds
+one of the threadpool's worker threads.
+"""
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, Depends, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth.deps import get_current_user_async
+from app.auth.models import User
+from app.database.database import get_async_db
+from app.study_sets import access_control, listing_service, routes, schemas
+
+router = APIRouter()
+
+
+@router.get("", response_model=List[schemas.StudySetOut])
+async def get_study_sets(
+    response: Response,
+    search: Optional[str] = Query(None),
+    subject: Optional[str] = Query(None),
+    type: Optional[str] = Query(None),
+    ownership: Optional[str] = Query(None),
+    sort: Optional[str] = Query("recently-used"),
+    limit: Optional[int] = Query(None, ge=1, le=listing_service.MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header"),
+    format: Literal["json", "ndjson"] = Query("json"),
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Async variant of routes.get_study_sets; `format=ndjson` fetches each chunk on the loop."""
+    if format != "ndjson":
+        return await db.run_sync(
+            lambda s: routes.get_study_sets(
+                response=response,
+                search=search,
+                subject=subject,
+                type=type,
+                ownership=ownership,
+                sort=sort,
+                limit=limit,
+                cursor=cursor,
+                format=format,
+                current_user=current_user,
+                ctx=access_control.AccessContext(s, current_user),
+                db=s,
+            )
+        )
+
+    def prepare(s):
+        ctx = access_control.AccessContext(s, current_user)
+        query, sort_keys, after = routes._study_set_list_query(
+            s, ctx, search=search, subject=subject, type=type, ownership=ownership, sort=sort, cursor=cursor
+        )
+        return ctx, query, sort_keys, after
+
+    ctx, query, sort_keys, after = await db.run_sync(prepare)
+
+    async def stream_rows():
+        position = after
+        while True:
+            chunk, position = await db.run_sync(
+                lambda s: routes._study_set_ndjson_chunk(ctx, query, sort_keys, position)
+            )
+            if chunk:
+                yield chunk
+            if position is None:
+                break
+
+    return StreamingResponse(stream_rows(), media_type="application/x-ndjson")
+
+
+@router.get("/{set_id:int}", response_model=schemas.StudySetOut)
+async def get_study_set(
+    set_id: int,
+    assignment_id: Optional[int] = Query(None, description="Optional assignment context for due date / time limit"),
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    return await db.run_sync(
+        lambda s: routes.get_study_set(
+            set_id=set_id,
+            assignment_id=assignment_id,
+            current_user=current_user,
+            ctx=access_control.AccessContext(s, current_user),
+            db=s,
+        )
+    )
+
+
+@router.get("/{set_id:int}/questions")
+async def get_study_set_questions(
+    set_id: int,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    return await db.run_sync(
+        lambda s: routes.get_study_set_questions(
+            set_id=set_id,
+            current_user=current_user,
+            ctx=access_control.AccessContext(s, current_user),
+            db=s,
+        )
+    )
+
+
+@router.get("/dashboard/stats")
+async def get_dashboard_stats(
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    return await db.run_sync(
+        lambda s: routes.get_dashboard_stats(
+            current_user=current_user,
+            ctx=access_control.AccessContext(s, current_user),
+            db=s,
+        )
+    )
+
+
+@router.get("/dashboard/assignments")
+async def get_dashboard_assignments(
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    return await db.run_sync(
+        lambda s: routes.get_dashboard_assignments(
+            current_user=current_user,
+            ctx=access_control.AccessContext(s, current_user),
+            db=s,
+        )
+    )
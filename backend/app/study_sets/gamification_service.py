@@ -0,0 +1,297 @@
+"""
+Per-student gamification metrics shared by the streaks, badges, points and summary endpoints.
+
+All metrics come from one aggregate over study_set_progress plus the streak query, and are
+memoized per user in process memory. Progress writes call invalidate(); entries also expire
+after a short TTL and at the UTC day boundary, since the streak depends on "today".
+"""
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.database.database import primary_reads
+from app.study_sets import streak_service
+
+_TTL_SEC = 60
+
+
+@dataclass(frozen=True)
+class Stats:
+    total_points: int
+    total_quizzes: int
+    average_accuracy: float
+    high_accuracy_count: int
+    streak: int
+
+
+_AGGREGATE_SQL = text("""
+    SELECT
+        COALESCE(SUM(mastery_percentage), 0),
+        COUNT(DISTINCT set_id),
+        AVG(mastery_percentage),
+        COUNT(*) FILTER (WHERE mastery_percentage >= 90)
+    FROM public.study_set_progress
+    WHERE user_id = :user_id
+""")
+
+_store: Dict[int, Tuple[Stats, date, float]] = {}
+_lock = threading.Lock()
+# Bumped by every invalidation; stats computed across a bump are not cached
+_generation = 0
+
+
+def _compute(db: Session, user_id: int, today: date) -> Stats:
+    row = db.execute(_AGGREGATE_SQL, {"user_id": user_id}).first()
+    return Stats(
+        total_points=int(float(row[0])) if row[0] else 0,
+        total_quizzes=int(row[1] or 0),
+        average_accuracy=float(row[2]) if row[2] else 0.0,
+        high_accuracy_count=int(row[3] or 0),
+        streak=streak_service.current_streak(db, user_id, today),
+    )
+
+
+def get_stats(db: Session, user_id: int) -> Stats:
+    today = datetime.utcnow().date()
+    now = time.time()
+    with _lock:
+        cached = _store.get(user_id)
+        if cached is not None and cached[1] == today and cached[2] > now:
+            return cached[0]
+        generation = _generation
+
+    # Cached for TTL: read from the primary so replica lag is not pinned in the cache
+    with primary_reads(db):
+        stats = _compute(db, user_id, today)
+    with _lock:
+        if generation == _generation:
+            _store[user_id] = (stats, today, now + _TTL_SEC)
+    return stats
+
+
+def invalidate(user_id: int) -> None:
+    """Call after the user's progress changes."""
+    global _generation
+    with _lock:
+        _generation += 1
+        _store.pop(user_id, None)
+
+
+def clear() -> None:
+    global _generation
+    with _lock:
+        _generation += 1
+        _store.clear()
+
+
+def streaks_payload(stats: Optional[Stats]) -> Dict[str, Any]:
+    """Body of GET /dashboard/streaks (stats=None for non-students)."""
+    if stats is None:
+        return {"streak": 0, "badges": [], "next_badge": None}
+    streak = stats.streak
+    total_quizzes = stats.total_quizzes
+
+    badges = []
+    if streak >= 3:
+        badges.append({"badge_id": "consistency", "name": "Consistency", "icon": "🔥"})
+    if total_quizzes >= 5:
+        badges.append({"badge_id": "quick_learner", "name": "Quick Learner", "icon": "⚡"})
+
+    next_badge = None
+    if total_quizzes < 5:
+        next_badge = {
+            "badge_id": "quick_learner",
+            "name": "Quick Learner",
+            "progress": total_quizzes,
+            "target": 5,
+        }
+    elif streak < 7:
+        next_badge = {
+            "badge_id": "week_warrior",
+            "name": "Week Warrior",
+            "progress": streak,
+            "target": 7,
+        }
+
+    return {
+        "streak": streak,
+        "badges": badges,
+        "next_badge": next_badge,
+    }
+
+
+def badges_payload(stats: Optional[Stats]) -> Dict[str, List[Dict[str, Any]]]:
+    """Body of GET /gamification/badges (stats=None for non-students)."""
+    if stats is None:
+        return {"earned_badges": [], "available_badges": []}
+    streak = stats.streak
+    total_quizzes = stats.total_quizzes
+    total_points = stats.total_points
+    high_accuracy_count = stats.high_accuracy_count
+
+    earned_badges = []
+    if streak >= 3:
+        earned_badges.append(
+            {
+                "badge_id": "consistency",
+                "name": "Consistency",
+                "icon": "🔥",
+                "description": f"{streak}-day streak",
+                "earned": True,
+                "i18n_params": {"count": streak},
+            }
+        )
+    if total_quizzes >= 5:
+        earned_badges.append(
+            {
+                "badge_id": "quick_learner",
+                "name": "Quick Learner",
+                "icon": "⚡",
+                "description": f"{total_quizzes} quizzes completed",
+                "earned": True,
+                "i18n_params": {"count": total_quizzes},
+            }
+        )
+    if streak >= 7:
+        earned_badges.append(
+            {
+                "badge_id": "week_warrior",
+                "name": "Week Warrior",
+                "icon": "💪",
+                "description": "7+ day streak",
+                "earned": True,
+                "i18n_params": {},
+            }
+        )
+    if total_quizzes >= 10:
+        earned_badges.append(
+            {
+                "badge_id": "quiz_master",
+                "name": "Quiz Master",
+                "icon": "🏆",
+                "description": f"{total_quizzes} quizzes completed",
+                "earned": True,
+                "i18n_params": {"count": total_quizzes},
+            }
+        )
+    if total_points >= 1000:
+        earned_badges.append(
+            {
+                "badge_id": "point_collector",
+                "name": "Point Collector",
+                "icon": "⭐",
+                "description": f"{total_points} points earned",
+                "earned": True,
+                "i18n_params": {"count": total_points},
+            }
+        )
+    if high_accuracy_count >= 5:
+        earned_badges.append(
+            {
+                "badge_id": "perfectionist",
+                "name": "Perfectionist",
+                "icon": "✨",
+                "description": f"{high_accuracy_count} perfect scores",
+                "earned": True,
+                "i18n_params": {"count": high_accuracy_count},
+            }
+        )
+
+    available_badges = []
+    if streak < 3:
+        available_badges.append(
+            {
+                "badge_id": "consistency",
+                "name": "Consistency",
+                "icon": "🔥",
+                "description": "Maintain a 3-day streak",
+                "earned": False,
+                "progress": streak,
+                "target": 3,
+            }
+        )
+    if total_quizzes < 5:
+        available_badges.append(
+            {
+                "badge_id": "quick_learner",
+                "name": "Quick Learner",
+                "icon": "⚡",
+                "description": "Complete 5 quizzes",
+                "earned": False,
+                "progress": total_quizzes,
+                "target": 5,
+            }
+        )
+    if streak < 7:
+        available_badges.append(
+            {
+                "badge_id": "week_warrior",
+                "name": "Week Warrior",
+                "icon": "💪",
+                "description": "Maintain a 7-day streak",
+                "earned": False,
+                "progress": streak,
+                "target": 7,
+            }
+        )
+    if total_quizzes < 10:
+        available_badges.append(
+            {
+                "badge_id": "quiz_master",
+                "name": "Quiz Master",
+                "icon": "🏆",
+                "description": "Complete 10 quizzes",
+                "earned": False,
+                "progress": total_quizzes,
+                "target": 10,
+            }
+        )
+    if total_points < 1000:
+        available_badges.append(
+            {
+                "badge_id": "point_collector",
+                "name": "Point Collector",
+                "icon": "⭐",
+                "description": "Earn 1000 points",
+                "earned": False,
+                "progress": total_points,
+                "target": 1000,
+            }
+        )
+    if high_accuracy_count < 5:
+        available_badges.append(
+            {
+                "badge_id": "perfectionist",
+                "name": "Perfectionist",
+                "icon": "✨",
+                "description": "Get 5 perfect scores",
+                "earned": False,
+                "progress": high_accuracy_count,
+                "target": 5,
+            }
+        )
+
+    return {"earned_badges": earned_badges, "available_badges": available_badges}
+
+
+def points_payload(stats: Optional[Stats]) -> Dict[str, Any]:
+    """Body of GET /gamification/points (stats=None for non-students)."""
+    if stats is None:
+        return {"total_points": 0, "breakdown": {}}
+    return {
+        "total_points": stats.total_points,
+        "total_quizzes": stats.total_quizzes,
+        "average_accuracy": round(stats.average_accuracy, 1),
+        "breakdown": {
+            "from_quizzes": stats.total_points,
+            "streak_bonus": 0,
+            "accuracy_bonus": 0,
+        }
+    }
@@ -0,0 +1,162 @@
+"""
+Class leaderboards ranked in SQL and cached per class scope.
+
+A scope is the set of class ids a leaderboard covers (one class, or every class the
+student is enrolled in). Each scope is ranked with a single RANK() OVER query and kept
+in process memory for a short TTL; progress writes and enrollment changes drop the
+scopes they affect, so a cached read is a slice plus a dict lookup.
+
+Points are the student's total mastery over all study sets, truncated to an int.
+The legacy `leaderboardentry` table is not used as a snapshot: its score is checked to
+0..100, while points are sums of percentages.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.database.database import primary_reads
+
+TOP_N = 10
+_TTL_SEC = 30
+
+Scope = FrozenSet[int]
+
+
+@dataclass(frozen=True)
+class Entry:
+    user_id: int
+    name: str
+    points: int
+    rank: int
+
+
+@dataclass
+class _Ranking:
+    entries: List[Entry]
+    by_user: Dict[int, Entry]
+    expires_at: float
+    member_ids: Set[int] = field(default_factory=set)
+
+
+_store: Dict[Scope, _Ranking] = {}
+# Reverse indexes so a write only drops the scopes it can change
+_scopes_by_user: Dict[int, Set[Scope]] = {}
+_scopes_by_class: Dict[int, Set[Scope]] = {}
+_lock = threading.Lock()
+# Bumped by every invalidation; a ranking computed across a bump is not cached
+_generation = 0
+
+_RANK_SQL = text("""
+    SELECT s.user_id, u.name, s.points, RANK() OVER (ORDER BY s.points DESC) AS rank
+    FROM (
+        SELECT m.user_id, CAST(TRUNC(COALESCE(SUM(p.mastery_percentage), 0)) AS INTEGER) AS points
+        FROM (
+            SELECT DISTINCT user_id FROM public.enrollment WHERE class_id = ANY(:class_ids)
+        ) m
+        LEFT JOIN public.study_set_progress p ON p.user_id = m.user_id
+        GROUP BY m.user_id
+    ) s
+    JOIN public."User" u ON u.user_id = s.user_id
+    ORDER BY rank, u.name, s.user_id
+""")
+
+
+def _rank(db: Session, scope: Scope) -> List[Entry]:
+    rows = db.execute(_RANK_SQL, {"class_ids": sorted(scope)}).fetchall()
+    return [Entry(int(r[0]), r[1], int(r[2]), int(r[3])) for r in rows]
+
+
+def _drop_locked(scope: Scope) -> None:
+    ranking = _store.pop(scope, None)
+    if ranking is None:
+        return
+    for uid in ranking.member_ids:
+        scopes = _scopes_by_user.get(uid)
+        if scopes is not None:
+            scopes.discard(scope)
+            if not scopes:
+                _scopes_by_user.pop(uid, None)
+    for cid in scope:
+        scopes = _scopes_by_class.get(cid)
+        if scopes is not None:
+            scopes.discard(scope)
+            if not scopes:
+                _scopes_by_class.pop(cid, None)
+
+
+def _cleanup_locked() -> None:
+    now = time.time()
+    for scope in [s for s, r in _store.items() if r.expires_at < now]:
+        _drop_locked(scope)
+
+
+def get_ranking(db: Session, class_ids: Iterable[int]) -> _Ranking:
+    scope: Scope = frozenset(int(c) for c in class_ids)
+    with _lock:
+        _cleanup_locked()
+        cached = _store.get(scope)
+        if cached is not None:
+            return cached
+        generation = _generation
+
+    # Query outside the lock; a concurrent miss on the same scope just ranks twice. The result is
+    # shared by every request for TTL, so it is read from the primary, never a lagging replica.
+    with primary_reads(db):
+        entries = _rank(db, scope)
+    ranking = _Ranking(
+        entries=entries,
+        by_user={e.user_id: e for e in entries},
+        expires_at=time.time() + _TTL_SEC,
+        member_ids={e.user_id for e in entries},
+    )
+    with _lock:
+        if generation != _generation:
+            return ranking
+        _drop_locked(scope)
+        _store[scope] = ranking
+        for uid in ranking.member_ids:
+            _scopes_by_user.setdefault(uid, set()).add(scope)
+        for cid in scope:
+            _scopes_by_class.setdefault(cid, set()).add(scope)
+    return ranking
+
+
+def leaderboard(
+    db: Session, class_ids: Iterable[int], user_id: int
+) -> Tuple[List[Entry], Optional[Entry]]:
+    """Top entries for the scope and the caller's own entry (None if not ranked)."""
+    ranking = get_ranking(db, class_ids)
+    return ranking.entries[:TOP_N], ranking.by_user.get(user_id)
+
+
+def invalidate_user(user_id: int) -> None:
+    """Call after the user's progress changes (their points move in every scope they appear in)."""
+    global _generation
+    with _lock:
+        _generation += 1
+        for scope in list(_scopes_by_user.get(user_id, ())):
+            _drop_locked(scope)
+
+
+def invalidate_class(class_id: int) -> None:
+    """Call after enrollment in the class changes."""
+    global _generation
+    with _lock:
+        _generation += 1
+        for scope in list(_scopes_by_class.get(class_id, ())):
+            _drop_locked(scope)
+
+
+def clear() -> None:
+    global _generation
+    with _lock:
+        _generation += 1
+        _store.clear()
+        _scopes_by_user.clear()
+        _scopes_by_class.clear()
@@ -0,0 +1,229 @@
+"""
+Batched enrichment for study set listings.
+
+GET /study-sets used to run item count, tags, assignment, offline and progress lookups per row.
+This module loads each of those for the whole result set with one grouped query apiece and
+assembles StudySetOut from in-memory maps, so the query count does not grow with the page.
+
+It also owns the sort orders and keyset (cursor) pagination used by the listing: every sort
+mode ends with set_id as a tie-breaker, and the cursor is the sort key of the last row sent.
+"""
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import and_, false, func, literal, or_
+from sqlalchemy.orm import Query, Session
+
+from app.study_sets import access_control, models, schemas
+
+
+MAX_PAGE_SIZE = 100
+# Rows fetched per round trip when streaming NDJSON exports
+STREAM_CHUNK_SIZE = 200
+
+# (expression, descending) pairs; NULLs always sort last
+SortKeys = List[Tuple[Any, bool]]
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor cannot be decoded or belongs to another sort mode."""
+
+
+def apply_sort(query: Query, sort: Optional[str], user_id: int) -> Tuple[Query, SortKeys]:
+    """Order the listing query for `sort` and return the keys a cursor is built from."""
+    if sort == "recently-used":
+        # Join with progress to sort by last_activity
+        query = query.outerjoin(
+            models.StudySetProgress,
+            and_(
+                models.StudySetProgress.set_id == models.StudySet.set_id,
+                models.StudySetProgress.user_id == user_id,
+            ),
+        )
+        keys: SortKeys = [
+            (models.StudySetProgress.last_activity, True),
+            (models.StudySet.updated_at, True),
+            (models.StudySet.set_id, True),
+        ]
+    elif sort == "recently-created":
+        keys = [(models.StudySet.created_at, True), (models.StudySet.set_id, True)]
+    elif sort == "a-z":
+        keys = [(models.StudySet.title, False), (models.StudySet.set_id, False)]
+    elif sort == "recommended":
+        keys = [
+            (models.StudySet.is_shared, True),
+            (models.StudySet.created_at, True),
+            (models.StudySet.set_id, True),
+        ]
+    else:
+        keys = [(models.StudySet.set_id, False)]
+
+    order = [(col.desc() if desc else col.asc()).nullslast() for col, desc in keys]
+    return query.order_by(*order), keys
+
+
+def _dump_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+
+def _load_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        return datetime.fromisoformat(value["dt"])
+    return value
+
+
+def encode_cursor(sort: Optional[str], values: Sequence[Any]) -> str:
+    raw = json.dumps({"s": sort or "", "k": [_dump_value(v) for v in values]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(sort: Optional[str], cursor: str, keys: SortKeys) -> List[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = [_load_value(v) for v in data["k"]]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise InvalidCursor("Malformed cursor")
+    if data.get("s") != (sort or "") or len(values) != len(keys):
+        raise InvalidCursor("Cursor does not match the requested sort")
+    return values
+
+
+def _after(keys: SortKeys, values: Sequence[Any]):
+    """Rows strictly after `values` in the order defined by `keys`."""
+    branches = []
+    equal_prefix: List[Any] = []
+    for (col, desc), value in zip(keys, values):
+        if value is None:
+            # NULLs sort last, so only other NULLs (tied on this key) can follow
+            step = false()
+            same = col.is_(None)
+        else:
+            # literal() so boolean keys compare as values rather than SQL TRUE/FALSE
+            value = literal(value, col.type)
+            step = or_(col < value if desc else col > value, col.is_(None))
+            same = col == value
+        branches.append(and_(*equal_prefix, step))
+        equal_prefix.append(same)
+    return or_(*branches)
+
+
+def fetch_page(
+    query: Query,
+    keys: SortKeys,
+    after: Optional[Sequence[Any]],
+    limit: int,
+) -> Tuple[List[models.StudySet], Optional[List[Any]]]:
+    """One keyset page; returns the rows and the key values to continue from (None at the end)."""
+    if after is not None:
+        query = query.filter(_after(keys, after))
+    rows = query.add_columns(*[col for col, _ in keys]).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_values = list(rows[-1][1:]) if has_more and rows else None
+    return [row[0] for row in rows], next_values
+
+
+def _item_counts(db: Session, set_ids: List[int]) -> Dict[int, int]:
+    rows = (
+        db.query(models.Question.set_id, func.count(models.Question.question_id))
+        .filter(models.Question.set_id.in_(set_ids))
+        .group_by(models.Question.set_id)
+        .all()
+    )
+    return {int(set_id): int(count) for set_id, count in rows}
+
+
+def _tags(db: Session, set_ids: List[int]) -> Dict[int, List[str]]:
+    rows = (
+        db.query(models.StudySetTag.set_id, models.StudySetTag.tag)
+        .filter(models.StudySetTag.set_id.in_(set_ids))
+        .all()
+    )
+    out: Dict[int, List[str]] = {}
+    for set_id, tag in rows:
+        out.setdefault(int(set_id), []).append(tag)
+    return out
+
+
+def _assigned_set_ids(ctx: access_control.AccessContext, set_ids: List[int]) -> Set[int]:
+    """Students: assigned to them directly or via an enrolled class. Others: assigned to anyone."""
+    if ctx.is_student:
+        return set(set_ids) & ctx.assigned_set_ids
+    rows = (
+        ctx.db.query(models.StudySetAssignment.set_id)
+        .filter(models.StudySetAssignment.set_id.in_(set_ids))
+        .distinct()
+        .all()
+    )
+    return {int(r[0]) for r in rows}
+
+
+def _downloaded_set_ids(db: Session, user_id: int, set_ids: List[int]) -> Set[int]:
+    rows = (
+        db.query(models.StudySetOffline.set_id)
+        .filter(
+            models.StudySetOffline.user_id == user_id,
+            models.StudySetOffline.set_id.in_(set_ids),
+        )
+        .all()
+    )
+    return {int(r[0]) for r in rows}
+
+
+def _mastery(db: Session, user_id: int, set_ids: List[int]) -> Dict[int, float]:
+    rows = (
+        db.query(models.StudySetProgress.set_id, models.StudySetProgress.mastery_percentage)
+        .filter(
+            models.StudySetProgress.user_id == user_id,
+            models.StudySetProgress.set_id.in_(set_ids),
+        )
+        .all()
+    )
+    return {int(set_id): float(mastery) for set_id, mastery in rows}
+
+
+def build_study_set_list(
+    ctx: access_control.AccessContext,
+    study_sets: Sequence[models.StudySet],
+) -> List[schemas.StudySetOut]:
+    """Enrich a page of study sets for the caller with a constant number of queries."""
+    if not study_sets:
+        return []
+
+    db = ctx.db
+    set_ids = [s.set_id for s in study_sets]
+    item_counts = _item_counts(db, set_ids)
+    tags = _tags(db, set_ids)
+    assigned = _assigned_set_ids(ctx, set_ids)
+    downloaded = _downloaded_set_ids(db, ctx.user_id, set_ids)
+    mastery = _mastery(db, ctx.user_id, set_ids)
+
+    return [
+        schemas.StudySetOut(
+            id=study_set.set_id,
+            title=study_set.title,
+            subject=study_set.subject,
+            type=study_set.type,
+            level=study_set.level,
+            description=study_set.description,
+            creator_id=study_set.creator_id,
+            created_at=study_set.created_at,
+            updated_at=study_set.updated_at,
+            item_count=item_counts.get(study_set.set_id, 0),
+            tags=tags.get(study_set.set_id, []),
+            is_assigned=study_set.set_id in assigned,
+            is_downloaded=study_set.set_id in downloaded,
+            mastery=mastery.get(study_set.set_id),
+            is_public=study_set.is_public,
+            is_shared=study_set.is_shared,
+        )
+        for study_set in study_sets
+    ]
@@ -3,6 +3,7 @@ from decimal import Decimal
 from sqlalchemy import (
     Column,
     Integer,
+    SmallInteger,
     String,
     Text,
     Boolean,
@@ -10,6 +11,7 @@ from sqlalchemy import (
     DateTime,
     DECIMAL,
     CheckConstraint,
+    UniqueConstraint,
 )
 from sqlalchemy.orm import relationship
 
@@ -61,7 +63,12 @@ class Question(Base):
     explanation = Column(Text, nullable=True)
 
     study_set = relationship("StudySet", back_populates="questions")
-    options = relationship("QuestionOption", back_populates="question", cascade="all, delete-orphan")
+    options = relationship(
+        "QuestionOption",
+        back_populates="question",
+        cascade="all, delete-orphan",
+        order_by="QuestionOption.option_order",
+    )
     flashcard = relationship("Flashcard", back_populates="question", uselist=False, cascade="all, delete-orphan")
 
 
@@ -120,7 +127,11 @@ class StudySetStudentAssignment(Base):
 
 class StudySetProgress(Base):
     __tablename__ = "study_set_progress"
-    __table_args__ = {"schema": "public"}
+    __table_args__ = (
+        # Target of the ON CONFLICT upsert in progress_sync
+        UniqueConstraint("user_id", "set_id", name="study_set_progress_user_set_unique"),
+        {"schema": "public"},
+    )
 
     progress_id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("public.User.user_id"), nullable=False)
@@ -154,3 +165,30 @@ class Class(Base):
     subject = Column(String(100), nullable=True)
     level = Column(String(50), nullable=True)
     description = Column(Text, nullable=True)
+
+
+class StudySetClassRollup(Base):
+    """Teacher analytics per (set, class), maintained by analytics_rollup; class_id 0 is the set-wide row."""
+    __tablename__ = "study_set_class_rollup"
+    __table_args__ = {"schema": "public"}
+
+    set_id = Column(Integer, ForeignKey("public.studyset.set_id", ondelete="CASCADE"), primary_key=True)
+    class_id = Column(Integer, primary_key=True)
+    student_count = Column(Integer, default=0, nullable=False)
+    attempt_count = Column(Integer, default=0, nullable=False)
+    # Sum (not average) so the average stays exact: mastery_sum / attempt_count
+    mastery_sum = Column(DECIMAL(12, 2), default=Decimal("0.00"), nullable=False)
+    completion_count = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class StudySetVisibility(Base):
+    """Non-public reasons a user can see a set, maintained by visibility_index (bits: 1 creator, 2 direct, 4 class)."""
+    __tablename__ = "study_set_visibility"
+    __table_args__ = {"schema": "public"}
+
+    user_id = Column(Integer, ForeignKey("public.User.user_id", ondelete="CASCADE"), primary_key=True)
+    set_id = Column(
+        Integer, ForeignKey("public.studyset.set_id", ondelete="CASCADE"), primary_key=True, index=True
+    )
+    reasons = Column(SmallInteger, nullable=False)
@@ -0,0 +1,163 @@
+"""
+Set-based ingestion of offline practice attempts (POST /study-sets/attempts/batch).
+
+Attempts are grouped by set_id: all sets are access-checked in one batch, the
+attempts are folded into one progress delta per set, and every delta is applied with
+a single INSERT ... ON CONFLICT in one transaction. Increments are applied in SQL
+against the current row, so a concurrent write to the same progress row is not lost.
+"""
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, text
+
+from app.study_sets import access_control, analytics_rollup, models
+
+_logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _SetDelta:
+    """Net effect of a set's attempts, in submission order."""
+    correct: int = 0
+    # Latest client timestamp (naive UTC) seen after the last attempt that fell back to "now"
+    latest: Optional[datetime] = None
+    # True if some attempt had no usable timestamp: last_activity is reset to now first
+    reset_to_now: bool = False
+    indices: List[int] = field(default_factory=list)
+
+
+def parse_timestamp(value: Any) -> Optional[datetime]:
+    """Client ISO-8601 timestamp as naive UTC (the column type); None if missing or invalid."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+_UPSERT_SQL = text("""
+    INSERT INTO public.study_set_progress AS p
+        (user_id, set_id, items_completed, total_items, mastery_percentage, last_activity)
+    VALUES (
+        :user_id,
+        :set_id,
+        LEAST(:correct, :total_items),
+        :total_items,
+        CASE WHEN :total_items > 0 THEN LEAST(:correct, :total_items) * 100.0 / :total_items ELSE 0 END,
+        :last_activity
+    )
+    ON CONFLICT (user_id, set_id) DO UPDATE SET
+        items_completed = LEAST(p.items_completed + :correct, p.total_items),
+        mastery_percentage = CASE
+            WHEN p.total_items > 0
+            THEN LEAST(p.items_completed + :correct, p.total_items) * 100.0 / p.total_items
+            ELSE p.mastery_percentage
+        END,
+        last_activity = CASE
+            WHEN :reset_to_now THEN :last_activity
+            ELSE GREATEST(p.last_activity, :last_activity)
+        END
+""")
+
+
+def _fail(results: List[Dict[str, Any]], index: int, error: str) -> None:
+    results[index]["status"] = "failed"
+    results[index]["error"] = error
+
+
+def sync_attempts(
+    ctx: access_control.AccessContext, attempts: List[Dict[str, Any]]
+) -> Tuple[Dict[str, Any], List[int]]:
+    """
+    Apply offline attempts for the caller and commit once.
+
+    Returns the response body (synced/failed counts plus one result per attempt, in order)
+    and the set ids whose progress changed.
+    """
+    db = ctx.db
+    now = datetime.utcnow()
+    results: List[Dict[str, Any]] = []
+    deltas: Dict[int, _SetDelta] = {}
+
+    for index, attempt_data in enumerate(attempts):
+        set_id = attempt_data.get("set_id") if isinstance(attempt_data, dict) else None
+        question_id = attempt_data.get("question_id") if isinstance(attempt_data, dict) else None
+        results.append({"index": index, "set_id": set_id, "question_id": question_id, "status": "synced"})
+        if not set_id or not question_id:
+            _fail(results, index, "set_id and question_id are required")
+            continue
+        try:
+            set_id = int(set_id)
+        except (TypeError, ValueError):
+            _fail(results, index, "Invalid set_id")
+            continue
+
+        delta = deltas.setdefault(set_id, _SetDelta())
+        delta.indices.append(index)
+        if attempt_data.get("is_correct", False):
+            delta.correct += 1
+        timestamp = parse_timestamp(attempt_data.get("timestamp"))
+        if timestamp is None:
+            # Attempts without a usable timestamp count as "now", overriding earlier ones
+            delta.reset_to_now = True
+            delta.latest = now
+        elif delta.latest is None or timestamp > delta.latest:
+            delta.latest = timestamp
+
+    set_ids = sorted(deltas)
+    visible = access_control.can_view_many(ctx, set_ids)
+    for set_id in set_ids:
+        error = None
+        if set_id not in visible:
+            error = "Study set not found"
+        elif not visible[set_id]:
+            error = "You don't have access to this study set"
+        if error:
+            for index in deltas.pop(set_id).indices:
+                _fail(results, index, error)
+
+    written = sorted(deltas)
+    if written:
+        question_counts = dict(
+            db.query(models.Question.set_id, func.count(models.Question.question_id))
+            .filter(models.Question.set_id.in_(written))
+            .group_by(models.Question.set_id)
+            .all()
+        )
+        try:
+            db.execute(
+                _UPSERT_SQL,
+                [
+                    {
+                        "user_id": ctx.user_id,
+                        "set_id": set_id,
+                        "correct": deltas[set_id].correct,
+                        "total_items": int(question_counts.get(set_id, 0)),
+                        "last_activity": deltas[set_id].latest,
+                        "reset_to_now": deltas[set_id].reset_to_now,
+                    }
+                    for set_id in written
+                ],
+            )
+            analytics_rollup.refresh_for_student(db, ctx.user_id, written)
+            db.commit()
+        except Exception as exc:
+            db.rollback()
+            _logger.exception("Failed to sync attempts: %s", exc)
+            for set_id in written:
+                for index in deltas[set_id].indices:
+                    _fail(results, index, "Could not save progress")
+            written = []
+
+    failed = sum(1 for r in results if r["status"] == "failed")
+    body = {"synced": len(results) - failed, "failed": failed, "results": results}
+    return body, written
@@ -1,17 +1,20 @@
 import logging
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Response, status, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.orm import Session, selectinload
 from sqlalchemy import func, or_, and_, text, select
-from datetime import datetime, timedelta
+from datetime import datetime
 from decimal import Decimal
 
-from app.auth.deps import get_current_user
+from app.auth.deps import get_current_user, use_read_replica
 from app.auth.models import User
 from app.database.database import get_db
 from app.study_sets import models, schemas
-from app.study_sets import access_control
+from app.study_sets import access_control, analytics_rollup, listing_service
+from app.study_sets.answer_key import normalize_question_type as _normalize_question_type
+from app.study_sets import leaderboard as leaderboard_engine
+from app.study_sets import answer_key, gamification_service, progress_sync, visibility_index
 from app.study_sets.recommendation_service import get_next_recommended_study_set
 from app.study_sets.rule_based_recommendations import build_rule_based_recommendations_list
 
@@ -19,83 +22,108 @@ router = APIRouter()
 _logger = logging.getLogger(__name__)
 
 
-def _normalize_question_type(value: Optional[str]) -> str:
-    if not value:
-        return ""
-    return value.strip().lower().replace(" ", "_").replace("/", "_")
-
-
 def _user_may_view_assignment_context(
-    db: Session,
-    user: User,
-    study_set: models.StudySet,
+    ctx: access_control.AccessContext,
     assignment: models.StudySetAssignment,
 ) -> bool:
     """Whether this user may attach practice metadata from this assignment (set_id must already match)."""
-    role_name = (user.role.name or "").lower() if user.role else ""
     if assignment.class_id is None:
-        if role_name != "student":
+        if not ctx.is_student:
             return False
         return (
-            db.query(models.StudySetStudentAssignment)
+            ctx.db.query(models.StudySetStudentAssignment)
             .filter(
                 models.StudySetStudentAssignment.assignment_id == assignment.assignment_id,
-                models.StudySetStudentAssignment.user_id == user.user_id,
+                models.StudySetStudentAssignment.user_id == ctx.user_id,
             )
             .first()
             is not None
         )
 
-    if role_name == "student":
-        r = db.execute(
-            text("SELECT 1 FROM public.enrollment WHERE class_id = :c AND user_id = :u"),
-            {"c": assignment.class_id, "u": user.user_id},
-        ).first()
-        return r is not None
+    if ctx.is_student:
+        return assignment.class_id in ctx.enrolled_class_ids
 
-    if role_name == "teacher":
-        teacher_row = db.execute(
-            text("SELECT teacher_id FROM public.teacher WHERE teacher_id = :user_id"),
-            {"user_id": user.user_id},
-        ).first()
-        if not teacher_row:
-            return False
-        teacher_id = teacher_row[0]
-        cr = db.execute(
-            text(
-                "SELECT 1 FROM public.class WHERE class_id = :cid AND teacher_id = :tid"
-            ),
-            {"cid": assignment.class_id, "tid": teacher_id},
-        ).first()
-        return cr is not None
+    if ctx.is_teacher:
+        return assignment.class_id in ctx.taught_class_ids
 
-    return role_name == "admin"
+    return ctx.is_admin
 
 
-@router.get("", response_model=List[schemas.StudySetOut])
+@router.get("", response_model=List[schemas.StudySetOut], dependencies=[Depends(use_read_replica)])
 def get_study_sets(
+    response: Response,
     search: Optional[str] = Query(None),
     subject: Optional[str] = Query(None),
     type: Optional[str] = Query(None),
     ownership: Optional[str] = Query(None),
     sort: Optional[str] = Query("recently-used"),
+    limit: Optional[int] = Query(None, ge=1, le=listing_service.MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header"),
+    format: Literal["json", "ndjson"] = Query("json"),
     current_user: User = Depends(get_current_user),
+    ctx: access_control.AccessContext = Depends(access_control.get_access_context),
     db: Session = Depends(get_db),
 ):
-    """Get study sets with filtering and sorting"""
+    """
+    Get study sets with filtering and sorting.
+
+    Pass `limit` (and then `cursor`) for keyset pagination; the cursor for the next page is
+    returned in the X-Next-Cursor header. `format=ndjson` streams every matching set as
+    newline-delimited JSON, fetched in chunks, for exports.
+    """
+    query, sort_keys, after = _study_set_list_query(
+        db, ctx, search=search, subject=subject, type=type, ownership=ownership, sort=sort, cursor=cursor
+    )
+
+    if format == "ndjson":
+        def stream_rows():
+            position = after
+            while True:
+                chunk, position = _study_set_ndjson_chunk(ctx, query, sort_keys, position)
+                if chunk:
+                    yield chunk
+                if position is None:
+                    break
+
+        return StreamingResponse(stream_rows(), media_type="application/x-ndjson")
+
+    if limit is None and after is None:
+        study_sets = query.all()
+    else:
+        study_sets, next_values = listing_service.fetch_page(
+            query, sort_keys, after, limit or listing_service.MAX_PAGE_SIZE
+        )
+        if next_values is not None:
+            response.headers["X-Next-Cursor"] = listing_service.encode_cursor(sort, next_values)
+
+    return listing_service.build_study_set_list(ctx, study_sets)
+
+
+def _study_set_list_query(
+    db: Session,
+    ctx: access_control.AccessContext,
+    search: Optional[str],
+    subject: Optional[str],
+    type: Optional[str],
+    ownership: Optional[str],
+    sort: Optional[str],
+    cursor: Optional[str],
+):
+    """Filtered, sorted listing query plus its sort keys and decoded cursor position."""
+    current_user = ctx.user
     query = db.query(models.StudySet)
 
     # Access control: Enforce visibility rules based on user role
-    is_student = current_user.role and current_user.role.name.lower() == "student"
-    is_teacher = current_user.role and current_user.role.name.lower() == "teacher"
+    is_student = ctx.is_student
+    is_teacher = ctx.is_teacher
 
     if is_student:
         query = query.filter(
-            or_(*access_control.build_student_list_conditions(db, current_user.user_id))
+            or_(*access_control.build_student_list_conditions(ctx))
         )
     elif is_teacher:
         query = query.filter(
-            or_(*access_control.build_teacher_list_conditions(db, current_user.user_id))
+            or_(*access_control.build_teacher_list_conditions(ctx))
         )
 
     # Filter by ownership
@@ -104,51 +132,20 @@ def get_study_sets(
     elif ownership == "Shared with me":
         # Get sets shared with user (via assignments or shared flag)
         # Exclude sets created by the current user
-        assigned_set_ids = (
-            db.query(models.StudySetAssignment.set_id)
-            .join(models.StudySetStudentAssignment)
-            .filter(models.StudySetStudentAssignment.user_id == current_user.user_id)
-            .subquery()
-        )
         query = query.filter(
             and_(
                 models.StudySet.creator_id != current_user.user_id,  # Exclude own sets
                 or_(
-                    models.StudySet.set_id.in_(assigned_set_ids),
+                    models.StudySet.set_id.in_(sorted(ctx.direct_set_ids)),
                     models.StudySet.is_shared == True,
                 ),
             )
         )
     elif ownership == "Assigned":
         # Get sets assigned to user (both directly and via class enrollment)
-        # Get classes the student is enrolled in
-        enrollment_query = text("SELECT class_id FROM public.enrollment WHERE user_id = :user_id")
-        enrolled_class_ids_result = db.execute(enrollment_query, {"user_id": current_user.user_id})
-        enrolled_class_ids = [row[0] for row in enrolled_class_ids_result] if enrolled_class_ids_result else []
-        
-        # Build conditions for assigned sets
-        assigned_conditions = []
-        
-        # Directly assigned sets (via StudySetStudentAssignment)
-        assigned_conditions.append(
-            models.StudySet.set_id.in_(
-                db.query(models.StudySetAssignment.set_id)
-                .join(models.StudySetStudentAssignment)
-                .filter(models.StudySetStudentAssignment.user_id == current_user.user_id)
-            )
-        )
-        
-        # Class-assigned sets (if student is enrolled in any classes)
-        if enrolled_class_ids:
-            assigned_conditions.append(
-                models.StudySet.set_id.in_(
-                    db.query(models.StudySetAssignment.set_id)
-                    .filter(models.StudySetAssignment.class_id.in_(enrolled_class_ids))
-                )
-            )
-        
-        if assigned_conditions:
-            query = query.filter(or_(*assigned_conditions))
+        assigned_set_ids = ctx.assigned_set_ids
+        if assigned_set_ids:
+            query = query.filter(models.StudySet.set_id.in_(sorted(assigned_set_ids)))
         else:
             # No assignments found, return empty result
             query = query.filter(models.StudySet.set_id == -1)
@@ -171,141 +168,36 @@ def get_study_sets(
             )
         )
 
-    # Sort
-    if sort == "recently-used":
-        # Join with progress to sort by last_activity
-        query = query.outerjoin(
-            models.StudySetProgress,
-            and_(
-                models.StudySetProgress.set_id == models.StudySet.set_id,
-                models.StudySetProgress.user_id == current_user.user_id,
-            ),
-        ).order_by(models.StudySetProgress.last_activity.desc().nullslast(), models.StudySet.updated_at.desc())
-    elif sort == "recently-created":
-        query = query.order_by(models.StudySet.created_at.desc())
-    elif sort == "a-z":
-        query = query.order_by(models.StudySet.title.asc())
-    elif sort == "recommended":
-        # Join with AI suggestions or assignments
-        query = query.order_by(models.StudySet.is_shared.desc(), models.StudySet.created_at.desc())
-
-    study_sets = query.all()
-
-    # Build response with additional data
-    result = []
-    for study_set in study_sets:
-        # Get item count
-        item_count = db.query(func.count(models.Question.question_id)).filter(
-            models.Question.set_id == study_set.set_id
-        ).scalar() or 0
-
-        # Get tags
-        tags = [tag.tag for tag in study_set.tags]
-
-        # Check if assigned (to current user specifically)
-        is_assigned = False
-        if is_student:
-            # Check if directly assigned to student
-            directly_assigned = (
-                db.query(models.StudySetAssignment)
-                .join(models.StudySetStudentAssignment)
-                .filter(
-                    and_(
-                        models.StudySetAssignment.set_id == study_set.set_id,
-                        models.StudySetStudentAssignment.user_id == current_user.user_id,
-                    )
-                )
-                .first()
-                is not None
-            )
-            
-            # Check if assigned to a class the student is enrolled in
-            enrollment_query = text("SELECT class_id FROM public.enrollment WHERE user_id = :user_id")
-            enrolled_class_ids_result = db.execute(enrollment_query, {"user_id": current_user.user_id})
-            enrolled_class_ids = [row[0] for row in enrolled_class_ids_result] if enrolled_class_ids_result else []
-            
-            class_assigned = False
-            if enrolled_class_ids:
-                class_assigned = (
-                    db.query(models.StudySetAssignment)
-                    .filter(
-                        and_(
-                            models.StudySetAssignment.set_id == study_set.set_id,
-                            models.StudySetAssignment.class_id.in_(enrolled_class_ids),
-                        )
-                    )
-                    .first()
-                    is not None
-                )
-            
-            is_assigned = directly_assigned or class_assigned
-        else:
-            # For teachers, just check if there's any assignment
-            is_assigned = (
-                db.query(models.StudySetAssignment)
-                .filter(models.StudySetAssignment.set_id == study_set.set_id)
-                .first()
-                is not None
-            )
+    query, sort_keys = listing_service.apply_sort(query, sort, current_user.user_id)
 
-        # Check if downloaded
-        is_downloaded = (
-            db.query(models.StudySetOffline)
-            .filter(
-                and_(
-                    models.StudySetOffline.set_id == study_set.set_id,
-                    models.StudySetOffline.user_id == current_user.user_id,
-                )
-            )
-            .first()
-            is not None
-        )
+    after = None
+    if cursor:
+        try:
+            after = listing_service.decode_cursor(sort, cursor, sort_keys)
+        except listing_service.InvalidCursor as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
 
-        # Get mastery
-        progress = (
-            db.query(models.StudySetProgress)
-            .filter(
-                and_(
-                    models.StudySetProgress.set_id == study_set.set_id,
-                    models.StudySetProgress.user_id == current_user.user_id,
-                )
-            )
-            .first()
-        )
-        mastery = float(progress.mastery_percentage) if progress else None
+    return query, sort_keys, after
 
-        result.append(
-            schemas.StudySetOut(
-                id=study_set.set_id,
-                title=study_set.title,
-                subject=study_set.subject,
-                type=study_set.type,
-                level=study_set.level,
-                description=study_set.description,
-                creator_id=study_set.creator_id,
-                created_at=study_set.created_at,
-                updated_at=study_set.updated_at,
-                item_count=item_count,
-                tags=tags,
-                is_assigned=is_assigned,
-                is_downloaded=is_downloaded,
-                mastery=mastery,
-                is_public=study_set.is_public,
-                is_shared=study_set.is_shared,
-            )
-        )
 
-    return result
+def _study_set_ndjson_chunk(ctx: access_control.AccessContext, query, sort_keys, position):
+    """One STREAM_CHUNK_SIZE slice of the export as NDJSON text, plus the next position."""
+    page, position = listing_service.fetch_page(
+        query, sort_keys, position, listing_service.STREAM_CHUNK_SIZE
+    )
+    chunk = "".join(item.model_dump_json() + "\n" for item in listing_service.build_study_set_list(ctx, page))
+    return chunk, position
 
 
 @router.post("", response_model=schemas.StudySetOut, status_code=status.HTTP_201_CREATED)
 def create_study_set(
     payload: schemas.StudySetCreate,
     current_user: User = Depends(get_current_user),
+    ctx: access_control.AccessContext = Depends(access_control.get_access_context),
     db: Session = Depends(get_db),
 ):
     """Create a new study set"""
-    is_student = current_user.role and current_user.role.name.lower() == "student"
+    is_student = ctx.is_student
     is_public = payload.is_public
     is_shared = payload.assignment is not None and not is_student
 
@@ -417,6 +309,9 @@ def create_study_set(
                     db.add(student_assignment)
         # If assignToAll is True, all students in the class are assigned (handled by enrollment)
 
+    if payload.assignment and payload.assignment.get("classId"):
+        analytics_rollup.refresh(db, [study_set.set_id], class_ids=[payload.assignment["classId"]])
+    visibility_index.refresh_sets(db, [study_set.set_id])
     db.commit()
     db.refresh(study_set)
 
@@ -472,14 +367,15 @@ def create_study_set(
     )
 
 
-@router.get("/classes")
+@router.get("/classes", dependencies=[Depends(use_read_replica)])
 def get_classes(
     current_user: User = Depends(get_current_user),
+    ctx: access_control.AccessContext = Depends(access_control.get_access_context),
     db: Session = Depends(get_db),
 ):
     """Get classes for the current user (teacher's classes or enrolled classes)"""
     try:
-        is_teacher = current_user.role and current_user.role.name.lower() == "teacher"
+        is_teacher = ctx.is_teacher
         result = []
         
         if is_teacher:
@@ -519,9 +415,7 @@ def get_classes(
                 })
         else:
             # Students see classes they're enrolled in
-            enrollment_query = text("SELECT class_id FROM public.enrollment WHERE user_id = :user_id")
-            enrolled_class_ids_result = db.execute(enrollment_query, {"user_id": current_user.user_id})
-            enrolled_class_ids = [row[0] for row in enrolled_class_ids_result] if enrolled_class_ids_result else []
+            enrolled_class_ids = sorted(ctx.enrolled_class_ids)
             
             if enrolled_class_ids:
                 # Query classes with subject and level using IN clause
@@ -569,11 +463,12 @@ def get_classes(
 def create_class(
     payload: schemas.ClassCreate,
     current_user: User = Depends(get_current_user),
+    ctx: access_control.AccessContext = Depends(access_control.get_access_context),
     db: Session = Depends(get_db),
 ):
     """Create a new class (teachers only)"""
     # Check if user is a teacher
-    if not current_user.role or current_user.role.name.lower() != "teacher":
+    if not ctx.is_teacher:
         raise HTTPException(status_code=403, detail="Only teachers can create classes")
     
     # Get or create teacher_id from teacher table
@@ -640,11 +535,12 @@ def create_class(
 def get_class_students(
     class_id: int,
     current_user: User = Depends(get_current_user),
+    ctx: access_control.AccessContext = Depends(access_control.get_access_context),
     db: Session = Depends(get_db),
 ):
     """Get students enrolled in a class"""
     # Verify user is a teacher and owns the class
-    is_teacher = current_user.role and current_user.role.name.lower() == "teacher"
+    is_teacher = ctx.is_teacher
     if not is_teacher:
         raise HTTPException(status_code=403, detail="Only teachers can view class students")
     
@@ -689,10 +585,11 @@ def get_class_students(
 def search_users(
     query: str = Query(..., min_length=1),
     current_user: User = Depends(get_current_user),
+    ctx: access_control.AccessContext = Depends(access_control.get_access_context),
     db: Session = Depends(get_db),
 ):
     """Search users by name or email (teachers only)"""
-    is_teacher = current_user.role and current_user.role.name.lower() == "teacher"
+    is_teacher = ctx.is_teacher
     if not is_teacher:
         raise HTTPException(status_code=403, detail="Only teachers can search users")
     
@@ -732,10 +629,11 @@ def add_students_to_class(
     class_id: int,
     payload: schemas.AddStudentsRequest,
     current_user: User = Depends(get_current_user),
+    ctx: access_control.AccessContext = Depends(access_control.get_access_context),
     db: Session = Depends(get_db),
 ):
     """Add students to a class (teachers only)"""
-    is_teacher = current_user.role and current_user.role.name.lower() == "teacher"
+    is_teacher = ctx.is_teacher
     if not is_teacher:
         raise HTTPException(status_code=403, detail="Only teachers can add students to classes")
     
@@ -776,12 +674,18 @@ def add_students_to_class(
                 VALUES (:user_id, :class_id)
                 RETURNING enrollment_id
             """)
-            insert_result = db.execute(insert_query, {"user_id": student_id, "class_id": class_id})
-            db.commit()
+            with db.begin_nested():
+                db.execute(insert_query, {"user_id": student_id, "class_id": class_id})
             added.append(student_id)
         except Exception as e:
-            db.rollback()
             errors.append(f"Failed to add student {student_id}: {str(e)}")
+
+    if added:
+        # Recompute once for the whole batch, not per student
+        analytics_rollup.refresh_for_class(db, class_id)
+        visibility_index.refresh_users(db, added)
+        db.commit()
+        leaderboard_engine.invalidate_class(class_id)
     
     return {
         "added": added,
@@ -795,10 +699,11 @@ def remove_student_from_class(
     class_id: int,
     student_id: int,
     current_user: User = Depends(get_current_user),
+    ctx: access_control.AccessContext = Depends(access_control.get_access_context),
     db: Session = Depends(get_db),
 ):
     """Remove a student from a class (teachers only)"""
-    is_teacher = current_user.role and current_user.role.name.lower() == "teacher"
+    is_teacher = ctx.is_teacher
     if not is_teacher:
         raise HTTPException(status_code=403, detail="Only teachers can remove students from classes")
     
@@ -834,7 +739,10 @@ def remove_student_from_class(
         WHERE user_id = :user_id AND class_id = :class_id
     """)
     db.execute(delete_query, {"user_id": student_id, "class_id": class_id})
+    analytics_rollup.refresh_for_class(db, class_id)
+    visibility_index.refresh_users(db, [student_id])
     db.commit()
+    leaderboard_engine.invalidate_class(class_id)
     
     return {"message": "Student removed from class successfully"}
 
@@ -843,10 +751,11 @@ def remove_student_from_class(
 def delete_class(
     class_id: int,
     current_user: User = Depends(get_current_user),
+    ctx: access_control.AccessContext = Depends(access_control.get_access_context),
     db: Session = Depends(get_db),
 ):
     """Delete a class (teachers only, must own the class)"""
-    is_teacher = current_user.role and current_user.role.name.lower() == "teacher"
+    is_teacher = ctx.is_teacher
     if not is_teacher:
         raise HTTPException(status_code=403, detail="Only teachers can delete classes")
     
@@ -859,6 +768,8 @@ def delete_class(
     if not class_result.first():
         raise HTTPException(status_code=403, detail="You don't have permission to delete this class")
     
+    rollup_set_ids = analytics_rollup.assigned_set_ids(db, [class_id])
+    
     # Delete related student assignment records
     assignment_ids_query = text("""
         SELECT assignment_id FROM public.study_set_assignment WHERE class_id = :class_id
@@ -889,7 +800,10 @@ def delete_class(
     
     delete_query = text("DELETE FROM public.class WHERE class_id = :class_id")
     db.execute(delete_query, {"class_id": class_id})
+    analytics_rollup.refresh(db, rollup_set_ids, class_ids=[class_id])
+    visibility_index.refresh_sets(db, rollup_set_ids)
     db.commit()
+    leaderboard_engine.invalidate_class(class_id)
     
     return {"message": "Class deleted successfully"}
 
@@ -899,10 +813,11 @@ def update_class(
     class_id: int,
     payload: schemas.ClassUpdate,
     current_user: User = Depends(get_current_user),
+    ctx: access_control.AccessContext = Depends(access_control.get_access_context),
     db: Session = Depends(get_db),
 ):
     """Update a class (teachers only)"""
-    is_teacher = current_user.role and current_user.role.name.lower() == "teacher"
+    is_teacher = ctx.is_teacher
     if not is_teacher:
         raise HTTPException(status_code=403, detail="Only teachers can update classes")
     
@@ -991,10 +906,11 @@ def create_class_assignment(
     class_id: int,
     payload: schemas.CreateAssignmentRequest,
     current_user: User = Depends(get_current_user),
+    ctx: access_control.AccessContext = Depends(access_control.get_access_context),
     db: Session = Depends(get_db),
 ):
     """Assign a study set to a class (teachers only)"""
-    is_teacher = current_user.role and current_user.role.name.lower() == "teacher"
+    is_teacher = ctx.is_teacher
     if not is_teacher:
         raise HTTPException(status_code=403, detail="Only teachers can create assignments")
     
@@ -1042,6 +958,8 @@ def create_class_assignment(
         practice_feedback_mode=payload.practice_feedback_mode,
     )
     db.add(row)
+    analytics_rollup.refresh(db, [payload.set_id], class_ids=[class_id])
+    visibility_index.refresh_sets(db, [payload.set_id])
     db.commit()
     db.refresh(row)
 
@@ -1067,32 +985,20 @@ def create_class_assignment(
 def get_class_assignments(
     class_id: int,
     current_user: User = Depends(get_current_user),
+    ctx: access_control.AccessContext = Depends(access_control.get_access_context),
     db: Session = Depends(get_db),
 ):
     """Get all assignments for a class (teachers and enrolled students)"""
-    is_teacher = current_user.role and current_user.role.name.lower() == "teacher"
-    is_student = current_user.role and current_user.role.name.lower() == "student"
+    is_teacher = ctx.is_teacher
+    is_student = ctx.is_student
     
     if is_teacher:
         # Verify class ownership for teachers
-        teacher_query = text("SELECT teacher_id FROM public.teacher WHERE teacher_id = :user_id")
-        teacher_result = db.execute(teacher_query, {"user_id": current_user.user_id})
-        teacher_row = teacher_result.first()
-        if not teacher_row:
-            raise HTTPException(status_code=404, detail="Teacher record not found")
-        
-        teacher_id = teacher_row[0]
-        
-        # Check if class belongs to teacher
-        class_query = text("SELECT class_id FROM public.class WHERE class_id = :class_id AND teacher_id = :teacher_id")
-        class_result = db.execute(class_query, {"class_id": class_id, "teacher_id": teacher_id})
-        if not class_result.first():
+        if class_id not in ctx.taught_class_ids:
             raise HTTPException(status_code=403, detail="You don't have permission to view this class")
     elif is_student:
         # For students, check if they're enrolled in the class
-        enrollment_query = text("SELECT class_id FROM public.enrollment WHERE class_id = :class_id AND user_id = :user_id")
-        enrollment_result = db.execute(enrollment_query, {"class_id": class_id, "user_id": current_user.user_id})
-        if not enrollment_result.first():
+        if class_id not in ctx.enrolled_class_ids:
             raise HTTPException(status_code=403, detail="You are not enrolled in this class")
     else:
         raise HTTPException(status_code=403, detail="Only teachers and students can view class assignments")
@@ -1136,164 +1042,15 @@ def get_class_assignments(
     return result
 
 
-@router.get("/classes/{class_id}/students/progress")
-def get_class_students_progress(
-    class_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
-):
-    """Get student progress for a class (teachers only)"""
-    is_teacher = current_user.role and current_user.role.name.lower() == "teacher"
-    if not is_teacher:
-        raise HTTPException(status_code=403, detail="Only teachers can view student progress")
-    
-    # Verify class ownership
-    teacher_query = text("SELECT teacher_id FROM public.teacher WHERE teacher_id = :user_id")
-    teacher_result = db.execute(teacher_query, {"user_id": current_user.user_id})
-    teacher_row = teacher_result.first()
-    if not teacher_row:
-        raise HTTPException(status_code=404, detail="Teacher record not found")
-    
-    teacher_id = teacher_row[0]
-    
-    # Check if class belongs to teacher
-    class_query = text("SELECT class_id FROM public.class WHERE class_id = :class_id AND teacher_id = :teacher_id")
-    class_result = db.execute(class_query, {"class_id": class_id, "teacher_id": teacher_id})
-    if not class_result.first():
-        raise HTTPException(status_code=403, detail="You don't have permission to view this class")
-    
-    # Get all students in the class
-    students_query = text("""
-        SELECT u.user_id, u.name, u.email
-        FROM public."User" u
-        INNER JOIN public.enrollment e ON u.user_id = e.user_id
-        WHERE e.class_id = :class_id
-        ORDER BY u.name
-    """)
-    students_result = db.execute(students_query, {"class_id": class_id})
-    students_data = students_result.fetchall()
-    
-    # Get all assignments for this class
-    assignments_query = text("""
-        SELECT ssa.assignment_id, ssa.set_id, ss.title
-        FROM public.study_set_assignment ssa
-        INNER JOIN public.studyset ss ON ssa.set_id = ss.set_id
-        WHERE ssa.class_id = :class_id
-    """)
-    assignments_result = db.execute(assignments_query, {"class_id": class_id})
-    assignments_data = assignments_result.fetchall()
-    
-    assignment_ids = [row[0] for row in assignments_data]
-    set_ids = [row[1] for row in assignments_data]
-    
-    result = []
-    
-    for student_row in students_data:
-        student_id = int(student_row[0])
-        student_name = str(student_row[1])
-        student_email = str(student_row[2])
-        
-        # Get progress for this student across all assignments
-        if set_ids:
-            progress_query = text("""
-                SELECT 
-                    ssp.set_id,
-                    ssp.mastery_percentage,
-                    ssp.items_completed,
-                    ssp.total_items,
-                    ssp.last_activity
-                FROM public.study_set_progress ssp
-                WHERE ssp.user_id = :student_id
-                AND ssp.set_id = ANY(:set_ids)
-            """)
-            progress_result = db.execute(
-                progress_query,
-                {"student_id": student_id, "set_ids": set_ids}
-            )
-            progress_data = progress_result.fetchall()
-        else:
-            progress_data = []
-        
-        # Create a map of set_id -> progress
-        progress_map = {}
-        for p_row in progress_data:
-            set_id = int(p_row[0])
-            mastery = float(p_row[1]) if p_row[1] else 0.0
-            items_completed = int(p_row[2]) if p_row[2] else 0
-            total_items = int(p_row[3]) if p_row[3] else 0
-            last_activity = p_row[4].isoformat() if p_row[4] else None
-            progress_map[set_id] = {
-                "mastery": mastery,
-                "items_completed": items_completed,
-                "total_items": total_items,
-                "last_activity": last_activity,
-            }
-        
-        # Build assignment details
-        assignment_details = []
-        total_mastery_sum = 0.0
-        completed_count = 0
-        
-        for assign_row in assignments_data:
-            assignment_id = int(assign_row[0])
-            set_id = int(assign_row[1])
-            title = str(assign_row[2])
-            
-            if set_id in progress_map:
-                progress_info = progress_map[set_id]
-                is_completed = progress_info["items_completed"] == progress_info["total_items"] and progress_info["total_items"] > 0
-                if is_completed:
-                    completed_count += 1
-                if progress_info["mastery"] > 0:
-                    total_mastery_sum += progress_info["mastery"]
-                
-                assignment_details.append({
-                    "assignment_id": assignment_id,
-                    "set_id": set_id,
-                    "title": title,
-                    "mastery": float(round(progress_info["mastery"], 2)),
-                    "items_completed": progress_info["items_completed"],
-                    "total_items": progress_info["total_items"],
-                    "is_completed": is_completed,
-                    "last_activity": progress_info["last_activity"],
-                })
-            else:
-                assignment_details.append({
-                    "assignment_id": assignment_id,
-                    "set_id": set_id,
-                    "title": title,
-                    "mastery": 0.0,
-                    "items_completed": 0,
-                    "total_items": 0,
-                    "is_completed": False,
-                    "last_activity": None,
-                })
-        
-        # Calculate average mastery (only for completed assignments with progress)
-        mastery_values = [a["mastery"] for a in assignment_details if a["mastery"] > 0]
-        average_mastery = float(round(sum(mastery_values) / len(mastery_values), 2)) if mastery_values else 0.0
-        
-        result.append({
-            "student_id": student_id,
-            "student_name": student_name,
-            "student_email": student_email,
-            "assignments_completed": completed_count,
-            "assignments_total": len(assignments_data),
-            "average_mastery": average_mastery,
-            "assignments": assignment_details,
-        })
-    
-    return result
-
-
-@router.get("/classes/{class_id}/students/progress")
+@router.get("/classes/{class_id}/students/progress", dependencies=[Depends(use_read_replica)])
 def get_class_students_progress(
     class_id: int,
     current_user: User = Depends(get_current_user),
+    ctx: access_control.AccessContext = Depends(access_control.get_access_context),
     db: Session = Depends(get_db),
 ):
     """Get student progress for a class (teachers only)"""
-    is_teacher = current_user.role and current_user.role.name.lower() == "teacher"
+    is_teacher = ctx.is_teacher
     if not is_teacher:
         raise HTTPException(status_code=403, detail="Only teachers can view student progress")
     
@@ -1312,137 +1069,101 @@ def get_class_students_progress(
     if not class_result.first():
         raise HTTPException(status_code=403, detail="You don't have permission to view this class")
     
-    # Get all students in the class
-    students_query = text("""
-        SELECT u.user_id, u.name, u.email
-        FROM public."User" u
-        INNER JOIN public.enrollment e ON u.user_id = e.user_id
-        WHERE e.class_id = :class_id
-        ORDER BY u.name
-    """)
-    students_result = db.execute(students_query, {"class_id": class_id})
-    students_data = students_result.fetchall()
-    
-    # Get all assignments for this class
-    assignments_query = text("""
-        SELECT ssa.assignment_id, ssa.set_id, ss.title
-        FROM public.study_set_assignment ssa
-        INNER JOIN public.studyset ss ON ssa.set_id = ss.set_id
-        WHERE ssa.class_id = :class_id
+    # Student x assignment matrix in one query; per-student totals come from window aggregates.
+    # Students without any assignment still get one row (assignment columns NULL).
+    matrix_query = text("""
+        WITH students AS (
+            SELECT u.user_id, u.name, u.email
+            FROM public."User" u
+            INNER JOIN public.enrollment e ON u.user_id = e.user_id
+            WHERE e.class_id = :class_id
+        ),
+        assignments AS (
+            SELECT ssa.assignment_id, ssa.set_id, ss.title
+            FROM public.study_set_assignment ssa
+            INNER JOIN public.studyset ss ON ssa.set_id = ss.set_id
+            WHERE ssa.class_id = :class_id
+        ),
+        cells AS (
+            SELECT
+                s.user_id,
+                s.name,
+                s.email,
+                a.assignment_id,
+                a.set_id,
+                a.title,
+                COALESCE(p.mastery_percentage, 0) AS mastery,
+                COALESCE(p.items_completed, 0) AS items_completed,
+                COALESCE(p.total_items, 0) AS total_items,
+                p.last_activity,
+                COALESCE(p.total_items > 0 AND p.items_completed = p.total_items, FALSE) AS is_completed
+            FROM students s
+            LEFT JOIN assignments a ON TRUE
+            LEFT JOIN public.study_set_progress p
+                ON p.user_id = s.user_id AND p.set_id = a.set_id
+        )
+        SELECT
+            c.user_id,
+            c.name,
+            c.email,
+            c.assignment_id,
+            c.set_id,
+            c.title,
+            c.mastery,
+            c.items_completed,
+            c.total_items,
+            c.last_activity,
+            c.is_completed,
+            COUNT(*) FILTER (WHERE c.is_completed) OVER w AS assignments_completed,
+            COUNT(c.assignment_id) OVER w AS assignments_total,
+            AVG(c.mastery) FILTER (WHERE c.mastery > 0) OVER w AS average_mastery
+        FROM cells c
+        WINDOW w AS (PARTITION BY c.user_id)
+        ORDER BY c.name, c.user_id, c.assignment_id
     """)
-    assignments_result = db.execute(assignments_query, {"class_id": class_id})
-    assignments_data = assignments_result.fetchall()
-    
-    assignment_ids = [row[0] for row in assignments_data]
-    set_ids = [row[1] for row in assignments_data]
+    rows = db.execute(matrix_query, {"class_id": class_id}).fetchall()
     
     result = []
-    
-    for student_row in students_data:
-        student_id = int(student_row[0])
-        student_name = str(student_row[1])
-        student_email = str(student_row[2])
-        
-        # Get progress for this student across all assignments
-        if set_ids:
-            progress_query = text("""
-                SELECT 
-                    ssp.set_id,
-                    ssp.mastery_percentage,
-                    ssp.items_completed,
-                    ssp.total_items,
-                    ssp.last_activity
-                FROM public.study_set_progress ssp
-                WHERE ssp.user_id = :student_id
-                AND ssp.set_id = ANY(:set_ids)
-            """)
-            progress_result = db.execute(
-                progress_query,
-                {"student_id": student_id, "set_ids": set_ids}
-            )
-            progress_data = progress_result.fetchall()
-        else:
-            progress_data = []
-        
-        # Create a map of set_id -> progress
-        progress_map = {}
-        for p_row in progress_data:
-            set_id = int(p_row[0])
-            mastery = float(p_row[1]) if p_row[1] else 0.0
-            items_completed = int(p_row[2]) if p_row[2] else 0
-            total_items = int(p_row[3]) if p_row[3] else 0
-            last_activity = p_row[4].isoformat() if p_row[4] else None
-            progress_map[set_id] = {
-                "mastery": mastery,
-                "items_completed": items_completed,
-                "total_items": total_items,
-                "last_activity": last_activity,
+    by_student = {}
+    for row in rows:
+        student_id = int(row[0])
+        entry = by_student.get(student_id)
+        if entry is None:
+            entry = {
+                "student_id": student_id,
+                "student_name": str(row[1]),
+                "student_email": str(row[2]),
+                "assignments_completed": int(row[11]),
+                "assignments_total": int(row[12]),
+                "average_mastery": float(round(row[13], 2)) if row[13] is not None else 0.0,
+                "assignments": [],
             }
-        
-        # Build assignment details
-        assignment_details = []
-        total_mastery_sum = 0.0
-        completed_count = 0
-        
-        for assign_row in assignments_data:
-            assignment_id = int(assign_row[0])
-            set_id = int(assign_row[1])
-            title = str(assign_row[2])
-            
-            if set_id in progress_map:
-                progress_info = progress_map[set_id]
-                is_completed = progress_info["items_completed"] == progress_info["total_items"] and progress_info["total_items"] > 0
-                if is_completed:
-                    completed_count += 1
-                if progress_info["mastery"] > 0:
-                    total_mastery_sum += progress_info["mastery"]
-                
-                assignment_details.append({
-                    "assignment_id": assignment_id,
-                    "set_id": set_id,
-                    "title": title,
-                    "mastery": float(round(progress_info["mastery"], 2)),
-                    "items_completed": progress_info["items_completed"],
-                    "total_items": progress_info["total_items"],
-                    "is_completed": is_completed,
-                    "last_activity": progress_info["last_activity"],
-                })
-            else:
-                assignment_details.append({
-                    "assignment_id": assignment_id,
-                    "set_id": set_id,
-                    "title": title,
-                    "mastery": 0.0,
-                    "items_completed": 0,
-                    "total_items": 0,
-                    "is_completed": False,
-                    "last_activity": None,
-                })
-        
-        # Calculate average mastery (only for completed assignments with progress)
-        mastery_values = [a["mastery"] for a in assignment_details if a["mastery"] > 0]
-        average_mastery = float(round(sum(mastery_values) / len(mastery_values), 2)) if mastery_values else 0.0
-        
-        result.append({
-            "student_id": student_id,
-            "student_name": student_name,
-            "student_email": student_email,
-            "assignments_completed": completed_count,
-            "assignments_total": len(assignments_data),
-            "average_mastery": average_mastery,
-            "assignments": assignment_details,
+            by_student[student_id] = entry
+            result.append(entry)
+        if row[3] is None:
+            continue
+        entry["assignments"].append({
+            "assignment_id": int(row[3]),
+            "set_id": int(row[4]),
+            "title": str(row[5]),
+            "mastery": float(round(row[6], 2)),
+            "items_completed": int(row[7]),
+            "total_items": int(row[8]),
+            "is_completed": bool(row[10]),
+            "last_activity": row[9].isoformat() if row[9] else None,
         })
     
     return result
 
 
-@router.get("/analytics")
+@router.get("/analytics", dependencies=[Depends(use_read_replica)])
 def get_analytics(
     set_id: Optional[int] = None,
     current_user: User = Depends(get_current_user),
+    ctx: access_control.AccessContext = Depends(access_control.get_access_context),
     db: Session = Depends(get_db),
 ):
-    is_teacher = current_user.role and current_user.role.name.lower() == "teacher"
+    is_teacher = ctx.is_teacher
     if not is_teacher:
         raise HTTPException(status_code=403, detail="Only teachers can view analytics")
     
@@ -1455,100 +1176,69 @@ def get_analytics(
     else:
         study_sets = db.query(models.StudySet).filter(models.StudySet.creator_id == current_user.user_id).all()
     
-    analytics_list = []
+    set_ids = [s.set_id for s in study_sets]
+    rollups = analytics_rollup.set_wide_rows(db, set_ids)
+    
+    # Per-student detail for every set in one query (assigned via class enrollment)
+    students_by_set = {}
     total_students_set = set()
+    if set_ids:
+        students_query = text("""
+            SELECT m.set_id, u.user_id, u.name, u.email,
+                   p.mastery_percentage, p.items_completed, p.total_items, p.last_activity,
+                   (p.progress_id IS NOT NULL) AS has_progress
+            FROM (
+                SELECT DISTINCT ssa.set_id, e.user_id
+                FROM public.study_set_assignment ssa
+                JOIN public.enrollment e ON ssa.class_id = e.class_id
+                WHERE ssa.set_id = ANY(:set_ids)
+            ) m
+            JOIN public."User" u ON u.user_id = m.user_id
+            LEFT JOIN public.study_set_progress p
+                ON p.set_id = m.set_id AND p.user_id = m.user_id
+            ORDER BY m.set_id, u.name, u.user_id
+        """)
+        for row in db.execute(students_query, {"set_ids": set_ids}).fetchall():
+            student_id = int(row[1])
+            total_students_set.add(student_id)
+            if row[8]:
+                mastery = float(row[4]) if row[4] else 0.0
+                items_completed = row[5] if row[5] else 0
+                total_items = row[6] if row[6] else 0
+                detail = {
+                    "student_id": student_id,
+                    "student_name": str(row[2]),
+                    "student_email": str(row[3]),
+                    "mastery": float(round(mastery, 2)),
+                    "items_completed": items_completed,
+                    "total_items": total_items,
+                    "is_completed": items_completed == total_items and total_items > 0,
+                    "last_activity": row[7].isoformat() if row[7] else None,
+                }
+            else:
+                detail = {
+                    "student_id": student_id,
+                    "student_name": str(row[2]),
+                    "student_email": str(row[3]),
+                    "mastery": 0.0,
+                    "items_completed": 0,
+                    "total_items": 0,
+                    "is_completed": False,
+                    "last_activity": None,
+                }
+            students_by_set.setdefault(int(row[0]), []).append(detail)
+    
+    analytics_list = []
     total_mastery_sum = 0.0
     total_mastery_count = 0
     
     for study_set in study_sets:
-        assignment_query = text("""
-            SELECT DISTINCT e.user_id
-            FROM public.study_set_assignment ssa
-            JOIN public.enrollment e ON ssa.class_id = e.class_id
-            WHERE ssa.set_id = :set_id
-        """)
-        assigned_students = db.execute(assignment_query, {"set_id": study_set.set_id}).fetchall()
-        student_ids = [row[0] for row in assigned_students]
-        
-        if student_ids:
-            total_students_set.update(student_ids)
-        
-        if student_ids:
-            progress_list = (
-                db.query(models.StudySetProgress)
-                .filter(
-                    and_(
-                        models.StudySetProgress.set_id == study_set.set_id,
-                        models.StudySetProgress.user_id.in_(student_ids)
-                    )
-                )
-                .all()
-            )
-        else:
-            progress_list = []
-        
-        # Get student details with progress
-        student_details = []
-        if student_ids:
-            if len(student_ids) > 0:
-                placeholders = ", ".join([f":student_id_{i}" for i in range(len(student_ids))])
-                students_query = text(f"""
-                    SELECT u.user_id, u.name, u.email
-                    FROM public."User" u
-                    WHERE u.user_id IN ({placeholders})
-                    ORDER BY u.name
-                """)
-                params = {f"student_id_{i}": sid for i, sid in enumerate(student_ids)}
-                students_result = db.execute(students_query, params)
-                students_data = students_result.fetchall()
-            else:
-                students_data = []
-            
-            # Create a map of user_id -> progress
-            progress_map = {}
-            for p in progress_list:
-                progress_map[p.user_id] = {
-                    "mastery": float(p.mastery_percentage) if p.mastery_percentage else 0.0,
-                    "items_completed": p.items_completed if p.items_completed else 0,
-                    "total_items": p.total_items if p.total_items else 0,
-                    "last_activity": p.last_activity.isoformat() if p.last_activity else None,
-                }
-            
-            for student_row in students_data:
-                student_id = int(student_row[0])
-                student_name = str(student_row[1])
-                student_email = str(student_row[2])
-                
-                if student_id in progress_map:
-                    progress_info = progress_map[student_id]
-                    is_completed = progress_info["items_completed"] == progress_info["total_items"] and progress_info["total_items"] > 0
-                    student_details.append({
-                        "student_id": student_id,
-                        "student_name": student_name,
-                        "student_email": student_email,
-                        "mastery": float(round(progress_info["mastery"], 2)),
-                        "items_completed": progress_info["items_completed"],
-                        "total_items": progress_info["total_items"],
-                        "is_completed": is_completed,
-                        "last_activity": progress_info["last_activity"],
-                    })
-                else:
-                    student_details.append({
-                        "student_id": student_id,
-                        "student_name": student_name,
-                        "student_email": student_email,
-                        "mastery": 0.0,
-                        "items_completed": 0,
-                        "total_items": 0,
-                        "is_completed": False,
-                        "last_activity": None,
-                    })
-        
-        total_attempts = len(progress_list)
-        if progress_list:
-            avg_mastery = float(sum(float(p.mastery_percentage) for p in progress_list) / len(progress_list))
-            completion_count = sum(1 for p in progress_list if p.items_completed == p.total_items)
-            completion_rate = float((completion_count / len(student_ids) * 100) if student_ids else 0)
+        rollup = rollups.get(study_set.set_id)
+        student_count = rollup.student_count if rollup else 0
+        total_attempts = rollup.attempt_count if rollup else 0
+        if total_attempts:
+            avg_mastery = float(rollup.mastery_sum) / total_attempts
+            completion_rate = float((rollup.completion_count / student_count * 100) if student_count else 0)
         else:
             avg_mastery = 0.0
             completion_rate = 0.0
@@ -1560,11 +1250,11 @@ def get_analytics(
         analytics_list.append({
             "set_id": study_set.set_id,
             "title": study_set.title,
-            "total_students": len(student_ids),
+            "total_students": student_count,
             "average_mastery": float(round(avg_mastery, 2)),
             "completion_rate": float(round(completion_rate, 2)),
             "total_attempts": total_attempts,
-            "students": student_details,
+            "students": students_by_set.get(study_set.set_id, []),
         })
     
     average_mastery = float((total_mastery_sum / total_mastery_count) if total_mastery_count > 0 else 0.0)
@@ -1577,12 +1267,13 @@ def get_analytics(
     }
 
 
-@router.get("/progress")
+@router.get("/progress", dependencies=[Depends(use_read_replica)])
 def get_progress(
     current_user: User = Depends(get_current_user),
+    ctx: access_control.AccessContext = Depends(access_control.get_access_context),
     db: Session = Depends(get_db),
 ):
-    is_student = current_user.role and current_user.role.name.lower() == "student"
+    is_student = ctx.is_student
     if not is_student:
         raise HTTPException(status_code=403, detail="Only students can view progress")
     
@@ -1644,10 +1335,11 @@ def get_progress(
 def batch_record_progress(
     payload: dict,
     current_user: User = Depends(get_current_user),
+    ctx: access_control.AccessContext = Depends(access_control.get_access_context),
     db: Session = Depends(get_db),
 ):
     """Batch record progress for offline attempts"""
-    is_student = current_user.role and current_user.role.name.lower() == "student"
+    is_student = ctx.is_student
     if not is_student:
         raise HTTPException(status_code=403, detail="Only students can record progress")
     
@@ -1655,113 +1347,27 @@ def batch_record_progress(
     if not attempts:
         return {"synced": 0, "failed": 0}
     
-    synced_count = 0
-    failed_count = 0
-    
-    for attempt_data in attempts:
-        try:
-            set_id = attempt_data.get("set_id")
-            question_id = attempt_data.get("question_id")
-            is_correct = attempt_data.get("is_correct", False)
-            answer = attempt_data.get("answer", "")
-            timestamp_str = attempt_data.get("timestamp")
-            
-            if not set_id or not question_id:
-                failed_count += 1
-                continue
-
-            study_set = db.query(models.StudySet).filter(models.StudySet.set_id == set_id).first()
-            if not study_set:
-                failed_count += 1
-                continue
-            if not access_control.can_view_study_set(db, current_user, study_set):
-                failed_count += 1
-                continue
-            
-            # Get or create progress record
-            progress = (
-                db.query(models.StudySetProgress)
-                .filter(
-                    and_(
-                        models.StudySetProgress.set_id == set_id,
-                        models.StudySetProgress.user_id == current_user.user_id
-                    )
-                )
-                .first()
-            )
-            
-            if not progress:
-                # Count total questions
-                total_items = db.query(models.Question).filter(models.Question.set_id == set_id).count()
-                
-                progress = models.StudySetProgress(
-                    set_id=set_id,
-                    user_id=current_user.user_id,
-                    items_completed=0,
-                    total_items=total_items,
-                    mastery_percentage=0.0,
-                )
-                db.add(progress)
-            
-            # Update progress
-            if timestamp_str:
-                try:
-                    timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-                    if not progress.last_activity or timestamp > progress.last_activity:
-                        progress.last_activity = timestamp
-                except:
-                    progress.last_activity = datetime.utcnow()
-            else:
-                progress.last_activity = datetime.utcnow()
-            
-            # Update mastery based on correctness
-            # This is a simplified calculation - you might want to refine this
-            if is_correct:
-                progress.items_completed = min(progress.items_completed + 1, progress.total_items)
-            
-            # Recalculate mastery percentage
-            if progress.total_items > 0:
-                progress.mastery_percentage = float((progress.items_completed / progress.total_items) * 100)
-            
-            db.commit()
-            synced_count += 1
-            
-        except Exception as e:
-            db.rollback()
-            failed_count += 1
-            print(f"Failed to sync attempt: {e}")
+    result, written_set_ids = progress_sync.sync_attempts(ctx, attempts)
+    if written_set_ids:
+        leaderboard_engine.invalidate_user(current_user.user_id)
+        gamification_service.invalidate(current_user.user_id)
     
-    return {"synced": synced_count, "failed": failed_count}
+    return result
 
 
 def _may_manage_study_set_assignment(
-    db: Session,
-    user: User,
+    ctx: access_control.AccessContext,
     assn: models.StudySetAssignment,
     study_set: models.StudySet,
 ) -> bool:
     """Creator of the set or teacher of the assignment's class may view/edit due date and time limit."""
-    if study_set.creator_id == user.user_id:
+    if study_set.creator_id == ctx.user_id:
         return True
-    role_name = (user.role.name or "").lower() if user.role else ""
-    if role_name == "admin":
+    if ctx.is_admin:
         return True
-    if role_name != "teacher" or assn.class_id is None:
+    if not ctx.is_teacher or assn.class_id is None:
         return False
-    teacher_row = db.execute(
-        text("SELECT teacher_id FROM public.teacher WHERE teacher_id = :user_id"),
-        {"user_id": user.user_id},
-    ).first()
-    if not teacher_row:
-        return False
-    tid = teacher_row[0]
-    return (
-        db.execute(
-            text("SELECT 1 FROM public.class WHERE class_id = :cid AND teacher_id = :tid"),
-            {"cid": assn.class_id, "tid": tid},
-        ).first()
-        is not None
-    )
+    return assn.class_id in ctx.taught_class_ids
 
 
 # Path must not be `/{set_id}/assignments` — that shadows GET /dashboard/assignments (set_id="dashboard").
@@ -1769,6 +1375,7 @@ def _may_manage_study_set_assignment(
 def list_teacher_study_set_assignments(
     set_id: int,
     current_user: User = Depends(get_current_user),
+    ctx: access_control.AccessContext = Depends(access_control.get_access_context),
     db: Session = Depends(get_db),
 ):
     """List class assignments for this study set (creators and the class teacher)."""
@@ -1786,7 +1393,7 @@ def list_teacher_study_set_assignments(
     for assn in assns:
         if assn.class_id is None:
             continue
-        if not _may_manage_study_set_assignment(db, current_user, assn, study_set):
+        if not _may_manage_study_set_assignment(ctx, assn, study_set):
             continue
         cls = db.query(models.Class).filter(models.Class.class_id == assn.class_id).first()
         class_name = cls.class_name if cls else ""
@@ -1807,6 +1414,7 @@ def patch_study_set_assignment(
     assignment_id: int,
     payload: schemas.StudySetAssignmentPatch,
     current_user: User = Depends(get_current_user),
+    ctx: access_control.AccessContext = Depends(access_control.get_access_context),
     db: Session = Depends(get_db),
 ):
     """Update due date and/or session time limit for a class assignment."""
@@ -1820,7 +1428,7 @@ def patch_study_set_assignment(
     study_set = db.query(models.StudySet).filter(models.StudySet.set_id == assn.set_id).first()
     if not study_set:
         raise HTTPException(status_code=404, detail="Study set not found")
-    if not _may_manage_study_set_assignment(db, current_user, assn, study_set):
+    if not _may_manage_study_set_assignment(ctx, assn, study_set):
         raise HTTPException(status_code=403, detail="You don't have permission to update this assignment")
 
     updates = payload.model_dump(exclude_unset=True)
@@ -1843,11 +1451,12 @@ def patch_study_set_assignment(
     )
 
 
-@router.get("/{set_id}", response_model=schemas.StudySetOut)
+@router.get("/{set_id}", response_model=schemas.StudySetOut, dependencies=[Depends(use_read_replica)])
 def get_study_set(
     set_id: int,
     assignment_id: Optional[int] = Query(None, description="Optional assignment context for due date / time limit"),
     current_user: User = Depends(get_current_user),
+    ctx: access_control.AccessContext = Depends(access_control.get_access_context),
     db: Session = Depends(get_db),
 ):
     """Get a specific study set"""
@@ -1855,7 +1464,7 @@ def get_study_set(
     if not study_set:
         raise HTTPException(status_code=404, detail="Study set not found")
 
-    if not access_control.can_view_study_set(db, current_user, study_set):
+    if not access_control.can_view_study_set(ctx, study_set):
         raise HTTPException(status_code=403, detail="Access denied. You don't have permission to view this study set.")
 
     item_count = db.query(func.count(models.Question.question_id)).filter(
@@ -1891,7 +1500,7 @@ def get_study_set(
     )
     mastery = float(progress.mastery_percentage) if progress else None
 
-    pfm = access_control.effective_practice_feedback_mode(db, current_user, study_set)
+    pfm = access_control.effective_practice_feedback_mode(ctx, study_set)
 
     active_assignment_id = None
     assignment_due_date = None
@@ -1907,7 +1516,7 @@ def get_study_set(
         )
         if not assn:
             raise HTTPException(status_code=404, detail="Assignment not found for this study set")
-        if not _user_may_view_assignment_context(db, current_user, study_set, assn):
+        if not _user_may_view_assignment_context(ctx, assn):
             raise HTTPException(status_code=403, detail="You cannot use this assignment context")
         active_assignment_id = assn.assignment_id
         assignment_due_date = assn.due_date
@@ -1942,6 +1551,7 @@ def update_study_set(
     set_id: int,
     payload: schemas.StudySetUpdate,
     current_user: User = Depends(get_current_user),
+    ctx: access_control.AccessContext = Depends(access_control.get_access_context),
     db: Session = Depends(get_db),
 ):
     """Update a study set (only creator can update)"""
@@ -1965,7 +1575,7 @@ def update_study_set(
     if payload.description is not None:
         study_set.description = payload.description
 
-    is_teacher = current_user.role and current_user.role.name.lower() == "teacher"
+    is_teacher = ctx.is_teacher
 
     if payload.is_public is not None:
         study_set.is_public = payload.is_public
@@ -2010,7 +1620,7 @@ def update_study_set(
     
     # Get mastery if student
     mastery = None
-    is_student = current_user.role and current_user.role.name.lower() == "student"
+    is_student = ctx.is_student
     if is_student:
         progress = db.query(models.StudySetProgress).filter(
             models.StudySetProgress.set_id == set_id,
@@ -2043,13 +1653,14 @@ def update_study_set(
 def mark_offline(
     set_id: int,
     current_user: User = Depends(get_current_user),
+    ctx: access_control.AccessContext = Depends(access_control.get_access_context),
     db: Session = Depends(get_db),
 ):
     """Mark a study set as downloaded/offline"""
     study_set = db.query(models.StudySet).filter(models.StudySet.set_id == set_id).first()
     if not study_set:
         raise HTTPException(status_code=404, detail="Study set not found")
-    if not access_control.can_view_study_set(db, current_user, study_set):
+    if not access_control.can_view_study_set(ctx, study_set):
         raise HTTPException(status_code=403, detail="You don't have access to this study set")
 
     # Check if already marked
@@ -2100,20 +1711,27 @@ def remove_offline(
     return {"message": "Study set removed from offline"}
 
 
-@router.get("/{set_id}/questions")
+@router.get("/{set_id}/questions", dependencies=[Depends(use_read_replica)])
 def get_study_set_questions(
     set_id: int,
     current_user: User = Depends(get_current_user),
+    ctx: access_control.AccessContext = Depends(access_control.get_access_context),
     db: Session = Depends(get_db),
 ):
     study_set = db.query(models.StudySet).filter(models.StudySet.set_id == set_id).first()
     if not study_set:
         raise HTTPException(status_code=404, detail="Study set not found")
 
-    if not access_control.can_view_study_set(db, current_user, study_set):
+    if not access_control.can_view_study_set(ctx, study_set):
         raise HTTPException(status_code=403, detail="You don't have access to this study set")
 
-    questions = db.query(models.Question).filter(models.Question.set_id == set_id).all()
+    # Options and flashcards in two extra queries for the whole set, not one per question
+    questions = (
+        db.query(models.Question)
+        .options(selectinload(models.Question.options), selectinload(models.Question.flashcard))
+        .filter(models.Question.set_id == set_id)
+        .all()
+    )
     
     result = []
     for question in questions:
@@ -2128,16 +1746,13 @@ def get_study_set_questions(
         }
         
         if normalized_type == "flashcard":
-            flashcard = db.query(models.Flashcard).filter(models.Flashcard.question_id == question.question_id).first()
+            flashcard = question.flashcard
             if flashcard:
                 question_data["term"] = flashcard.term
                 question_data["definition"] = flashcard.definition
         
         if normalized_type in ["multiple_choice", "true_false"]:
-            options = db.query(models.QuestionOption).filter(
-                models.QuestionOption.question_id == question.question_id
-            ).order_by(models.QuestionOption.option_order).all()
-            question_data["options"] = [opt.option_text for opt in options]
+            question_data["options"] = [opt.option_text for opt in question.options]
         
         result.append(question_data)
     
@@ -2149,9 +1764,10 @@ def record_progress(
     set_id: int,
     payload: schemas.RecordProgressRequest,
     current_user: User = Depends(get_current_user),
+    ctx: access_control.AccessContext = Depends(access_control.get_access_context),
     db: Session = Depends(get_db),
 ):
-    is_student = current_user.role and current_user.role.name.lower() == "student"
+    is_student = ctx.is_student
     if not is_student:
         raise HTTPException(status_code=403, detail="Only students can record progress")
     
@@ -2159,53 +1775,12 @@ def record_progress(
     if not study_set:
         raise HTTPException(status_code=404, detail="Study set not found")
 
-    if not access_control.can_view_study_set(db, current_user, study_set):
+    if not access_control.can_view_study_set(ctx, study_set):
         raise HTTPException(status_code=403, detail="You don't have access to this study set")
     
-    questions = db.query(models.Question).filter(models.Question.set_id == set_id).all()
-    total_questions = len(questions)
-    correct_answers = 0
-    
-    for question in questions:
-        user_answer = payload.answers.get(str(question.question_id))
-        if user_answer is not None:
-            is_correct = False
-            normalized_type = _normalize_question_type(question.type)
-            if normalized_type == "multiple_choice":
-                try:
-                    user_answer_idx = int(user_answer)
-                    options = db.query(models.QuestionOption).filter(
-                        models.QuestionOption.question_id == question.question_id
-                    ).order_by(models.QuestionOption.option_order).all()
-                    if user_answer_idx >= 0 and user_answer_idx < len(options):
-                        correct_answer_raw = str(question.correct_answer).strip()
-                        selected_option_text = options[user_answer_idx].option_text.strip()
-                        # Backward-compatibility:
-                        # `correct_answer` may be stored as option text, 0-based index, or 1-based index.
-                        is_correct = selected_option_text.lower() == correct_answer_raw.lower()
-                        if not is_correct:
-                            try:
-                                correct_answer_idx = int(correct_answer_raw)
-                                if user_answer_idx == correct_answer_idx:
-                                    is_correct = True
-                                elif (
-                                    1 <= correct_answer_idx <= len(options)
-                                    and user_answer_idx == correct_answer_idx - 1
-                                ):
-                                    is_correct = True
-                            except (TypeError, ValueError):
-                                pass
-                except (ValueError, IndexError):
-                    is_correct = False
-            elif normalized_type == "true_false":
-                user_answer_bool = str(user_answer).lower() == "true"
-                correct_answer_bool = str(question.correct_answer).strip().lower() == "true"
-                is_correct = user_answer_bool == correct_answer_bool
-            else:
-                is_correct = str(user_answer).strip().lower() == str(question.correct_answer).strip().lower()
-            
-            if is_correct:
-                correct_answers += 1
+    key = answer_key.get_answer_key(db, study_set)
+    total_questions = key.total
+    correct_answers = key.grade(payload.answers)
     
     mastery_percentage = (correct_answers / total_questions * 100) if total_questions > 0 else 0
     
@@ -2236,7 +1811,10 @@ def record_progress(
         )
         db.add(progress)
     
+    analytics_rollup.refresh_for_student(db, current_user.user_id, [set_id])
     db.commit()
+    leaderboard_engine.invalidate_user(current_user.user_id)
+    gamification_service.invalidate(current_user.user_id)
     
     return {
         "mastery_percentage": float(mastery_percentage),
@@ -2318,7 +1896,9 @@ def add_question(
             )
             db.add(option)
     
+    study_set.updated_at = datetime.utcnow()
     db.commit()
+    answer_key.invalidate(set_id)
     
     return {
         "id": question.question_id,
@@ -2384,7 +1964,9 @@ def update_question(
                 )
                 db.add(option)
     
+    study_set.updated_at = datetime.utcnow()
     db.commit()
+    answer_key.invalidate(set_id)
     
     return {
         "id": question.question_id,
@@ -2421,18 +2003,21 @@ def delete_question(
         raise HTTPException(status_code=404, detail="Question not found")
     
     db.delete(question)
+    study_set.updated_at = datetime.utcnow()
     db.commit()
+    answer_key.invalidate(set_id)
     
     return {"message": "Question deleted successfully"}
 
 
-@router.get("/dashboard/stats")
+@router.get("/dashboard/stats", dependencies=[Depends(use_read_replica)])
 def get_dashboard_stats(
     current_user: User = Depends(get_current_user),
+    ctx: access_control.AccessContext = Depends(access_control.get_access_context),
     db: Session = Depends(get_db),
 ):
-    is_student = current_user.role and current_user.role.name.lower() == "student"
-    is_teacher = current_user.role and current_user.role.name.lower() == "teacher"
+    is_student = ctx.is_student
+    is_teacher = ctx.is_teacher
     
     today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
     
@@ -2504,12 +2089,13 @@ def get_dashboard_stats(
     return {}
 
 
-@router.get("/dashboard/assignments")
+@router.get("/dashboard/assignments", dependencies=[Depends(use_read_replica)])
 def get_dashboard_assignments(
     current_user: User = Depends(get_current_user),
+    ctx: access_control.AccessContext = Depends(access_control.get_access_context),
     db: Session = Depends(get_db),
 ):
-    is_student = current_user.role and current_user.role.name.lower() == "student"
+    is_student = ctx.is_student
     
     if not is_student:
         return []
@@ -2583,20 +2169,18 @@ def get_dashboard_assignments(
     return assignments
 
 
-@router.get("/dashboard/recommendations")
+@router.get("/dashboard/recommendations", dependencies=[Depends(use_read_replica)])
 def get_recommendations(
     current_user: User = Depends(get_current_user),
+    ctx: access_control.AccessContext = Depends(access_control.get_access_context),
     db: Session = Depends(get_db),
 ):
-    is_student = current_user.role and current_user.role.name.lower() == "student"
+    is_student = ctx.is_student
     
     if not is_student:
         return []
     
-    enrolled_class_ids = []
-    enrollment_query = text("SELECT class_id FROM public.enrollment WHERE user_id = :user_id")
-    enrolled_class_ids_result = db.execute(enrollment_query, {"user_id": current_user.user_id})
-    enrolled_class_ids = [row[0] for row in enrolled_class_ids_result] if enrolled_class_ids_result else []
+    enrolled_class_ids = sorted(ctx.enrolled_class_ids)
     
     recommendations = []
     
@@ -2685,36 +2269,38 @@ def get_recommendations(
     return recommendations
 
 
-@router.get("/recommendations/me")
+@router.get("/recommendations/me", dependencies=[Depends(use_read_replica)])
 def get_rule_based_recommendations_for_student(
     current_user: User = Depends(get_current_user),
+    ctx: access_control.AccessContext = Depends(access_control.get_access_context),
     db: Session = Depends(get_db),
 ):
     """
     Rule-based study set suggestions from practice history (no ML / no Gemini).
     Response shape: { "recommendations": [ { "id", "title", "subject", "level", "reason" }, ... ] }.
     """
-    is_student = current_user.role and current_user.role.name.lower() == "student"
+    is_student = ctx.is_student
     if not is_student:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only students can access recommendations",
         )
     try:
-        items = build_rule_based_recommendations_list(current_user.user_id, db, limit=5)
+        items = build_rule_based_recommendations_list(ctx, limit=5)
     except Exception:
         _logger.exception("build_rule_based_recommendations_list failed")
         items = []
     return {"recommendations": items}
 
 
-@router.get("/recommendations/next")
+@router.get("/recommendations/next", dependencies=[Depends(use_read_replica)])
 def get_next_recommendation(
     current_user: User = Depends(get_current_user),
+    ctx: access_control.AccessContext = Depends(access_control.get_access_context),
     db: Session = Depends(get_db),
 ):
     """Get the next recommended study set for the current user based on their performance."""
-    is_student = current_user.role and current_user.role.name.lower() == "student"
+    is_student = ctx.is_student
     
     if not is_student:
         raise HTTPException(status_code=403, detail="Only students can get recommendations")
@@ -2736,395 +2322,80 @@ def get_next_recommendation(
     return recommendation
 
 
-@router.get("/dashboard/leaderboard")
+@router.get("/dashboard/leaderboard", dependencies=[Depends(use_read_replica)])
 def get_leaderboard(
     class_id: Optional[int] = Query(None),
     current_user: User = Depends(get_current_user),
+    ctx: access_control.AccessContext = Depends(access_control.get_access_context),
     db: Session = Depends(get_db),
 ):
-    is_student = current_user.role and current_user.role.name.lower() == "student"
+    is_student = ctx.is_student
     
     if not is_student:
         return {"leaderboard": [], "current_user_rank": None}
     
-    enrolled_class_ids = []
     if class_id:
-        enrollment_query = text("SELECT class_id FROM public.enrollment WHERE user_id = :user_id AND class_id = :class_id")
-        result = db.execute(enrollment_query, {"user_id": current_user.user_id, "class_id": class_id})
-        if result.fetchone():
-            enrolled_class_ids = [class_id]
+        enrolled_class_ids = [class_id] if class_id in ctx.enrolled_class_ids else []
     else:
-        enrollment_query = text("SELECT class_id FROM public.enrollment WHERE user_id = :user_id")
-        enrolled_class_ids_result = db.execute(enrollment_query, {"user_id": current_user.user_id})
-        enrolled_class_ids = [row[0] for row in enrolled_class_ids_result] if enrolled_class_ids_result else []
+        enrolled_class_ids = sorted(ctx.enrolled_class_ids)
     
     if not enrolled_class_ids:
         return {"leaderboard": [], "current_user_rank": None}
     
-    student_ids_query = text("SELECT DISTINCT user_id FROM public.enrollment WHERE class_id = ANY(:class_ids)")
-    student_ids_result = db.execute(student_ids_query, {"class_ids": enrolled_class_ids})
-    student_ids = [row[0] for row in student_ids_result] if student_ids_result else []
+    top, own = leaderboard_engine.leaderboard(db, enrolled_class_ids, current_user.user_id)
     
-    if not student_ids:
-        return {"leaderboard": [], "current_user_rank": None}
-    
-    leaderboard_data = []
-    processed_user_ids = set()  # Track processed users to avoid duplicates
-    for student_id in student_ids:
-        if student_id in processed_user_ids:
-            continue  # Skip if already processed
-        processed_user_ids.add(student_id)
-        total_points = (
-            db.query(func.sum(models.StudySetProgress.mastery_percentage))
-            .filter(models.StudySetProgress.user_id == student_id)
-            .scalar() or 0
-        )
-        
-        user = db.query(User).filter(User.user_id == student_id).first()
-        if user:
-            leaderboard_data.append({
-                "user_id": student_id,
-                "name": user.name,
-                "points": int(float(total_points)),
-            })
-    
-    leaderboard_data.sort(key=lambda x: x["points"], reverse=True)
-    
-    leaderboard = []
-    for idx, entry in enumerate(leaderboard_data[:10], 1):
-        leaderboard.append({
-            "rank": idx,
-            "name": entry["name"],
-            "points": entry["points"],
-        })
+    leaderboard = [
+        {"rank": entry.rank, "name": entry.name, "points": entry.points}
+        for entry in top
+    ]
     
     current_user_rank = None
-    for idx, entry in enumerate(leaderboard_data, 1):
-        if entry["user_id"] == current_user.user_id:
-            current_user_rank = {
-                "rank": idx,
-                "name": current_user.name,
-                "points": entry["points"],
-            }
-            break
+    if own is not None:
+        current_user_rank = {
+            "rank": own.rank,
+            "name": current_user.name,
+            "points": own.points,
+        }
     
     return {"leaderboard": leaderboard, "current_user_rank": current_user_rank}
 
 
-@router.get("/gamification/badges")
+def _gamification_stats(ctx: access_control.AccessContext) -> Optional[gamification_service.Stats]:
+    if not ctx.is_student:
+        return None
+    return gamification_service.get_stats(ctx.db, ctx.user_id)
+
+
+@router.get("/gamification/badges", dependencies=[Depends(use_read_replica)])
 def get_all_badges(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    ctx: access_control.AccessContext = Depends(access_control.get_access_context),
 ):
-    is_student = current_user.role and current_user.role.name.lower() == "student"
-    
-    if not is_student:
-        return {"earned_badges": [], "available_badges": []}
-    
-    today = datetime.utcnow().date()
-    streak = 0
-    current_date = today
-    
-    while True:
-        date_start = datetime.combine(current_date, datetime.min.time())
-        date_end = datetime.combine(current_date, datetime.max.time())
-        
-        has_activity = (
-            db.query(models.StudySetProgress)
-            .filter(
-                and_(
-                    models.StudySetProgress.user_id == current_user.user_id,
-                    models.StudySetProgress.last_activity >= date_start,
-                    models.StudySetProgress.last_activity <= date_end,
-                )
-            )
-            .first()
-        )
-        
-        if not has_activity:
-            break
-        
-        streak += 1
-        current_date = (datetime.combine(current_date, datetime.min.time()) - timedelta(days=1)).date()
-    
-    total_quizzes = (
-        db.query(func.count(func.distinct(models.StudySetProgress.set_id)))
-        .filter(models.StudySetProgress.user_id == current_user.user_id)
-        .scalar() or 0
-    )
-    
-    total_points = (
-        db.query(func.sum(models.StudySetProgress.mastery_percentage))
-        .filter(models.StudySetProgress.user_id == current_user.user_id)
-        .scalar() or 0
-    )
-    total_points = int(float(total_points)) if total_points else 0
-    
-    high_accuracy_count = (
-        db.query(func.count(models.StudySetProgress.progress_id))
-        .filter(
-            and_(
-                models.StudySetProgress.user_id == current_user.user_id,
-                models.StudySetProgress.mastery_percentage >= 90,
-            )
-        )
-        .scalar() or 0
-    )
-    
-    earned_badges = []
-    if streak >= 3:
-        earned_badges.append(
-            {
-                "badge_id": "consistency",
-                "name": "Consistency",
-                "icon": "🔥",
-                "description": f"{streak}-day streak",
-                "earned": True,
-                "i18n_params": {"count": streak},
-            }
-        )
-    if total_quizzes >= 5:
-        earned_badges.append(
-            {
-                "badge_id": "quick_learner",
-                "name": "Quick Learner",
-                "icon": "⚡",
-                "description": f"{total_quizzes} quizzes completed",
-                "earned": True,
-                "i18n_params": {"count": total_quizzes},
-            }
-        )
-    if streak >= 7:
-        earned_badges.append(
-            {
-                "badge_id": "week_warrior",
-                "name": "Week Warrior",
-                "icon": "💪",
-                "description": "7+ day streak",
-                "earned": True,
-                "i18n_params": {},
-            }
-        )
-    if total_quizzes >= 10:
-        earned_badges.append(
-            {
-                "badge_id": "quiz_master",
-                "name": "Quiz Master",
-                "icon": "🏆",
-                "description": f"{total_quizzes} quizzes completed",
-                "earned": True,
-                "i18n_params": {"count": total_quizzes},
-            }
-        )
-    if total_points >= 1000:
-        earned_badges.append(
-            {
-                "badge_id": "point_collector",
-                "name": "Point Collector",
-                "icon": "⭐",
-                "description": f"{total_points} points earned",
-                "earned": True,
-                "i18n_params": {"count": total_points},
-            }
-        )
-    if high_accuracy_count >= 5:
-        earned_badges.append(
-            {
-                "badge_id": "perfectionist",
-                "name": "Perfectionist",
-                "icon": "✨",
-                "description": f"{high_accuracy_count} perfect scores",
-                "earned": True,
-                "i18n_params": {"count": high_accuracy_count},
-            }
-        )
-
-    available_badges = []
-    if streak < 3:
-        available_badges.append(
-            {
-                "badge_id": "consistency",
-                "name": "Consistency",
-                "icon": "🔥",
-                "description": "Maintain a 3-day streak",
-                "earned": False,
-                "progress": streak,
-                "target": 3,
-            }
-        )
-    if total_quizzes < 5:
-        available_badges.append(
-            {
-                "badge_id": "quick_learner",
-                "name": "Quick Learner",
-                "icon": "⚡",
-                "description": "Complete 5 quizzes",
-                "earned": False,
-                "progress": total_quizzes,
-                "target": 5,
-            }
-        )
-    if streak < 7:
-        available_badges.append(
-            {
-                "badge_id": "week_warrior",
-                "name": "Week Warrior",
-                "icon": "💪",
-                "description": "Maintain a 7-day streak",
-                "earned": False,
-                "progress": streak,
-                "target": 7,
-            }
-        )
-    if total_quizzes < 10:
-        available_badges.append(
-            {
-                "badge_id": "quiz_master",
-                "name": "Quiz Master",
-                "icon": "🏆",
-                "description": "Complete 10 quizzes",
-                "earned": False,
-                "progress": total_quizzes,
-                "target": 10,
-            }
-        )
-    if total_points < 1000:
-        available_badges.append(
-            {
-                "badge_id": "point_collector",
-                "name": "Point Collector",
-                "icon": "⭐",
-                "description": "Earn 1000 points",
-                "earned": False,
-                "progress": total_points,
-                "target": 1000,
-            }
-        )
-    if high_accuracy_count < 5:
-        available_badges.append(
-            {
-                "badge_id": "perfectionist",
-                "name": "Perfectionist",
-                "icon": "✨",
-                "description": "Get 5 perfect scores",
-                "earned": False,
-                "progress": high_accuracy_count,
-                "target": 5,
-            }
-        )
-    
-    return {"earned_badges": earned_badges, "available_badges": available_badges}
+    return gamification_service.badges_payload(_gamification_stats(ctx))
 
 
-@router.get("/gamification/points")
+@router.get("/gamification/points", dependencies=[Depends(use_read_replica)])
 def get_points_breakdown(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    ctx: access_control.AccessContext = Depends(access_control.get_access_context),
 ):
-    is_student = current_user.role and current_user.role.name.lower() == "student"
-    
-    if not is_student:
-        return {"total_points": 0, "breakdown": {}}
-    
-    total_points = (
-        db.query(func.sum(models.StudySetProgress.mastery_percentage))
-        .filter(models.StudySetProgress.user_id == current_user.user_id)
-        .scalar() or 0
-    )
-    total_points = int(float(total_points)) if total_points else 0
-    
-    total_quizzes = (
-        db.query(func.count(func.distinct(models.StudySetProgress.set_id)))
-        .filter(models.StudySetProgress.user_id == current_user.user_id)
-        .scalar() or 0
-    )
-    
-    avg_accuracy = (
-        db.query(func.avg(models.StudySetProgress.mastery_percentage))
-        .filter(models.StudySetProgress.user_id == current_user.user_id)
-        .scalar() or 0
-    )
-    avg_accuracy = float(avg_accuracy) if avg_accuracy else 0
-    
+    return gamification_service.points_payload(_gamification_stats(ctx))
+
+
+@router.get("/gamification/summary", dependencies=[Depends(use_read_replica)])
+def get_gamification_summary(
+    ctx: access_control.AccessContext = Depends(access_control.get_access_context),
+):
+    """Streaks, badges and points in one response, computed from a single set of stats."""
+    stats = _gamification_stats(ctx)
     return {
-        "total_points": total_points,
-        "total_quizzes": total_quizzes,
-        "average_accuracy": round(avg_accuracy, 1),
-        "breakdown": {
-            "from_quizzes": total_points,
-            "streak_bonus": 0,
-            "accuracy_bonus": 0,
-        }
+        "streaks": gamification_service.streaks_payload(stats),
+        "badges": gamification_service.badges_payload(stats),
+        "points": gamification_service.points_payload(stats),
     }
 
 
-@router.get("/dashboard/streaks")
+@router.get("/dashboard/streaks", dependencies=[Depends(use_read_replica)])
 def get_streaks(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    ctx: access_control.AccessContext = Depends(access_control.get_access_context),
 ):
-    is_student = current_user.role and current_user.role.name.lower() == "student"
-    
-    if not is_student:
-        return {"streak": 0, "badges": [], "next_badge": None}
-    
-    today = datetime.utcnow().date()
-    streak = 0
-    current_date = today
-    
-    while True:
-        date_start = datetime.combine(current_date, datetime.min.time())
-        date_end = datetime.combine(current_date, datetime.max.time())
-        
-        has_activity = (
-            db.query(models.StudySetProgress)
-            .filter(
-                and_(
-                    models.StudySetProgress.user_id == current_user.user_id,
-                    models.StudySetProgress.last_activity >= date_start,
-                    models.StudySetProgress.last_activity <= date_end,
-                )
-            )
-            .first()
-        )
-        
-        if not has_activity:
-            break
-        
-        streak += 1
-        current_date = (datetime.combine(current_date, datetime.min.time()) - timedelta(days=1)).date()
-    
-    total_quizzes = (
-        db.query(func.count(func.distinct(models.StudySetProgress.set_id)))
-        .filter(models.StudySetProgress.user_id == current_user.user_id)
-        .scalar() or 0
-    )
-    
-    badges = []
-    if streak >= 3:
-        badges.append({"badge_id": "consistency", "name": "Consistency", "icon": "🔥"})
-    if total_quizzes >= 5:
-        badges.append({"badge_id": "quick_learner", "name": "Quick Learner", "icon": "⚡"})
-
-    next_badge = None
-    if total_quizzes < 5:
-        next_badge = {
-            "badge_id": "quick_learner",
-            "name": "Quick Learner",
-            "progress": total_quizzes,
-            "target": 5,
-        }
-    elif streak < 7:
-        next_badge = {
-            "badge_id": "week_warrior",
-            "name": "Week Warrior",
-            "progress": streak,
-            "target": 7,
-        }
-    
-    return {
-        "streak": streak,
-        "badges": badges,
-        "next_badge": next_badge,
-    }
+    return gamification_service.streaks_payload(_gamification_stats(ctx))
 
@@ -10,10 +10,10 @@ from datetime import datetime, timedelta
 from decimal import Decimal
 from typing import Any, List, Optional, Set
 
-from sqlalchemy import and_, or_, text
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session, joinedload
 
-from app.study_sets import models
+from app.study_sets import access_control, models
 
 # Ordered difficulty for comparisons (aligned with recommendation_service.py)
 LEVEL_RANK = {
@@ -31,40 +31,15 @@ def _level_rank(level: Optional[str]) -> int:
     return LEVEL_RANK.get(level.strip(), LEVEL_RANK["Medium"])
 
 
-def _student_accessible_set_ids(db: Session, user_id: int) -> Set[int]:
+def _student_accessible_set_ids(ctx: access_control.AccessContext) -> Set[int]:
     """
-    IDs of study sets a student may open — mirrors visibility in get_study_sets for students.
+    IDs of study sets a student may open — same visibility as get_study_sets for students.
     """
-    directly_assigned = (
-        db.query(models.StudySetAssignment.set_id)
-        .join(models.StudySetStudentAssignment)
-        .filter(models.StudySetStudentAssignment.user_id == user_id)
-    )
-    enrollment_query = text("SELECT class_id FROM public.enrollment WHERE user_id = :user_id")
-    enrolled_class_ids_result = db.execute(enrollment_query, {"user_id": user_id})
-    enrolled_class_ids = [row[0] for row in enrolled_class_ids_result] if enrolled_class_ids_result else []
-
-    conditions = [
-        models.StudySet.creator_id == user_id,
-        models.StudySet.is_public == True,  # noqa: E712
-    ]
-    conditions.append(
-        models.StudySet.set_id.in_(
-            db.query(models.StudySetAssignment.set_id)
-            .join(models.StudySetStudentAssignment)
-            .filter(models.StudySetStudentAssignment.user_id == user_id)
-        )
+    rows = (
+        ctx.db.query(models.StudySet.set_id)
+        .filter(or_(*access_control.build_student_list_conditions(ctx)))
+        .all()
     )
-    if enrolled_class_ids:
-        conditions.append(
-            models.StudySet.set_id.in_(
-                db.query(models.StudySetAssignment.set_id).filter(
-                    models.StudySetAssignment.class_id.in_(enrolled_class_ids)
-                )
-            )
-        )
-
-    rows = db.query(models.StudySet.set_id).filter(or_(*conditions)).all()
     return {r[0] for r in rows if r[0] is not None}
 
 
@@ -85,12 +60,16 @@ def _recently_mastered_set_ids(db: Session, user_id: int, days: int = 7, min_mas
     return {r[0] for r in rows if r[0] is not None}
 
 
-def build_rule_based_recommendations_list(user_id: int, db: Session, limit: int = 5) -> List[dict[str, Any]]:
+def build_rule_based_recommendations_list(
+    ctx: access_control.AccessContext, limit: int = 5
+) -> List[dict[str, Any]]:
     """
     Return a list of {id, title, subject, level, reason} for GET /study-sets/recommendations/me.
     Safe with empty DB / no progress — returns starter picks or empty list with caller handling.
     """
-    accessible = _student_accessible_set_ids(db, user_id)
+    db = ctx.db
+    user_id = ctx.user_id
+    accessible = _student_accessible_set_ids(ctx)
     if not accessible:
         return []
 
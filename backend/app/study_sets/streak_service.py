@@ -0,0 +1,42 @@
+"""
+Current study streak for a student.
+
+A streak is the number of consecutive UTC calendar days, ending today, with any
+study_set_progress activity. It is computed with one gaps-and-islands query over
+the distinct activity dates instead of probing one day at a time.
+"""
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Distinct days, newest first, numbered from 0: a day is part of the island that ends
+# today exactly when day + n = today. After the first gap the sum stays below today.
+_STREAK_SQL = text("""
+    WITH days AS (
+        SELECT DISTINCT CAST(last_activity AS DATE) AS day
+        FROM public.study_set_progress
+        WHERE user_id = :user_id AND last_activity < :tomorrow
+    ),
+    numbered AS (
+        SELECT day, CAST(ROW_NUMBER() OVER (ORDER BY day DESC) - 1 AS INTEGER) AS n
+        FROM days
+    )
+    SELECT COUNT(*) FROM numbered WHERE day + n = :today
+""")
+
+
+def current_streak(db: Session, user_id: int, today: Optional[date] = None) -> int:
+    """Consecutive active days ending today (0 if there is no activity today)."""
+    if today is None:
+        today = datetime.utcnow().date()
+    tomorrow = datetime.combine(today + timedelta(days=1), datetime.min.time())
+    return int(
+        db.execute(
+            _STREAK_SQL, {"user_id": user_id, "today": today, "tomorrow": tomorrow}
+        ).scalar()
+        or 0
+    )
@@ -0,0 +1,140 @@
+"""
+Materialized per-user study set visibility (study_set_visibility).
+
+One row per (user_id, set_id) the user can see for a reason other than the set being public,
+with `reasons` a bitmask of CREATOR, DIRECT (individual assignment) and CLASS (assigned to an
+enrolled class). Public visibility stays a column predicate on studyset, so publishing or
+unpublishing a set never touches the index.
+
+Student listing, can_view_study_set and recommendations read this table (primary key lookup
+or indexed semi-join) instead of OR-ing creator, direct assignment and class assignment
+subqueries. Writers recompute the affected users or sets inside their own transaction, so
+the index commits together with the change; `python -m scripts.rebuild_visibility_index`
+rebuilds it from scratch after bulk imports or manual SQL.
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterable, List
+
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+
+from app.study_sets import models
+
+CREATOR = 1
+DIRECT = 2
+CLASS = 4
+ASSIGNED = DIRECT | CLASS
+
+# First key of pg_advisory_xact_lock(int, int). Set-scoped recomputes (study set creation,
+# assignments: the hot path) lock (namespace, set_id) in sorted order under a shared
+# (namespace, 0), so different sets refresh concurrently. A user-scoped recompute (enrollment
+# changes) can touch rows of any set, and keying it by user would let it interleave with a
+# set recompute of the same (user, set) row, each missing the other's change; it takes
+# (namespace, 0) exclusively instead. In one transaction call refresh_users before
+# refresh_sets, never after (upgrading the shared lock can deadlock).
+_LOCK_NAMESPACE = 7302
+_ALL = 0
+
+_AGG_SQL = f"""
+    WITH source AS (
+        SELECT creator_id AS user_id, set_id, {CREATOR} AS reason
+        FROM public.studyset
+        WHERE creator_id IS NOT NULL
+        UNION ALL
+        SELECT ssa.user_id, a.set_id, {DIRECT}
+        FROM public.study_set_student_assignment ssa
+        JOIN public.study_set_assignment a ON a.assignment_id = ssa.assignment_id
+        UNION ALL
+        SELECT e.user_id, a.set_id, {CLASS}
+        FROM public.study_set_assignment a
+        JOIN public.enrollment e ON e.class_id = a.class_id
+    ),
+    agg AS (
+        SELECT user_id, set_id, BIT_OR(reason) AS reasons
+        FROM source
+        {{scope}}
+        GROUP BY user_id, set_id
+    )
+"""
+
+_UPSERT_SQL = """
+    INSERT INTO public.study_set_visibility (user_id, set_id, reasons)
+    SELECT user_id, set_id, reasons FROM agg
+    ON CONFLICT (user_id, set_id) DO UPDATE SET reasons = EXCLUDED.reasons
+"""
+
+_DELETE_STALE_SQL = """
+    DELETE FROM public.study_set_visibility v
+    WHERE v.{column} = ANY(:ids)
+      AND NOT EXISTS (
+          SELECT 1 FROM agg a WHERE a.user_id = v.user_id AND a.set_id = v.set_id
+      )
+"""
+
+
+def _lock(db: Session, column: str, ids: List[int]) -> None:
+    """Held until commit, so a concurrent recompute of the same rows sees this one's changes."""
+    if column == "user_id":
+        db.execute(text("SELECT pg_advisory_xact_lock(:ns, :all)"), {"ns": _LOCK_NAMESPACE, "all": _ALL})
+        return
+    db.execute(text("SELECT pg_advisory_xact_lock_shared(:ns, :all)"), {"ns": _LOCK_NAMESPACE, "all": _ALL})
+    for set_id in ids:
+        db.execute(
+            text("SELECT pg_advisory_xact_lock(:ns, :set_id)"),
+            {"ns": _LOCK_NAMESPACE, "set_id": set_id},
+        )
+
+
+def _refresh(db: Session, column: str, ids: Iterable[int]) -> None:
+    ids = sorted({int(i) for i in ids})
+    if not ids:
+        return
+    # text() statements do not autoflush; pending ORM sets and assignments must be visible
+    db.flush()
+    _lock(db, column, ids)
+    agg = _AGG_SQL.format(scope=f"WHERE {column} = ANY(:ids)")
+    params = {"ids": ids}
+    db.execute(text(agg + _UPSERT_SQL), params)
+    db.execute(text(agg + _DELETE_STALE_SQL.format(column=column)), params)
+
+
+def refresh_users(db: Session, user_ids: Iterable[int]) -> None:
+    """Recompute every row of these users (after enrollment changes); caller commits."""
+    _refresh(db, "user_id", user_ids)
+
+
+def refresh_sets(db: Session, set_ids: Iterable[int]) -> None:
+    """Recompute every row of these sets (after creation or assignment changes); caller commits."""
+    _refresh(db, "set_id", set_ids)
+
+
+def rebuild_all(db: Session) -> int:
+    """Drop and recompute the whole index; returns the number of rows written."""
+    db.execute(text("SELECT pg_advisory_xact_lock(:ns, :all)"), {"ns": _LOCK_NAMESPACE, "all": _ALL})
+    db.execute(text("DELETE FROM public.study_set_visibility"))
+    result = db.execute(text(_AGG_SQL.format(scope="") + _UPSERT_SQL))
+    return result.rowcount or 0
+
+
+def reasons_for_user(db: Session, user_id: int) -> Dict[int, int]:
+    """set_id -> reasons bitmask for every non-public reason the user can see a set."""
+    rows = (
+        db.query(models.StudySetVisibility.set_id, models.StudySetVisibility.reasons)
+        .filter(models.StudySetVisibility.user_id == user_id)
+        .all()
+    )
+    return {int(set_id): int(reasons) for set_id, reasons in rows}
+
+
+def visible_set_ids_select(user_id: int):
+    """Subquery of the user's indexed set ids, for `StudySet.set_id.in_(...)`."""
+    return select(models.StudySetVisibility.set_id).where(models.StudySetVisibility.user_id == user_id)
+
+
+def set_ids_assigned_by(db: Session, user_id: int) -> List[int]:
+    rows = db.execute(
+        text("SELECT DISTINCT set_id FROM public.study_set_assignment WHERE assigned_by = :uid"),
+        {"uid": user_id},
+    ).fetchall()
+    return [int(r[0]) for r in rows]
@@ -6,7 +6,7 @@ from sqlalchemy import engine_from_config, pool
 from app.database.database import Base
 # Import all models so Alembic can detect them
 from app.auth.models import Role, RevokedToken, User
-from app.notifications.models import Notification
+from app.notifications.models import EmailOutbox, Notification
 from app.study_sets.models import (
     StudySet,
     StudySetTag,
@@ -17,6 +17,8 @@ from app.study_sets.models import (
     StudySetStudentAssignment,
     StudySetProgress,
     StudySetOffline,
+    StudySetClassRollup,
+    StudySetVisibility,
 )
 
 # this is the Alembic Config object, which provides
@@ -0,0 +1,58 @@
+"""revoked_tokens.expires_at: lets expired revocations be purged
+
+Revision ID: a7b8c9d0e1f2
+Revises: e5f6a7b8c9d0
+Create Date: 2026-10-17
+
+Existing rows keep expires_at NULL; they are purged once they are older than the longest
+token lifetime (see app.auth.revocation).
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy import inspect
+
+revision: str = "a7b8c9d0e1f2"
+down_revision: Union[str, None] = "e5f6a7b8c9d0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    insp = inspect(bind)
+    # revoked_tokens is created by app startup create_all on some databases
+    if "revoked_tokens" not in insp.get_table_names(schema="public"):
+        op.create_table(
+            "revoked_tokens",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("jti", sa.String(length=256), nullable=False),
+            sa.Column("revoked_at", sa.DateTime(), nullable=True),
+            sa.Column("expires_at", sa.DateTime(), nullable=True),
+            schema="public",
+        )
+        op.create_index("ix_revoked_tokens_jti", "revoked_tokens", ["jti"], unique=True, schema="public")
+        op.create_index("ix_revoked_tokens_expires_at", "revoked_tokens", ["expires_at"], schema="public")
+        return
+
+    columns = {c["name"] for c in insp.get_columns("revoked_tokens", schema="public")}
+    if "expires_at" not in columns:
+        op.add_column("revoked_tokens", sa.Column("expires_at", sa.DateTime(), nullable=True), schema="public")
+    indexes = {i["name"] for i in insp.get_indexes("revoked_tokens", schema="public")}
+    if "ix_revoked_tokens_expires_at" not in indexes:
+        op.create_index("ix_revoked_tokens_expires_at", "revoked_tokens", ["expires_at"], schema="public")
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    insp = inspect(bind)
+    if "revoked_tokens" not in insp.get_table_names(schema="public"):
+        return
+    indexes = {i["name"] for i in insp.get_indexes("revoked_tokens", schema="public")}
+    if "ix_revoked_tokens_expires_at" in indexes:
+        op.drop_index("ix_revoked_tokens_expires_at", table_name="revoked_tokens", schema="public")
+    columns = {c["name"] for c in insp.get_columns("revoked_tokens", schema="public")}
+    if "expires_at" in columns:
+        op.drop_column("revoked_tokens", "expires_at", schema="public")
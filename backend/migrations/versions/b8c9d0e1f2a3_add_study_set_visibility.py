@@ -0,0 +1,82 @@
+"""study_set_visibility: materialized per-user visible-set index
+
+Revision ID: b8c9d0e1f2a3
+Revises: a7b8c9d0e1f2
+Create Date: 2026-10-17
+
+reasons is a bitmask: 1 creator, 2 direct assignment, 4 class assignment. Public sets are not
+indexed (is_public stays a predicate). The table is backfilled here;
+`python -m scripts.rebuild_visibility_index` recomputes it later if needed.
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy import inspect, text
+
+revision: str = "b8c9d0e1f2a3"
+down_revision: Union[str, None] = "a7b8c9d0e1f2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    insp = inspect(bind)
+    # Table may already exist (e.g. from app startup create_all) — always backfill
+    if "study_set_visibility" not in insp.get_table_names(schema="public"):
+        op.create_table(
+            "study_set_visibility",
+            sa.Column(
+                "user_id",
+                sa.Integer(),
+                sa.ForeignKey("public.User.user_id", ondelete="CASCADE"),
+                primary_key=True,
+            ),
+            sa.Column(
+                "set_id",
+                sa.Integer(),
+                sa.ForeignKey("public.studyset.set_id", ondelete="CASCADE"),
+                primary_key=True,
+            ),
+            sa.Column("reasons", sa.SmallInteger(), nullable=False),
+            schema="public",
+        )
+        op.create_index(
+            "ix_public_study_set_visibility_set_id",
+            "study_set_visibility",
+            ["set_id"],
+            schema="public",
+        )
+
+    # The app may already have indexed a few new sets (create_all mode); upsert so every
+    # older creator and assignment row is added too
+    op.execute(
+        text("""
+        INSERT INTO public.study_set_visibility (user_id, set_id, reasons)
+        SELECT user_id, set_id, BIT_OR(reason)
+        FROM (
+            SELECT creator_id AS user_id, set_id, 1 AS reason
+            FROM public.studyset
+            WHERE creator_id IS NOT NULL
+            UNION ALL
+            SELECT ssa.user_id, a.set_id, 2
+            FROM public.study_set_student_assignment ssa
+            JOIN public.study_set_assignment a ON a.assignment_id = ssa.assignment_id
+            UNION ALL
+            SELECT e.user_id, a.set_id, 4
+            FROM public.study_set_assignment a
+            JOIN public.enrollment e ON e.class_id = a.class_id
+        ) source
+        GROUP BY user_id, set_id
+        ON CONFLICT (user_id, set_id) DO UPDATE SET reasons = EXCLUDED.reasons
+        """)
+    )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    insp = inspect(bind)
+    if "study_set_visibility" in insp.get_table_names(schema="public"):
+        op.drop_table("study_set_visibility", schema="public")
@@ -0,0 +1,40 @@
+"""revoked_tokens.revoked_at index: revocation sync reads by revoked_at
+
+Revision ID: d0e1f2a3b4c5
+Revises: c9d0e1f2a3b4
+Create Date: 2026-10-17
+
+Workers pull new revocations with `revoked_at >= last sync - overlap` instead of `id > cursor`
+(see app.auth.revocation), every few seconds.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+from sqlalchemy import inspect
+
+revision: str = "d0e1f2a3b4c5"
+down_revision: Union[str, None] = "c9d0e1f2a3b4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    insp = inspect(bind)
+    if "revoked_tokens" not in insp.get_table_names(schema="public"):
+        return
+    indexes = {i["name"] for i in insp.get_indexes("revoked_tokens", schema="public")}
+    # Index may already exist (e.g. from app startup create_all)
+    if "ix_revoked_tokens_revoked_at" not in indexes:
+        op.create_index("ix_revoked_tokens_revoked_at", "revoked_tokens", ["revoked_at"], schema="public")
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    insp = inspect(bind)
+    if "revoked_tokens" not in insp.get_table_names(schema="public"):
+        return
+    indexes = {i["name"] for i in insp.get_indexes("revoked_tokens", schema="public")}
+    if "ix_revoked_tokens_revoked_at" in indexes:
+        op.drop_index("ix_revoked_tokens_revoked_at", table_name="revoked_tokens", schema="public")
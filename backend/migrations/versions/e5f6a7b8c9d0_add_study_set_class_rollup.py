@@ -0,0 +1,88 @@
+"""study_set_class_rollup: precomputed teacher analytics per (set, class)
+
+Revision ID: e5f6a7b8c9d0
+Revises: f1a2b3c4d5e6
+Create Date: 2026-10-17
+
+class_id = 0 is the set-wide row (students counted once across classes), so class_id has
+no foreign key. The table is backfilled here; `python -m scripts.rebuild_analytics_rollup`
+recomputes it later if needed.
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy import inspect, text
+
+revision: str = "e5f6a7b8c9d0"
+down_revision: Union[str, None] = "f1a2b3c4d5e6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    insp = inspect(bind)
+    # Table may already exist (e.g. from app startup create_all) — always backfill
+    if "study_set_class_rollup" not in insp.get_table_names(schema="public"):
+        op.create_table(
+            "study_set_class_rollup",
+            sa.Column(
+                "set_id",
+                sa.Integer(),
+                sa.ForeignKey("public.studyset.set_id", ondelete="CASCADE"),
+                primary_key=True,
+            ),
+            sa.Column("class_id", sa.Integer(), primary_key=True),
+            sa.Column("student_count", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("attempt_count", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("mastery_sum", sa.DECIMAL(12, 2), nullable=False, server_default="0"),
+            sa.Column("completion_count", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("updated_at", sa.DateTime(), nullable=False, server_default=sa.text("CURRENT_TIMESTAMP")),
+            schema="public",
+        )
+
+    # The app may already have written rollups for a few sets (create_all mode); upsert so
+    # every older set gets its totals too
+    op.execute(
+        text("""
+        WITH members AS (
+            SELECT DISTINCT ssa.set_id, e.class_id, e.user_id
+            FROM public.study_set_assignment ssa
+            JOIN public.enrollment e ON e.class_id = ssa.class_id
+        ),
+        scoped AS (
+            SELECT set_id, class_id, user_id FROM members
+            UNION ALL
+            SELECT DISTINCT set_id, 0, user_id FROM members
+        )
+        INSERT INTO public.study_set_class_rollup
+            (set_id, class_id, student_count, attempt_count, mastery_sum, completion_count, updated_at)
+        SELECT
+            s.set_id,
+            s.class_id,
+            COUNT(*),
+            COUNT(p.progress_id),
+            COALESCE(SUM(p.mastery_percentage), 0),
+            COUNT(p.progress_id) FILTER (WHERE p.items_completed = p.total_items),
+            CURRENT_TIMESTAMP
+        FROM scoped s
+        LEFT JOIN public.study_set_progress p
+            ON p.set_id = s.set_id AND p.user_id = s.user_id
+        GROUP BY s.set_id, s.class_id
+        ON CONFLICT (set_id, class_id) DO UPDATE SET
+            student_count = EXCLUDED.student_count,
+            attempt_count = EXCLUDED.attempt_count,
+            mastery_sum = EXCLUDED.mastery_sum,
+            completion_count = EXCLUDED.completion_count,
+            updated_at = EXCLUDED.updated_at
+        """)
+    )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    insp = inspect(bind)
+    if "study_set_class_rollup" in insp.get_table_names(schema="public"):
+        op.drop_table("study_set_class_rollup", schema="public")
@@ -0,0 +1,158 @@
+"""
+Compare the sync (psycopg2 + threadpool) and async (asyncpg) study set endpoints under load.
+
+Starts the app twice with uvicorn, once as deployed today and once with ASYNC_DB_ENABLED=1,
+then drives each with `--concurrency` concurrent clients for `--duration` seconds against the
+given paths, signed in as `--email`. Reports requests/s, p50/p95/p99 latency and errors per
+mode. Run it against a database seeded with realistic data; an empty one only measures
+framework overhead.
+
+Usage (from repo `edu-senior/backend`):
+
+  python -m scripts.benchmark_async_db --email student@example.com
+  python -m scripts.benchmark_async_db --email teacher@example.com --concurrency 200 --duration 30 \\
+      --path /study-sets /study-sets/dashboard/stats
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+# Run as: python -m scripts.benchmark_async_db from backend/
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+import httpx  # noqa: E402
+
+from app.auth.auth_utils import create_access_token  # noqa: E402
+
+DEFAULT_PATHS = [
+    "/study-sets",
+    "/study-sets/dashboard/stats",
+    "/study-sets/dashboard/assignments",
+]
+
+
+def start_server(port: int, async_db: bool, workers: int) -> subprocess.Popen:
+    env = dict(os.environ)
+    env["ASYNC_DB_ENABLED"] = "1" if async_db else "0"
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--port", str(port), "--workers", str(workers), "--log-level", "warning",
+        ],
+        cwd=str(BACKEND_ROOT),
+        env=env,
+    )
+
+
+async def wait_ready(base_url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get("/openapi.json")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"server at {base_url} did not start within {timeout:.0f} s")
+
+
+async def drive(base_url: str, token: str, paths: List[str], concurrency: int, duration: float) -> Dict:
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(
+        base_url=base_url,
+        headers={"Authorization": f"Bearer {token}"},
+        limits=limits,
+        timeout=60.0,
+    ) as client:
+
+        async def worker(offset: int) -> None:
+            nonlocal errors
+            i = offset
+            while time.monotonic() < deadline:
+                path = paths[i % len(paths)]
+                i += 1
+                started = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                latencies.append((time.perf_counter() - started) * 1000)
+                if not ok:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+
+    def pct(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else 0.0
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": statistics.median(latencies) if latencies else 0.0,
+        "p95": pct(0.95),
+        "p99": pct(0.99),
+    }
+
+
+async def bench_mode(args: argparse.Namespace, token: str, async_db: bool) -> Dict:
+    label = "async" if async_db else "sync"
+    port = args.port + (1 if async_db else 0)
+    base_url = f"http://127.0.0.1:{port}"
+    server = start_server(port, async_db, args.workers)
+    try:
+        await wait_ready(base_url)
+        # Warm connection pools and caches before measuring
+        await drive(base_url, token, args.path, min(args.concurrency, 8), 1.0)
+        result = await drive(base_url, token, args.path, args.concurrency, args.duration)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+    print(
+        f"{label:<5} {result['requests']:>7} req  {result['errors']:>5} err  "
+        f"{result['rps']:8.1f} req/s  p50 {result['p50']:7.1f} ms  "
+        f"p95 {result['p95']:7.1f} ms  p99 {result['p99']:7.1f} ms"
+    )
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark sync vs async database endpoints.")
+    parser.add_argument("--email", required=True, help="Existing user to sign requests as.")
+    parser.add_argument("--path", nargs="+", default=DEFAULT_PATHS)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per mode.")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes.")
+    parser.add_argument("--port", type=int, default=8765, help="Sync server port; async uses port + 1.")
+    parser.add_argument("--mode", choices=["both", "sync", "async"], default="both")
+    args = parser.parse_args()
+
+    token, _ = create_access_token(args.email)
+    print(f"{args.concurrency} clients, {args.duration:.0f} s per mode, paths: {' '.join(args.path)}")
+    for async_db in (False, True):
+        if args.mode == "both" or args.mode == ("async" if async_db else "sync"):
+            asyncio.run(bench_mode(args, token, async_db))
+
+
+if __name__ == "__main__":
+    main()
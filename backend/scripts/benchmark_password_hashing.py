@@ -0,0 +1,99 @@
+"""
+Benchmark argon2 cost parameters and the bounded hashing executor.
+
+Pick ARGON2_TIME_COST / ARGON2_MEMORY_COST / ARGON2_PARALLELISM per deployment so a single
+hash takes roughly 100-500 ms on the production hardware, then size PASSWORD_HASH_WORKERS
+for the expected login burst. The script reports single-hash latency for every combination
+given, and throughput when `--concurrency` hashes are pushed through the app's executor.
+
+Usage (from repo `edu-senior/backend`):
+
+  python -m scripts.benchmark_password_hashing
+  python -m scripts.benchmark_password_hashing --time-cost 2 3 --memory-cost 65536 102400 --parallelism 2 8
+  python -m scripts.benchmark_password_hashing --concurrency 64
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Run as: python -m scripts.benchmark_password_hashing from backend/
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+from passlib.context import CryptContext  # noqa: E402
+
+
+def bench_params(time_cost: int, memory_cost: int, parallelism: int, iterations: int) -> None:
+    ctx = CryptContext(
+        schemes=["argon2"],
+        argon2__time_cost=time_cost,
+        argon2__memory_cost=memory_cost,
+        argon2__parallelism=parallelism,
+    )
+    hashed = ctx.hash("benchmark-password")
+    hash_ms, verify_ms = [], []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        ctx.hash("benchmark-password")
+        hash_ms.append((time.perf_counter() - started) * 1000)
+        started = time.perf_counter()
+        ctx.verify("benchmark-password", hashed)
+        verify_ms.append((time.perf_counter() - started) * 1000)
+    print(
+        f"t={time_cost:<2} m={memory_cost:<7} p={parallelism:<2} "
+        f"hash median {statistics.median(hash_ms):7.1f} ms  "
+        f"verify median {statistics.median(verify_ms):7.1f} ms  "
+        f"max {max(hash_ms + verify_ms):7.1f} ms"
+    )
+
+
+async def bench_executor(concurrency: int) -> None:
+    # Imported here so the executor picks up ARGON2_* / PASSWORD_HASH_* from the environment
+    from app.auth import password_hasher
+
+    hashed = password_hasher.hash_password_sync("benchmark-password")
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(password_hasher.verify_password("benchmark-password", hashed) for _ in range(concurrency)),
+        return_exceptions=True,
+    )
+    elapsed = time.perf_counter() - started
+    rejected = sum(1 for r in results if isinstance(r, password_hasher.HashingBusyError))
+    done = len(results) - rejected
+    print(
+        f"executor: {concurrency} concurrent verifies, {done} done, {rejected} rejected (429) "
+        f"in {elapsed:.2f} s -> {done / elapsed:.1f} verifies/s"
+    )
+    print(f"metrics: {password_hasher.metrics()}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark argon2 password hashing settings.")
+    parser.add_argument("--time-cost", type=int, nargs="+", default=[2])
+    parser.add_argument("--memory-cost", type=int, nargs="+", default=[102400], help="KiB")
+    parser.add_argument("--parallelism", type=int, nargs="+", default=[8])
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=0,
+        help="Also push this many verifies through the app's bounded executor.",
+    )
+    args = parser.parse_args()
+
+    for t, m, p in itertools.product(args.time_cost, args.memory_cost, args.parallelism):
+        bench_params(t, m, p, args.iterations)
+    if args.concurrency:
+        asyncio.run(bench_executor(args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
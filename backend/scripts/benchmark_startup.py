@@ -0,0 +1,106 @@
+"""
+Measure worker cold-start time, stage by stage.
+
+Each run starts a fresh interpreter (nothing cached in sys.modules, like a new uvicorn
+worker) that imports the app in dependency order and times every stage: framework imports,
+dotenv + engine setup, each router module, app construction, then the lifespan startup
+(schema handling per DB_STARTUP_MODE, revocation warm-up, replica checks). Medians over
+`--runs` are printed per startup mode, together with whether google.generativeai was
+imported (it should only load on the first AI request).
+
+Usage (from repo `edu-senior/backend`):
+
+  python -m scripts.benchmark_startup
+  python -m scripts.benchmark_startup --runs 10 --mode skip verify
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+# Run as: python -m scripts.benchmark_startup from backend/
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+
+STAGES = [
+    ("fastapi + sqlalchemy", "import fastapi, sqlalchemy, sqlalchemy.orm"),
+    ("dotenv + engines", "import app.database.database"),
+    ("auth router", "import app.auth.routes"),
+    ("study sets router", "import app.study_sets.routes"),
+    ("ai router", "import app.ai.routes"),
+    ("admin router", "import app.admin.routes"),
+    ("notifications router", "import app.notifications.routes"),
+    ("app.main (app + include_router)", "import app.main"),
+]
+
+CHILD = """
+import json, sys, time, warnings
+warnings.simplefilter("ignore")
+timings = []
+started = time.perf_counter()
+for name, stmt in STAGES:
+    t = time.perf_counter()
+    exec(stmt)
+    timings.append([name, time.perf_counter() - t])
+
+import asyncio
+from app.main import app, lifespan
+
+async def run_lifespan():
+    t = time.perf_counter()
+    async with lifespan(app):
+        timings.append(["lifespan startup", time.perf_counter() - t])
+asyncio.run(run_lifespan())
+timings.append(["total", time.perf_counter() - started])
+print("RESULT " + json.dumps({"timings": timings, "genai": "google.generativeai" in sys.modules}))
+"""
+
+
+def run_once(mode: str) -> Dict:
+    env = dict(os.environ)
+    env["DB_STARTUP_MODE"] = mode
+    code = f"STAGES = {STAGES!r}\n" + CHILD
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=str(BACKEND_ROOT),
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    line = next(ln for ln in out.splitlines() if ln.startswith("RESULT "))
+    return json.loads(line[len("RESULT "):])
+
+
+def bench_mode(mode: str, runs: int) -> None:
+    samples: Dict[str, List[float]] = {}
+    genai_loaded = False
+    for _ in range(runs):
+        result = run_once(mode)
+        genai_loaded = genai_loaded or result["genai"]
+        for name, seconds in result["timings"]:
+            samples.setdefault(name, []).append(seconds * 1000)
+    print(f"DB_STARTUP_MODE={mode} ({runs} runs, median ms)")
+    for name, values in samples.items():
+        print(f"  {name:<34} {statistics.median(values):8.1f}")
+    print(f"  google.generativeai imported at startup: {'yes' if genai_loaded else 'no'}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark worker cold-start time.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--mode", nargs="+", default=["skip", "create_all", "verify"])
+    args = parser.parse_args()
+
+    for mode in args.mode:
+        bench_mode(mode, args.runs)
+
+
+if __name__ == "__main__":
+    main()
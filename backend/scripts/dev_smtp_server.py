@@ -0,0 +1,65 @@
+"""
+Local SMTP stand-in for trying the email worker without a real provider.
+
+Accepts every message on localhost, prints a one-line summary of each and a running
+throughput figure, and never delivers anything. Needs aiosmtpd (`pip install aiosmtpd`).
+`--fail-every N` answers every Nth message with a temporary 451 error to exercise retries.
+
+Usage (from repo `edu-senior/backend`):
+
+  python -m scripts.dev_smtp_server --port 8025
+  SMTP_HOST=127.0.0.1 SMTP_PORT=8025 SMTP_USE_TLS=false python -m scripts.email_worker
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+
+class CountingHandler:
+    def __init__(self, fail_every: int = 0, quiet: bool = False):
+        self.fail_every = fail_every
+        self.quiet = quiet
+        self.received = 0
+        self.started = time.monotonic()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        if self.fail_every and self.received % self.fail_every == 0:
+            return "451 Temporary failure (dev_smtp_server --fail-every)"
+        if not self.quiet:
+            rate = self.received / max(time.monotonic() - self.started, 1e-9)
+            print(f"#{self.received} to={','.join(envelope.rcpt_tos)} ({rate:.1f} msg/s)")
+        return "250 OK"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a local catch-all SMTP server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--fail-every", type=int, default=0)
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args()
+
+    try:
+        from aiosmtpd.controller import Controller
+    except ImportError:
+        raise SystemExit("aiosmtpd is not installed: pip install aiosmtpd")
+
+    handler = CountingHandler(fail_every=args.fail_every, quiet=args.quiet)
+    controller = Controller(handler, hostname=args.host, port=args.port)
+    controller.start()
+    print(f"Dev SMTP server listening on {args.host}:{args.port} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        controller.stop()
+        print(f"Received {handler.received} message(s)")
+
+
+if __name__ == "__main__":
+    main()
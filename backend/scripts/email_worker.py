@@ -0,0 +1,50 @@
+"""
+Deliver queued email from the email_outbox table (see app/notifications/email_worker.py).
+
+Run one or more of these next to the API; they share the table safely. SMTP_* settings are
+the same as the API's; EMAIL_* settings tune batching, retries, rate limits and retention.
+
+Usage (from repo `edu-senior/backend`, with DATABASE_URL and SMTP_HOST set in .env or env):
+
+  python -m scripts.email_worker
+  python -m scripts.email_worker --once        # drain what is due now, then exit
+
+For local testing, point SMTP_HOST/SMTP_PORT at `python -m scripts.dev_smtp_server`
+with SMTP_USE_TLS=false.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import signal
+import sys
+from pathlib import Path
+
+# Run as: python -m scripts.email_worker from backend/
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+from app.notifications import email_service  # noqa: E402
+from app.notifications.email_worker import EmailWorker  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Deliver queued email from email_outbox.")
+    parser.add_argument("--once", action="store_true", help="Exit when nothing is due.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if not email_service.is_configured():
+        sys.exit("SMTP_HOST is not set; nothing to deliver to.")
+
+    worker = EmailWorker()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: worker.stop())
+    worker.run(once=args.once)
+    print(f"Email worker stopped: {worker.metrics()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Recompute the teacher analytics rollup (study_set_class_rollup) from scratch.
+
+The API keeps the rollup current on every progress, enrollment and assignment change;
+run this after bulk imports or manual SQL edits that bypass the API.
+
+Usage (from repo `edu-senior/backend`, with DATABASE_URL set in .env or env):
+
+  python -m scripts.rebuild_analytics_rollup
+  python -m scripts.rebuild_analytics_rollup --set-id 12 --set-id 15
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+# Run as: python -m scripts.rebuild_analytics_rollup from backend/
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+from app.database.database import SessionLocal  # noqa: E402
+from app.study_sets import analytics_rollup  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild the teacher analytics rollup table.")
+    parser.add_argument(
+        "--set-id",
+        dest="set_ids",
+        type=int,
+        action="append",
+        help="Only recompute this study set (repeatable). Default: rebuild everything.",
+    )
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.set_ids:
+            analytics_rollup.refresh(db, args.set_ids)
+            count = len(set(args.set_ids))
+        else:
+            count = analytics_rollup.rebuild_all(db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    print(f"Rebuilt analytics rollup for {count} study set(s).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Recompute the per-user study set visibility index (study_set_visibility) from scratch.
+
+The API keeps the index current on every set creation, enrollment and assignment change;
+run this after bulk imports or manual SQL edits that bypass the API.
+
+Usage (from repo `edu-senior/backend`, with DATABASE_URL set in .env or env):
+
+  python -m scripts.rebuild_visibility_index
+  python -m scripts.rebuild_visibility_index --user-id 7 --set-id 12
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+# Run as: python -m scripts.rebuild_visibility_index from backend/
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+from app.database.database import SessionLocal  # noqa: E402
+from app.study_sets import visibility_index  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild the study set visibility index.")
+    parser.add_argument(
+        "--user-id",
+        dest="user_ids",
+        type=int,
+        action="append",
+        help="Only recompute this user's rows (repeatable).",
+    )
+    parser.add_argument(
+        "--set-id",
+        dest="set_ids",
+        type=int,
+        action="append",
+        help="Only recompute this study set's rows (repeatable).",
+    )
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.user_ids or args.set_ids:
+            visibility_index.refresh_users(db, args.user_ids or [])
+            visibility_index.refresh_sets(db, args.set_ids or [])
+            summary = f"{len(set(args.user_ids or []))} user(s), {len(set(args.set_ids or []))} set(s)"
+        else:
+            summary = f"{visibility_index.rebuild_all(db)} row(s)"
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    print(f"Rebuilt visibility index: {summary}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -39,7 +39,7 @@ from sqlalchemy.orm import Session  # noqa: E402
 
 from app.auth import models as auth_models  # noqa: E402
 from app.database.database import SessionLocal  # noqa: E402
-from app.study_sets import models  # noqa: E402
+from app.study_sets import models, visibility_index  # noqa: E402
 
 DEFAULT_JSON = Path(__file__).resolve().parent / "data" / "quadratic_equations_public.json"
 DEFAULT_CREATOR_ID = int(os.environ.get("CREATOR_ID", "14"))
@@ -182,6 +182,7 @@ def seed(db: Session, payload: dict, creator_id: int, dry_run: bool) -> int:
         print(f"[dry-run] Would create set {title!r} with {len(payload['items'])} questions for creator_id={creator_id}")
         return -1
 
+    visibility_index.refresh_sets(db, [study_set.set_id])
     db.commit()
     db.refresh(study_set)
     return study_set.set_id
@@ -1145,6 +1145,34 @@ export async function getPointsBreakdown(): Promise<PointsBreakdown> {
   }
 }
 
+export interface GamificationSummary {
+  streaks: StreaksResponse;
+  badges: BadgesResponse;
+  points: PointsBreakdown;
+}
+
+export async function getGamificationSummary(): Promise<GamificationSummary> {
+  try {
+    const response = await fetch(`${API_URL}/study-sets/gamification/summary`, {
+      credentials: 'include',
+      headers: getAuthHeaders(),
+    });
+
+    if (!response.ok) {
+      if (response.status === 401) redirectToLogin();
+      const errorData = await response.json().catch(() => ({}));
+      throw new Error(errorData.detail || 'Failed to fetch gamification summary');
+    }
+
+    return await response.json();
+  } catch (err) {
+    if (err instanceof TypeError && err.message === 'Failed to fetch') {
+      throw new Error('Cannot connect to server. Please make sure the backend is running on http://localhost:8000');
+    }
+    throw err;
+  }
+}
+
 export async function getAnalytics(setId?: number): Promise<AnalyticsResponse> {
   try {
     const url = setId 
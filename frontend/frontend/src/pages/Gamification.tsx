@@ -20,7 +20,7 @@ import EmojiEventsIcon from '@mui/icons-material/EmojiEvents'
 import LocalFireDepartmentIcon from '@mui/icons-material/LocalFireDepartment'
 import StarIcon from '@mui/icons-material/Star'
 import { getUserRole } from '../api/authApi'
-import { getLeaderboard, getStreaks, getAllBadges, getPointsBreakdown, getClasses, type LeaderboardResponse, type StreaksResponse, type BadgesResponse, type PointsBreakdown, type ClassOut } from '../api/studySetsApi'
+import { getLeaderboard, getGamificationSummary, getClasses, type LeaderboardResponse, type StreaksResponse, type BadgesResponse, type PointsBreakdown, type ClassOut } from '../api/studySetsApi'
 import {
   translateBadgeName,
   translateGamificationEarnedDescription,
@@ -51,16 +51,14 @@ export default function Gamification() {
     try {
       setLoading(true)
       setError(null)
-      const [leaderboard, streaks, badges, points] = await Promise.all([
+      const [leaderboard, summary] = await Promise.all([
         getLeaderboard(selectedClassId),
-        getStreaks(),
-        getAllBadges(),
-        getPointsBreakdown(),
+        getGamificationSummary(),
       ])
       setLeaderboardData(leaderboard)
-      setStreaksData(streaks)
-      setBadgesData(badges)
-      setPointsData(points)
+      setStreaksData(summary.streaks)
+      setBadgesData(summary.badges)
+      setPointsData(summary.points)
     } catch (err) {
       setError(err instanceof Error ? err.message : t('gamification.loadFailed'))
     } finally {